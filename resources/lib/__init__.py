@@ -6,6 +6,12 @@ A simple Kodi add-on which wraps 'NOW TV Player' to integrate with Kodi.
 
 from resources.lib import ui      # noqa: F401
 from resources.lib import view    # noqa: F401
+from resources.lib import guide   # noqa: F401
 from resources.lib import logger  # noqa: F401
+from resources.lib import export  # noqa: F401
+from resources.lib import artwork  # noqa: F401
+from resources.lib import skin    # noqa: F401
+from resources.lib import player  # noqa: F401
+from resources.lib import profiler  # noqa: F401
 from resources.lib import plugin  # noqa: F401
 from resources.lib import nowtv   # noqa: F401
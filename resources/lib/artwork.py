@@ -0,0 +1,314 @@
+'''
+Provides a size-capped on-disk artwork cache, which is populated by prefetching
+artwork in the background - so that Kodi loads artwork from local paths rather
+than fetching it while the guide is scrolled.
+'''
+
+import os
+import time
+import errno
+import hashlib
+import logging
+import threading
+import collections
+import requests
+
+# Python 3 moved urlparse into urllib.parse.
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from resources.lib import nowtv
+
+# Define the maximum size of the artwork cache - in bytes.
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Define the size of chunks artwork is streamed to disk in - in bytes.
+CHUNK_SIZE = 64 * 1024
+
+# Define the number of concurrent artwork fetches, how long to wait for the
+# prefetch prior to rendering the guide, to complete after, and to stop once
+# cancelled - in seconds - and the length of the time window considered
+# visible - in hours.
+PREFETCH_CONCURRENCY = 4
+PREFETCH_TIMEOUT = 2
+PREFETCH_BACKGROUND_TIMEOUT = 3
+PREFETCH_CANCEL_TIMEOUT = 1
+PREFETCH_WINDOW = 3
+
+# Define the age after which partially fetched artwork is considered to have
+# been abandoned by an exited invocation - in seconds.
+TEMPORARY_MAX_AGE = 300
+
+
+class ArtworkCache(object):
+    '''
+    Implements a least recently used on-disk artwork cache, which is capped
+    by the total size of artwork stored. Recency is tracked by modification
+    time, so is retained across plugin invocations.
+    '''
+
+    def __init__(self, path, capacity=CACHE_MAX_BYTES):
+        '''
+        Args:
+            path (str): The directory to store artwork in.
+            capacity (int): The maximum size of the cache in bytes.
+        '''
+        self.path = path
+        self.capacity = capacity
+        self.logger = logging.getLogger('plugin.video.nowtv.artwork')
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+        try:
+            os.makedirs(path)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise err
+
+        # Index stored artwork by name, in order of least recent use.
+        stored = []
+        for name in os.listdir(path):
+            # Artwork may be moved into place by a concurrent invocation.
+            try:
+                stat = os.stat(os.path.join(path, name))
+            except OSError:
+                continue
+
+            # Partial artwork is removed once abandoned by an invocation.
+            if name.endswith('.tmp'):
+                if stat.st_mtime < time.time() - TEMPORARY_MAX_AGE:
+                    self._remove(name)
+                continue
+            stored.append((stat.st_mtime, name, stat.st_size))
+
+        self.index = collections.OrderedDict()
+        self.size = 0
+        self.fetched = 0
+        for (_, name, size) in sorted(stored):
+            self.index[name] = size
+            self.size += size
+
+    def _name(self, url):
+        '''
+        Args:
+            url (str): The URL of the artwork.
+
+        Returns:
+            str: The name of the file the artwork is stored as.
+        '''
+        extension = os.path.splitext(urlparse.urlparse(url).path)[1]
+        return '{0}{1}'.format(
+            hashlib.md5(url.encode('utf-8')).hexdigest(),
+            extension.lower() or '.jpg',
+        )
+
+    def get(self, url):
+        '''
+        Retrieves the local path of the artwork, if stored, and marks it as
+        recently used.
+
+        Args:
+            url (str): The URL of the artwork.
+
+        Returns:
+            str: The local path of the artwork, or None if not stored.
+        '''
+        name = self._name(url)
+        with self.lock:
+            if name not in self.index:
+                return None
+            self.index[name] = self.index.pop(name)
+
+        path = os.path.join(self.path, name)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def _remove(self, name):
+        '''
+        Removes a file from the cache directory, if still present.
+
+        Args:
+            name (str): The name of the file.
+        '''
+        try:
+            os.remove(os.path.join(self.path, name))
+        except OSError:
+            pass
+
+    def _evict(self):
+        ''' Removes least recently used artwork until within capacity. '''
+        while True:
+            with self.lock:
+                if self.size <= self.capacity or not self.index:
+                    return
+                (name, size) = self.index.popitem(last=False)
+                self.size -= size
+
+            self._remove(name)
+            nowtv.metrics.REGISTRY.cache('artwork', 'eviction')
+
+    def fetch(self, url):
+        '''
+        Fetches and stores the artwork, unless already stored.
+
+        Args:
+            url (str): The URL of the artwork.
+
+        Returns:
+            str: The local path of the artwork, or None if the fetch failed
+                or was cancelled.
+        '''
+        path = self.get(url)
+        if path:
+            nowtv.metrics.REGISTRY.cache('artwork', 'hit')
+            return path
+
+        if self.cancelled.is_set():
+            return None
+
+        nowtv.metrics.REGISTRY.cache('artwork', 'miss')
+
+        name = self._name(url)
+        path = os.path.join(self.path, name)
+        temporary = '{0}.{1}.tmp'.format(
+            path,
+            threading.current_thread().ident,
+        )
+
+        # Artwork is streamed to disk, and only moved into place once
+        # complete - so partial artwork is never served.
+        try:
+            response = nowtv.transport.request('GET', url, stream=True)
+            response.raise_for_status()
+
+            size = 0
+            with open(temporary, 'wb') as fout:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    if self.cancelled.is_set():
+                        break
+                    fout.write(chunk)
+                    size += len(chunk)
+            response.close()
+
+            if self.cancelled.is_set():
+                os.remove(temporary)
+                return None
+
+            # Windows does not allow renaming over an existing file.
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename(temporary, path)
+        except (requests.exceptions.RequestException,
+                nowtv.exceptions.BaseError,
+                IOError,
+                OSError) as err:
+            self.logger.debug('Unable to fetch artwork %s: %s', url, err)
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            return None
+
+        with self.lock:
+            self.size -= self.index.pop(name, 0)
+            self.index[name] = size
+            self.size += size
+            self.fetched += size
+
+        nowtv.metrics.REGISTRY.increment('nowtv_artwork_bytes_total', size)
+
+        self._evict()
+        nowtv.metrics.REGISTRY.gauge('nowtv_artwork_cache_bytes', self.size)
+        return path
+
+    def prefetch(self, urls, limit=PREFETCH_CONCURRENCY):
+        '''
+        Fetches and stores the given artwork in the background.
+
+        Args:
+            urls (list of str): The URLs of the artwork to fetch.
+            limit (int): The maximum number of concurrent fetches.
+
+        Returns:
+            nowtv.concurrency.Task: The background prefetch.
+        '''
+        # Preserve the order of URLs, as the earliest are most visible.
+        pending = []
+        seen = set()
+        for url in urls:
+            if url and url not in seen:
+                seen.add(url)
+                pending.append(url)
+
+        return nowtv.concurrency.Task(
+            nowtv.concurrency.fan_out,
+            self.fetch,
+            pending,
+            limit,
+        )
+
+    def cancel(self):
+        '''
+        Cancels any prefetch in progress. Fetches stop between chunks, and
+        discard any partially fetched artwork.
+        '''
+        self.cancelled.set()
+
+    def substitute(self, guide):
+        '''
+        Substitutes the local path of any stored artwork into uEPG data.
+
+        Args:
+            guide (list of dict): A list of uEPG channeldata, with guidedata
+                spliced in.
+
+        Returns:
+            int: The number of URLs substituted.
+        '''
+        substituted = 0
+        for channeldata in guide:
+            path = channeldata['channellogo'] and self.get(
+                channeldata['channellogo']
+            )
+            if path:
+                channeldata['channellogo'] = path
+                substituted += 1
+
+            for guidedata in channeldata['guidedata']:
+                path = guidedata['art']['thumb'] and self.get(
+                    guidedata['art']['thumb']
+                )
+                if path:
+                    guidedata['art']['thumb'] = path
+                    substituted += 1
+
+        return substituted
+
+
+def visible(guide, now, window=PREFETCH_WINDOW):
+    '''
+    Determines the URLs of artwork visible in the guide - the channel logos,
+    and the thumbnails of events within the time window - in order of
+    channel.
+
+    Args:
+        guide (list of dict): A list of uEPG channeldata, with guidedata
+            spliced in.
+        now (float): The UNIX time the guide opens at.
+        window (int): The length of the time window in hours.
+
+    Returns:
+        list of str: The URLs of the visible artwork.
+    '''
+    urls = []
+    for channeldata in guide:
+        urls.append(channeldata['channellogo'])
+        for guidedata in channeldata['guidedata']:
+            if (guidedata['endtime'] > now and
+                    guidedata['starttime'] < now + window * 3600):
+                urls.append(guidedata['art']['thumb'])
+
+    return urls
@@ -0,0 +1,337 @@
+'''
+Provides an exporter which writes the guide as XMLTV and an M3U playlist, for
+use by Kodi's native PVR clients - such as IPTV Simple.
+'''
+
+import io
+import os
+import json
+import errno
+import shutil
+import logging
+import datetime
+
+from xml.sax.saxutils import escape
+from xml.sax.saxutils import quoteattr
+
+# Define the names of the exported files.
+XMLTV_FILE = 'guide.xml'
+M3U_FILE = 'channels.m3u'
+
+
+def _timestamp(epoch):
+    '''
+    Args:
+        epoch (int): A UNIX timestamp.
+
+    Returns:
+        unicode: The timestamp in XMLTV format.
+    '''
+    return u'{0} +0000'.format(
+        datetime.datetime.utcfromtimestamp(epoch).strftime('%Y%m%d%H%M%S')
+    )
+
+
+def _attribute(value):
+    '''
+    Args:
+        value (unicode): The value of an M3U attribute.
+
+    Returns:
+        unicode: The value quoted for use in an M3U #EXTINF line, which has no
+            means of escaping double quotes or line breaks.
+    '''
+    value = u' '.join((value or u'').splitlines())
+    return u'"{0}"'.format(value.replace(u'"', u"'"))
+
+
+def _replace(path):
+    '''
+    Moves the temporary copy of a file over the file, atomically where
+    supported by the OS.
+
+    Args:
+        path (str): The path of the file to replace.
+    '''
+    # Windows does not allow renaming over an existing file.
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename('{0}.tmp'.format(path), path)
+
+
+def channel(entry):
+    '''
+    Renders a channel from the NOW TV channel catalog into an XMLTV channel
+    element.
+
+    Args:
+        entry (dict): A dictionary of Channel data from the NOW TV channel
+            catalog.
+
+    Returns:
+        unicode: The XMLTV channel element.
+    '''
+    element = u'  <channel id={0}>\n'.format(quoteattr(entry['serviceKey']))
+    element += u'    <display-name>{0}</display-name>\n'.format(
+        escape(entry['channelName']),
+    )
+    if entry.get('logoUrl'):
+        element += u'    <icon src={0}/>\n'.format(
+            quoteattr(entry['logoUrl']),
+        )
+    return element + u'  </channel>\n'
+
+
+def programme(service_key, show, aspect='16-9', image_size='400'):
+    '''
+    Renders an event from the Sky EPG into an XMLTV programme element.
+
+    Args:
+        service_key (str): The service key of the channel.
+        show (dict): An event, as returned by the EPG API.
+        aspect (str): The aspect ratio of the programme icon to request.
+        image_size (str): The width of the programme icon to request.
+
+    Returns:
+        unicode: The XMLTV programme element.
+    '''
+    element = u'  <programme start="{0}" stop="{1}" channel={2}>\n'.format(
+        _timestamp(show['startTimeEpoch']),
+        _timestamp(show['startTimeEpoch'] + show['durationInSeconds']),
+        quoteattr(service_key),
+    )
+    element += u'    <title>{0}</title>\n'.format(escape(show['title']))
+    if show.get('description'):
+        element += u'    <desc>{0}</desc>\n'.format(
+            escape(show['description']),
+        )
+    if show.get('programmeImageUrlTemplate'):
+        element += u'    <icon src={0}/>\n'.format(
+            quoteattr(
+                show['programmeImageUrlTemplate'].format(
+                    type=aspect,
+                    size=image_size,
+                )
+            )
+        )
+    if show.get('isNewShow'):
+        element += u'    <new/>\n'
+    if show.get('parentalRatingCode'):
+        element += u'    <rating><value>{0}</value></rating>\n'.format(
+            escape(show['parentalRatingCode']),
+        )
+    return element + u'  </programme>\n'
+
+
+class Exporter(object):
+    '''
+    Implements an exporter which writes the guide as XMLTV and an M3U
+    playlist. Files are written by streaming, so memory use is bounded by
+    the schedule of a single channel, and are replaced atomically.
+
+    The programmes of each channel are kept as a rendered fragment, which is
+    only re-rendered once the schedule of the channel has changed in the
+    schedule store - or the programme icon size has changed. The XMLTV is
+    then assembled from the fragments.
+    '''
+
+    def __init__(self, path, aspect='16-9', image_size='400'):
+        '''
+        Args:
+            path (str): The directory to write exported files to.
+            aspect (str): The aspect ratio of programme icons to request.
+            image_size (str): The width of programme icons to request, which
+                should match the thumbnails shown in the guide.
+        '''
+        self.path = path
+        self.icon = [aspect, str(image_size)]
+        self.fragments = os.path.join(path, 'programmes')
+        self.logger = logging.getLogger('plugin.video.nowtv.export')
+
+        try:
+            os.makedirs(self.fragments)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise err
+
+    def _state(self):
+        '''
+        Returns:
+            dict: The state of the last export - containing the schedule store
+                'version' it reflects, and the programme 'icon' size used.
+        '''
+        try:
+            with open(os.path.join(self.path, 'state.json'), 'r') as fin:
+                return json.load(fin)
+        except (IOError, ValueError):
+            return {'version': 0}
+
+    def _fragment(self, service_key):
+        '''
+        Args:
+            service_key (str): The service key of the channel.
+
+        Returns:
+            str: The path to the programme fragment for the channel.
+        '''
+        return os.path.join(self.fragments, '{0}.xml'.format(service_key))
+
+    def _render(self, service_key, schedule):
+        '''
+        Renders the programmes of a channel into its fragment.
+
+        Args:
+            service_key (str): The service key of the channel.
+            schedule (list): The schedule, as returned by the EPG API.
+        '''
+        path = self._fragment(service_key)
+        with io.open('{0}.tmp'.format(path), 'w', encoding='utf-8') as fout:
+            for show in schedule[0]['events']:
+                fout.write(
+                    programme(
+                        service_key,
+                        show,
+                        aspect=self.icon[0],
+                        image_size=self.icon[1],
+                    )
+                )
+        _replace(path)
+
+    def _prune(self, channels):
+        '''
+        Removes the programme fragments of channels which are no longer
+        exported, such as those no longer entitled.
+
+        Args:
+            channels (catalog.Catalog): The channels being exported.
+
+        Returns:
+            int: The number of fragments removed.
+        '''
+        retained = set(
+            os.path.basename(self._fragment(entry['serviceKey']))
+            for entry in channels
+        )
+
+        pruned = 0
+        for name in os.listdir(self.fragments):
+            # Temporary files are left to the export which is writing them.
+            if name in retained or not name.endswith('.xml'):
+                continue
+            try:
+                os.remove(os.path.join(self.fragments, name))
+                pruned += 1
+            except OSError as err:
+                # Another export may have already removed the fragment.
+                if err.errno != errno.ENOENT:
+                    raise err
+        return pruned
+
+    def playlist(self, channels, plugin_uri):
+        '''
+        Writes the M3U playlist, with each channel played via the plugin.
+
+        Args:
+            channels (catalog.Catalog): The channels to write.
+            plugin_uri (str): The base URI for the generated playback URLs.
+        '''
+        path = os.path.join(self.path, M3U_FILE)
+        with io.open('{0}.tmp'.format(path), 'w', encoding='utf-8') as fout:
+            fout.write(u'#EXTM3U\n')
+            for entry in channels:
+                fout.write(
+                    u'#EXTINF:-1 tvg-id={0} tvg-name={1} tvg-logo={2} '
+                    u'group-title={3},{4}\n'.format(
+                        _attribute(entry['serviceKey']),
+                        _attribute(entry['channelName']),
+                        _attribute(entry.get('logoUrl')),
+                        _attribute(entry.get('section') or u'NOW TV'),
+                        u' '.join(entry['channelName'].splitlines()),
+                    )
+                )
+                fout.write(
+                    u'{0}?playback=True&service_key={1}\n'.format(
+                        plugin_uri,
+                        entry['serviceKey'],
+                    )
+                )
+        _replace(path)
+
+    def guide(self, channels):
+        '''
+        Writes the XMLTV guide, by streaming the channels followed by the
+        programme fragment of each channel.
+
+        Args:
+            channels (catalog.Catalog): The channels to write.
+        '''
+        path = os.path.join(self.path, XMLTV_FILE)
+        with io.open('{0}.tmp'.format(path), 'w', encoding='utf-8') as fout:
+            fout.write(u'<?xml version="1.0" encoding="UTF-8"?>\n')
+            fout.write(u'<tv generator-info-name="plugin.video.nowtv">\n')
+            for entry in channels:
+                fout.write(channel(entry))
+
+            for entry in channels:
+                fragment = self._fragment(entry['serviceKey'])
+                if not os.path.exists(fragment):
+                    continue
+                with io.open(fragment, 'r', encoding='utf-8') as fin:
+                    shutil.copyfileobj(fin, fout)
+
+            fout.write(u'</tv>\n')
+        _replace(path)
+
+    def update(self, channels, store, plugin_uri):
+        '''
+        Regenerates the exported files, re-rendering only the programmes of
+        channels whose schedules have changed since the last export - and
+        removing the programmes of channels no longer exported.
+
+        Args:
+            channels (catalog.Catalog): The channels to export.
+            store (store.ScheduleStore): The schedule store to export
+                schedules from.
+            plugin_uri (str): The base URI for the generated playback URLs.
+
+        Returns:
+            int: The number of channels whose programmes were re-rendered.
+        '''
+        state = self._state()
+        changes = store.changed(since=state['version'])
+
+        # All fragments are re-rendered if the programme icon size changed.
+        resized = state.get('icon') != self.icon
+        state['icon'] = self.icon
+
+        rendered = 0
+        for entry in channels:
+            service_key = entry['serviceKey']
+            if (not resized and service_key not in changes and
+                    os.path.exists(self._fragment(service_key))):
+                continue
+
+            schedule = store.get(service_key)
+            if schedule:
+                self._render(service_key, schedule)
+                rendered += 1
+
+        self.playlist(channels, plugin_uri)
+        self.guide(channels)
+        pruned = self._prune(channels)
+
+        # Track the latest change reflected, so only later changes are
+        # rendered by the next export.
+        state['version'] = max([state['version']] + list(changes.values()))
+        path = os.path.join(self.path, 'state.json')
+        with open('{0}.tmp'.format(path), 'w') as fout:
+            json.dump(state, fout)
+        _replace(path)
+
+        self.logger.debug(
+            'Exported %d channels, re-rendering %d and pruning %d',
+            len(channels),
+            rendered,
+            pruned,
+        )
+        return rendered
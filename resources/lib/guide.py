@@ -0,0 +1,50 @@
+'''
+Provides a writer which streams uEPG data to a file, one channel at a time, so
+that the full guide is never held in memory at once.
+'''
+
+import os
+import json
+
+# Define the name of the guide file in the add-on profile directory.
+GUIDE_FILE = 'guide.json'
+
+
+def write(path, channels, limit=None):
+    '''
+    Streams uEPG channeldata to a JSON file, replacing it atomically where
+    supported by the OS. Channels are consumed one at a time, so a generator
+    may be provided to bound memory use to that of a single channel.
+
+    Args:
+        path (str): The path of the file to write.
+        channels (iterable of dict): The uEPG channeldata, with guidedata
+            spliced in.
+        limit (int): An optional maximum size of the file in bytes. Once the
+            next channel would exceed it, no further channels are consumed.
+
+    Returns:
+        int: The number of channels written.
+    '''
+    written = 0
+    size = len('[]')
+    with open('{0}.tmp'.format(path), 'w') as fout:
+        fout.write('[')
+        for channeldata in channels:
+            data = json.dumps(channeldata)
+            size += len(data) + (1 if written else 0)
+            if limit and size > limit:
+                break
+
+            if written:
+                fout.write(',')
+            fout.write(data)
+            written += 1
+        fout.write(']')
+
+    # Windows does not allow renaming over an existing file.
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename('{0}.tmp'.format(path), path)
+
+    return written
@@ -1,24 +1,226 @@
 ''' Provides an XBMC compatible LogHandler for python logging. '''
 
+import json
 import xbmc
 import logging
+import threading
+import logging.handlers
 
+# Python 3 renamed Queue to queue.
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
 
-def get(name):
+# Define the size and number of structured log files to retain.
+FILE_MAX_BYTES = 1024 * 1024
+FILE_BACKUP_COUNT = 3
+
+# Debug messages are sampled in the structured log, with only one in every
+# FILE_SAMPLE_RATE records retained for each message.
+FILE_SAMPLE_RATE = 10
+
+# All loggers share a single listener thread, which emits queued records.
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def get(name, path=None):
     '''
-    Retrieves a logger with the appropriate Kodi handlers installed.
+    Retrieves a logger with the appropriate Kodi handlers installed. Records
+    are queued, and emitted from a background thread. Handlers are only
+    installed once, regardless of how many times this is called.
 
     Args:
         name (str): The name of the logger to retrieve.
+        path (str): An optional path to write a structured log to.
 
     Returns:
         A Logger object pre-configured to emit logs to Kodi.
     '''
     logger = logging.getLogger(name)
-    logger.addHandler(LogHandler())
+    if any(isinstance(h, QueueHandler) for h in logger.handlers):
+        return logger
+
+    # Only format and emit debug messages to Kodi if debug logging is enabled.
+    handler = LogHandler()
+    handler.setLevel(logging.WARNING)
+    if xbmc.getCondVisibility('System.GetBool(debug.showloginfo)'):
+        handler.setLevel(logging.DEBUG)
+
+    handlers = [handler]
+    if path:
+        handlers.append(file_handler(path))
+
+    # Gate records at the logger, so that records no handler will emit are
+    # discarded before being queued or formatted.
+    level = min(h.level for h in handlers)
+    logger.setLevel(level)
+    logger.addHandler(QueueHandler(handlers, level=level))
     return logger
 
 
+def file_handler(path):
+    '''
+    Constructs a rotating handler which writes structured (JSON lines) logs to
+    the given path, with debug messages sampled.
+
+    Args:
+        path (str): The path to write the structured log to.
+
+    Returns:
+        logging.Handler: The configured handler.
+    '''
+    handler = logging.handlers.RotatingFileHandler(
+        path,
+        maxBytes=FILE_MAX_BYTES,
+        backupCount=FILE_BACKUP_COUNT,
+    )
+    handler.setLevel(logging.DEBUG)
+    handler.setFormatter(JSONFormatter())
+    handler.addFilter(SamplingFilter(FILE_SAMPLE_RATE))
+    return handler
+
+
+def listener():
+    '''
+    Retrieves the shared listener, starting it if required.
+
+    Returns:
+        Listener: The shared listener.
+    '''
+    global _listener
+
+    with _listener_lock:
+        if _listener is None:
+            _listener = Listener()
+        return _listener
+
+
+def shutdown():
+    '''
+    Emits all queued records, and stops the shared listener. This should be
+    called before the plugin exits to ensure no records are lost.
+    '''
+    global _listener
+
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class Listener(object):
+    ''' Implements a background thread which emits queued records. '''
+
+    def __init__(self):
+        self.queue = Queue.Queue()
+        self.thread = threading.Thread(target=self._run)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        ''' Emits queued records via their handlers, until stopped. '''
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+
+            # Handler levels are checked prior to handling, to prevent
+            # formatting of records the handler will not emit.
+            (record, handlers) = item
+            for handler in handlers:
+                if record.levelno >= handler.level:
+                    handler.handle(record)
+
+    def stop(self):
+        ''' Stops the listener, once all queued records have been emitted. '''
+        self.queue.put(None)
+        self.thread.join()
+
+
+class QueueHandler(logging.Handler):
+    '''
+    Implements a handler which queues records for the shared listener to
+    emit. The listener is retrieved on each emit, so that a new listener is
+    started if logging continues after shutdown.
+    '''
+
+    def __init__(self, handlers, level=logging.NOTSET):
+        '''
+        Args:
+            handlers (list of logging.Handler): The handlers to emit with.
+            level (int): The minimum level of records to queue.
+        '''
+        super(QueueHandler, self).__init__(level=level)
+        self.handlers = handlers
+
+    def emit(self, record):
+        '''
+        Queues the record for emission by the listener.
+
+        Args:
+            record (logging.LogRecord): The logging record to queue.
+        '''
+        listener().queue.put((record, self.handlers))
+
+
+class SamplingFilter(logging.Filter):
+    '''
+    Implements a filter which retains only one in every N debug records for
+    each message. Records of a higher level are always retained.
+    '''
+
+    def __init__(self, rate):
+        '''
+        Args:
+            rate (int): The sampling rate, as one in every N records.
+        '''
+        super(SamplingFilter, self).__init__()
+        self.rate = rate
+        self.counts = {}
+
+    def filter(self, record):
+        '''
+        Args:
+            record (logging.LogRecord): The logging record to filter.
+
+        Returns:
+            bool: Whether the record should be emitted.
+        '''
+        if record.levelno > logging.DEBUG:
+            return True
+
+        key = (record.name, record.msg)
+        count = self.counts.get(key, 0)
+        self.counts[key] = count + 1
+        return count % self.rate == 0
+
+
+class JSONFormatter(logging.Formatter):
+    ''' Implements a formatter which renders records as JSON lines. '''
+
+    def format(self, record):
+        '''
+        Args:
+            record (logging.LogRecord): The logging record to format.
+
+        Returns:
+            str: The record rendered as a single line of JSON.
+        '''
+        entry = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry)
+
+
 class LogHandler(logging.StreamHandler):
     ''' Implements a log handler compatible with Kodi. '''
     LOG_LEVELS = {
@@ -3,5 +3,13 @@
 from resources.lib.nowtv import sso  # noqa: F401
 from resources.lib.nowtv import ott  # noqa: F401
 from resources.lib.nowtv import epg  # noqa: F401
+from resources.lib.nowtv import catalog  # noqa: F401
 from resources.lib.nowtv import constants  # noqa: F401
+from resources.lib.nowtv import concurrency  # noqa: F401
 from resources.lib.nowtv import exceptions  # noqa: F401
+from resources.lib.nowtv import metrics  # noqa: F401
+from resources.lib.nowtv import profiles  # noqa: F401
+from resources.lib.nowtv import scheduler  # noqa: F401
+from resources.lib.nowtv import singleflight  # noqa: F401
+from resources.lib.nowtv import store  # noqa: F401
+from resources.lib.nowtv import transport  # noqa: F401
@@ -0,0 +1,224 @@
+'''
+Implements an indexed channel catalog, which is built once per channel fetch
+and cached alongside the channel data. Catalogs may be merged, so that the
+HD and SD variants of a service form a single channel.
+'''
+
+import re
+
+from resources.lib.nowtv import constants
+
+# Matches the suffix used to name the HD variant of a channel.
+HD_SUFFIX = re.compile(r'\s+HD$', re.IGNORECASE)
+
+
+def logo(channel, width, height):
+    '''
+    Renders the URL of the dark logo for a channel.
+
+    Args:
+        channel (dict): The channel attributes, as returned by the EPG API.
+        width (int): The horizontal size of the logo in pixels.
+        height (int): The vertical size of the logo in pixels.
+
+    Returns:
+        str: The URL of the logo, or None if the channel has no dark logo.
+    '''
+    url = None
+    for entry in channel.get('logo', []):
+        if entry['type'] == 'Dark':
+            url = entry['template'].format(
+                key=entry['key'],
+                width=width,
+                height=height,
+            )
+
+    return url
+
+
+def variant_key(channel):
+    '''
+    Determines the identity of the service a channel is a variant of, by its
+    name without any HD suffix.
+
+    Args:
+        channel (dict): The channel attributes, as returned by the EPG API.
+
+    Returns:
+        str: The identity of the service.
+    '''
+    return HD_SUFFIX.sub('', channel['channelName'].strip()).lower()
+
+
+def _index(channels):
+    '''
+    Indexes a list of prepared channels into catalog data.
+
+    Args:
+        channels (list of dict): The channels, with logo URL precomputed.
+
+    Returns:
+        dict: The catalog data.
+    '''
+    data = {'channels': channels, 'sections': {}, 'formats': {}}
+
+    for channel in channels:
+        service_key = channel['serviceKey']
+        data['sections'].setdefault(
+            channel.get('section', ''),
+            [],
+        ).append(service_key)
+        data['formats'].setdefault(
+            channel.get('formatType', ''),
+            [],
+        ).append(service_key)
+
+    return data
+
+
+def build(channels, logo_width=constants.CHANNEL_LOGO_WIDTH,
+          logo_height=constants.CHANNEL_LOGO_HEIGHT):
+    '''
+    Builds the catalog data for a list of channels. Only plain types are used,
+    so that the result may be cached.
+
+    Args:
+        channels (list of dict): The channel attributes, as returned by the
+            EPG API.
+        logo_width (int): The horizontal size of logos in pixels.
+        logo_height (int): The vertical size of logos in pixels.
+
+    Returns:
+        dict: The catalog data - containing the channels in order, with their
+            logo URL and definition precomputed, and the service keys of the
+            channels in each section and format.
+    '''
+    prepared = []
+    for channel in channels:
+        channel = dict(channel)
+        channel['logoUrl'] = logo(channel, logo_width, logo_height)
+        channel['isHD'] = channel.get('formatType') == 'HD'
+        channel['variants'] = {
+            channel.get('formatType', ''): channel['serviceKey'],
+        }
+        prepared.append(channel)
+
+    return _index(prepared)
+
+
+def merge(catalogs, hd=False):
+    '''
+    Merges catalog data, such that the variants of each service form a single
+    channel. Only the preferred variant's schedule needs to be fetched and
+    played, with the service keys of all variants retained under 'variants'.
+    The SD variant is preferred, unless the account is entitled to HD.
+
+    Args:
+        catalogs (list of dict): The catalog data to merge, in order of
+            precedence for the position of channels.
+        hd (bool): Whether the account is entitled to HD playback, in which
+            case the HD variant is preferred where present.
+
+    Returns:
+        dict: The merged catalog data.
+    '''
+    order = []
+    groups = {}
+    for data in catalogs:
+        for channel in data['channels']:
+            key = variant_key(channel)
+            if key not in groups:
+                order.append(key)
+                groups[key] = []
+            groups[key].append(channel)
+
+    merged = []
+    for key in order:
+        variants = groups[key]
+        # Channels only available in one format are kept regardless.
+        preferred = [c for c in variants if c['isHD'] == hd] or variants
+        channel = dict(preferred[0])
+        channel['channelName'] = HD_SUFFIX.sub(
+            '',
+            variants[0]['channelName'].strip(),
+        )
+        channel['variants'] = {}
+        for variant in variants:
+            channel['variants'].update(variant['variants'])
+        merged.append(channel)
+
+    return _index(merged)
+
+
+class Catalog(object):
+    '''
+    Implements an indexed view over catalog data. Iterating the catalog
+    yields the channels in their original order, while channels may also be
+    looked up directly by service key - including that of any merged
+    variant - section, or format.
+    '''
+
+    def __init__(self, data):
+        '''
+        Args:
+            data (dict): The catalog data, as returned by build() or merge().
+        '''
+        self.data = data
+        self.channels = {}
+        for channel in data['channels']:
+            for service_key in channel.get('variants', {}).values():
+                self.channels[service_key] = channel
+            self.channels[channel['serviceKey']] = channel
+
+    def __iter__(self):
+        return iter(self.data['channels'])
+
+    def __len__(self):
+        return len(self.data['channels'])
+
+    def __contains__(self, service_key):
+        return service_key in self.channels
+
+    @property
+    def service_keys(self):
+        '''
+        Returns:
+            list of str: The service keys of all channels, in order.
+        '''
+        return [channel['serviceKey'] for channel in self.data['channels']]
+
+    def get(self, service_key):
+        '''
+        Args:
+            service_key (str): The service key of the channel.
+
+        Returns:
+            dict: The channel attributes, or None if not present.
+        '''
+        return self.channels.get(service_key)
+
+    def section(self, name):
+        '''
+        Args:
+            name (str): The name of the section.
+
+        Returns:
+            list of dict: The channels in the section, in order.
+        '''
+        return [
+            self.channels[service_key]
+            for service_key in self.data['sections'].get(name, [])
+        ]
+
+    def format_type(self, name):
+        '''
+        Args:
+            name (str): The format, such as 'SD' or 'HD'.
+
+        Returns:
+            list of dict: The channels in the format, in order.
+        '''
+        return [
+            self.channels[service_key]
+            for service_key in self.data['formats'].get(name, [])
+        ]
@@ -0,0 +1,156 @@
+''' Implements helpers for running NOW TV client calls concurrently. '''
+
+import sys
+import threading
+
+# Re-raising an exception from another thread with its original traceback
+# requires the three argument form of raise on Python 2, which is a syntax
+# error on Python 3.
+if sys.version_info[0] == 2:
+    exec('def _reraise(kind, value, traceback):\n'
+         '    raise kind, value, traceback\n')
+else:
+    def _reraise(kind, value, traceback):
+        raise value.with_traceback(traceback)
+
+
+def reraise(exc_info):
+    '''
+    Re-raises a captured exception, preserving the traceback of the thread
+    it was raised in.
+
+    Args:
+        exc_info (tuple): The exception, as returned by sys.exc_info().
+    '''
+    _reraise(*exc_info)
+
+
+class Task(object):
+    '''
+    Implements a minimal future, which runs the provided callable in a
+    background thread. Any exception raised by the callable is captured and
+    re-raised to the caller of result().
+    '''
+
+    def __init__(self, func, *args, **kwargs):
+        '''
+        Args:
+            func (callable): The callable to run in the background.
+            *args: Positional arguments to pass to the callable.
+            **kwargs: Keyword arguments to pass to the callable.
+        '''
+        self._result = None
+        self._error = None
+
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(func, args, kwargs),
+        )
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self, func, args, kwargs):
+        '''
+        Runs the callable, capturing its result or exception.
+
+        Args:
+            func (callable): The callable to run.
+            args (tuple): Positional arguments to pass to the callable.
+            kwargs (dict): Keyword arguments to pass to the callable.
+        '''
+        try:
+            self._result = func(*args, **kwargs)
+        except Exception:
+            self._error = sys.exc_info()
+
+    def done(self):
+        '''
+        Returns:
+            bool: Whether the callable has completed.
+        '''
+        return not self._thread.is_alive()
+
+    def wait(self, timeout=None):
+        '''
+        Waits for the callable to complete, for at most the given time.
+
+        Args:
+            timeout (float): The maximum time to wait in seconds, or None to
+                wait indefinitely.
+
+        Returns:
+            bool: Whether the callable has completed.
+        '''
+        self._thread.join(timeout)
+        return self.done()
+
+    def result(self):
+        '''
+        Waits for the callable to complete, and returns its result.
+
+        Returns:
+            The value returned by the callable.
+
+        Raises:
+            Exception: Any exception raised by the callable.
+        '''
+        self._thread.join()
+        if self._error:
+            reraise(self._error)
+
+        return self._result
+
+
+def fan_out(func, items, limit):
+    '''
+    Calls the provided callable for each item, using at most the given number
+    of threads at once.
+
+    Args:
+        func (callable): The callable to call with each item.
+        items (list): The items to call the callable with.
+        limit (int): The maximum number of concurrent calls.
+
+    Returns:
+        list: The value returned by the callable for each item, in the same
+            order as the provided items.
+
+    Raises:
+        Exception: The first exception raised by the callable. Once raised,
+            no further items are started.
+    '''
+    items = list(items)
+    results = [None] * len(items)
+    errors = []
+    pending = iter(range(len(items)))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if errors:
+                    return
+                index = next(pending, None)
+            if index is None:
+                return
+
+            try:
+                results[index] = func(items[index])
+            except Exception:
+                with lock:
+                    errors.append(sys.exc_info())
+
+    workers = []
+    for _ in range(min(limit, len(items))):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        workers.append(thread)
+
+    for thread in workers:
+        thread.join()
+
+    if errors:
+        reraise(errors[0])
+
+    return results
@@ -24,14 +24,55 @@ HTTP_HEADERS = {
 
 # Define cache keys and their lifetimes - in hours.
 CACHE_KEY_SSO_TOKEN = 'nowtv.sso.token'
+CACHE_KEY_SSO_TOKEN_EXPIRES = 'nowtv.sso.token.expires'
 CACHE_KEY_OTT_TOKEN = 'nowtv.ott.token'
-CACHE_KEY_CHANNELDATA = 'nowtv.channeldata'
+CACHE_KEY_CATALOG = 'nowtv.catalog.{0}.{1}'
+CACHE_KEY_ENTITLEMENTS = 'nowtv.entitlements'
 CACHE_KEY_SCHEDULE = 'nowtv.schedule.{0}'
+CACHE_KEY_STALE = '{0}.stale'
+CACHE_KEY_CIRCUIT = 'nowtv.circuit.{0}'
+CACHE_KEY_ARTWORK_SIZES = 'nowtv.artwork.sizes.{0}.{1}.{2}'
 
 CACHE_LIFETIME_SSO_TOKEN = 1
 CACHE_LIFETIME_OTT_TOKEN = 4
 CACHE_LIFETIME_SCHEDULE = 1
-CACHE_LIFETIME_CHANNELDATA = 8
+CACHE_LIFETIME_CATALOG = 8
+CACHE_LIFETIME_ENTITLEMENTS = 168
+CACHE_LIFETIME_STALE = 24
+CACHE_LIFETIME_ARTWORK_SIZES = 168
+
+# Define HTTP timeouts (connect, read) in seconds, and retry behaviour for
+# idempotent requests. The backoff is the base delay in seconds, which is
+# doubled on each attempt.
+HTTP_TIMEOUT_CONNECT = 3.05
+HTTP_TIMEOUT_READ = 10
+RETRY_ATTEMPTS = 3
+RETRY_BACKOFF = 0.5
+RETRY_AFTER_DEFAULT = 5
+
+# Define the channel format fetched for a combined catalog. Atlas returns the
+# channels of every format where none is specified, so a single query yields
+# both the SD and HD variants of each service.
+FORMAT_TYPE_ALL = ''
+
+# Define the size of channel logos in the catalog - in pixels.
+CHANNEL_LOGO_WIDTH = 75
+CHANNEL_LOGO_HEIGHT = 75
+
+# Define the number of deltas after which a stored schedule is compacted into a
+# single snapshot.
+SCHEDULE_STORE_COMPACT = 24
+
+# Define the maximum number of concurrent schedule fetches, and the rate limit
+# for them - in requests per second, and burst size.
+EPG_FETCH_CONCURRENCY = 8
+EPG_FETCH_RATE = 10
+EPG_FETCH_BURST = 10
+
+# Define the number of consecutive failures after which requests to a host are
+# no longer attempted, and for how long - in seconds.
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_INTERVAL = 60
 
 # Define URLs for IDAPI.
 URI_IDAPI_BASE = 'https://uiapi.id.nowtv.com'
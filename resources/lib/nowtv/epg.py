@@ -5,18 +5,87 @@ import requests
 import datetime
 import simplecache
 
+from resources.lib.nowtv import store
+from resources.lib.nowtv import catalog
+from resources.lib.nowtv import metrics
+from resources.lib.nowtv import profiles
 from resources.lib.nowtv import constants
+from resources.lib.nowtv import transport
+from resources.lib.nowtv import scheduler
 from resources.lib.nowtv import exceptions
+from resources.lib.nowtv import singleflight
 
 
 class Client(object):
     ''' Implements a NOW TV / Sky EPG client. '''
 
-    def __init__(self):
+    def __init__(self, lock_path=None, store_path=None, store_capacity=None):
+        '''
+        Args:
+            lock_path (str): An optional directory in which to create lock
+                files, to coalesce identical fetches across processes.
+            store_path (str): An optional directory in which to persist
+                schedules as deltas, rather than caching each in full.
+            store_capacity (int): The maximum number of schedules the store
+                keeps in memory, or None to keep all.
+        '''
         self.cache = simplecache.SimpleCache()
         # TODO: Fix this.
         self.logger = logging.getLogger('plugin.video.nowtv.epg')
-        self.headers = constants.HTTP_HEADERS
+        self.flights = singleflight.Group(lock_path)
+
+        self.store = None
+        if store_path:
+            self.store = store.ScheduleStore(
+                store_path,
+                capacity=store_capacity,
+            )
+
+    def _store(self, key, value, lifetime):
+        '''
+        Pushes a value into cache, along with a longer lived stale copy which
+        may be used if the upstream service is unavailable.
+
+        Args:
+            key (str): The cache key to store the value under.
+            value (object): The value to store.
+            lifetime (int): The lifetime of the value in hours.
+        '''
+        self.cache.set(
+            key,
+            value,
+            expiration=datetime.timedelta(hours=lifetime),
+        )
+        self.cache.set(
+            constants.CACHE_KEY_STALE.format(key),
+            value,
+            expiration=datetime.timedelta(
+                hours=constants.CACHE_LIFETIME_STALE,
+            )
+        )
+
+    def _stale(self, key, err):
+        '''
+        Attempts to retrieve a stale copy of a value from cache, for use when
+        the upstream service is unavailable.
+
+        Args:
+            key (str): The cache key the value was stored under.
+            err (Exception): The error which prevented a fresh fetch.
+
+        Returns:
+            The stale value from cache.
+
+        Raises:
+            BaseError: No stale copy of the value was found in cache.
+        '''
+        value = self.cache.get(constants.CACHE_KEY_STALE.format(key))
+        if value is None:
+            raise exceptions.BaseError(err)
+
+        metrics.REGISTRY.cache('stale', 'hit')
+        self.logger.warning('Using stale %s from cache: %s', key, err)
+        return value
 
     def nownext(self, service_keys):
         '''
@@ -30,13 +99,11 @@ class Client(object):
         Returns:
             A list of 'now and next' information - as returned by the EPG API.
         '''
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Accept'] = '*/*'
-        headers['Referer'] = 'https://www.nowtv.com/gb/watch/'
+        headers = profiles.EPG.build()
 
         try:
-            request = requests.get(
+            request = transport.request(
+                'GET',
                 '{0}/{1}'.format(
                     constants.URI_EPG_NOWNEXT,
                     ','.join(service_keys),
@@ -49,10 +116,31 @@ class Client(object):
 
         return request.json()
 
+    def _cached_schedule(self, cache_key, date, service_key):
+        '''
+        Retrieves the schedule for the provided service key from the schedule
+        store or cache - if current.
+
+        Args:
+            cache_key (str): The cache key for the schedule.
+            date (str): The yyyymmdd format date of the schedule.
+            service_key (str): The service key of the schedule.
+
+        Returns:
+            A list of schedule information, or None if not current.
+        '''
+        if self.store:
+            if self.store.fresh(service_key, date):
+                return self.store.get(service_key)
+            return None
+
+        return self.cache.get(cache_key)
+
     def schedule(self, date, service_key):
         '''
         Attempts to query for the schedule for the provided service key on
-        the given date.
+        the given date. Concurrent requests for the same schedule share a
+        single fetch.
 
         Args:
             date (str): The yyyymmdd format date to query for data for.
@@ -61,23 +149,55 @@ class Client(object):
         Returns:
             A list of schedule information - as returned by the EPG API.
         '''
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Accept'] = '*/*'
-        headers['Referer'] = 'https://www.nowtv.com/gb/watch/'
+        cache_key = constants.CACHE_KEY_SCHEDULE.format(service_key)
 
         # Check and return from cache first - if current.
-        if self.cache.get(constants.CACHE_KEY_SCHEDULE.format(service_key)):
-            self.logger.debug(
-                'Using schedule for %s from cache',
-                service_key
-            )
-            return self.cache.get(
-                constants.CACHE_KEY_SCHEDULE.format(service_key)
-            )
+        schedule = self._cached_schedule(cache_key, date, service_key)
+        if schedule:
+            metrics.REGISTRY.cache('schedule', 'hit')
+            self.logger.debug('Using schedule for %s from cache', service_key)
+            return schedule
+
+        metrics.REGISTRY.cache('schedule', 'miss')
+
+        return self.flights.do(
+            cache_key,
+            self._schedule,
+            cache_key,
+            date,
+            service_key,
+        )
+
+    def _throttle(self):
+        '''
+        Blocks, if required, prior to fetching a schedule from the network.
+        Schedule fetches are not rate limited by this client.
+        '''
+
+    def _schedule(self, cache_key, date, service_key):
+        '''
+        Fetches the schedule for the provided service key on the given date.
+        The cache is checked again first, as the schedule may have been
+        fetched by another process while waiting.
+
+        Args:
+            cache_key (str): The cache key for the schedule.
+            date (str): The yyyymmdd format date to query for data for.
+            service_key (str): The service key to query for schedule data for.
+
+        Returns:
+            A list of schedule information - as returned by the EPG API.
+        '''
+        schedule = self._cached_schedule(cache_key, date, service_key)
+        if schedule:
+            return schedule
+
+        self._throttle()
+        headers = profiles.EPG.build()
 
         try:
-            request = requests.get(
+            request = transport.request(
+                'GET',
                 '{0}/{1}/{2}'.format(
                     constants.URI_EPG_SCHEDULE,
                     date,
@@ -86,22 +206,34 @@ class Client(object):
                 headers=headers,
             )
             request.raise_for_status()
+        except exceptions.TransportError as err:
+            # The schedule store retains schedules beyond their lifetime, so
+            # can be used in place of a stale copy.
+            if self.store and self.store.get(service_key):
+                metrics.REGISTRY.cache('stale', 'hit')
+                self.logger.warning('Using stored %s: %s', service_key, err)
+                return self.store.get(service_key)
+            return self._stale(cache_key, err)
         except requests.exceptions.HTTPError as err:
             raise exceptions.BaseError(err)
 
-        # Push into cache, and return.
-        self.cache.set(
-            constants.CACHE_KEY_SCHEDULE.format(service_key),
-            request.json()['schedule'],
-            expiration=datetime.timedelta(
-                hours=constants.CACHE_LIFETIME_SCHEDULE,
+        # Push into the store or cache, and return.
+        schedule = request.json()['schedule']
+        if self.store:
+            self.store.update(service_key, date, schedule)
+        else:
+            self._store(
+                cache_key,
+                schedule,
+                constants.CACHE_LIFETIME_SCHEDULE,
             )
-        )
-        return request.json()['schedule']
+        return schedule
 
     def channels(self, sections, format_type='SD'):
         '''
-        Attempt to query the EPG for channel metadata.
+        Attempt to query the EPG for channel metadata, indexed into a channel
+        catalog. Concurrent requests for the same channel data share a single
+        fetch.
 
         Args:
             sections (list of str): A list of channel sections to query for,
@@ -110,44 +242,189 @@ class Client(object):
                 may be empty (default: SD).
 
         Returns:
-            A list of channel information - formatted to only include channel
-                data, and not 'atlas' metadata.
+            catalog.Catalog: The channel information - formatted to only
+                include channel data, and not 'atlas' metadata.
         '''
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Accept'] = '*/*'
-        headers['Referer'] = 'https://www.nowtv.com/gb/sign-in'
+        # The catalog is cached per set of sections and format, as the
+        # entitlements of an account may change.
+        cache_key = constants.CACHE_KEY_CATALOG.format(
+            ','.join(sorted(sections)),
+            format_type,
+        )
 
         # Check and return from cache first - if current.
-        if self.cache.get(constants.CACHE_KEY_CHANNELDATA):
+        data = self.cache.get(cache_key)
+        if data:
+            metrics.REGISTRY.cache('channels', 'hit')
             self.logger.debug('Using channel data for from cache')
-            return self.cache.get(constants.CACHE_KEY_CHANNELDATA)
+            return catalog.Catalog(data)
+
+        metrics.REGISTRY.cache('channels', 'miss')
+
+        return catalog.Catalog(
+            self.flights.do(
+                cache_key,
+                self._channels,
+                cache_key,
+                sections,
+                format_type,
+            )
+        )
+
+    def combined_channels(self, sections, hd=None):
+        '''
+        Attempt to query the EPG for channel metadata in all formats, merged
+        into a single catalog in which the HD and SD variants of a service
+        form one channel - so that each shared schedule is fetched once.
+
+        Unless specified, the HD variant of a channel is only used where the
+        channel data for the sections includes HD channels, so that SD only
+        accounts retain SD playback.
+
+        Args:
+            sections (list of str): A list of channel sections to query for,
+                this may be an empty list to query for all sections.
+            hd (bool): Whether to use the HD variant of channels, or None to
+                determine this from the channel data (default: None).
+
+        Returns:
+            catalog.Catalog: The merged channel information.
+        '''
+        channels = self.channels(sections, constants.FORMAT_TYPE_ALL)
+        if hd is None:
+            hd = bool(channels.format_type('HD'))
+        return catalog.Catalog(catalog.merge([channels.data], hd=hd))
+
+    def _channels(self, cache_key, sections, format_type):
+        '''
+        Fetches channel metadata from the EPG. The cache is checked again
+        first, as the data may have been fetched by another process while
+        waiting.
+
+        Args:
+            cache_key (str): The cache key for the channel data.
+            sections (list of str): A list of channel sections to query for.
+            format_type (str): The format to retrieve information for.
+
+        Returns:
+            dict: The catalog data for the channels.
+        '''
+        data = self.cache.get(cache_key)
+        if data:
+            return data
+
+        headers = profiles.ATLAS.build()
 
         try:
-            request = requests.get(
+            request = transport.request(
+                'GET',
                 constants.URI_ATLAS_LINEAR_CHAN,
                 params={
-                    'section': ','.join(sections),
+                    'section': ','.join(sorted(sections)),
                     'formatType': format_type
                 },
                 headers=headers,
             )
             request.raise_for_status()
+        except exceptions.TransportError as err:
+            return self._stale(cache_key, err)
         except requests.exceptions.HTTPError as err:
             raise exceptions.BaseError(err)
 
-        # Construct a list of useful data for each channel.
+        # Construct a list of useful data for each channel, and index it.
         channels = []
         for channel in request.json():
             if 'attributes' in channel:
                 channels.append(channel['attributes'])
+        data = catalog.build(channels)
 
         # Push into cache, and return.
-        self.cache.set(
-            constants.CACHE_KEY_CHANNELDATA,
-            channels,
-            expiration=datetime.timedelta(
-                hours=constants.CACHE_LIFETIME_CHANNELDATA,
-            )
+        self._store(
+            cache_key,
+            data,
+            constants.CACHE_LIFETIME_CATALOG,
+        )
+        return data
+
+
+class PooledClient(Client):
+    '''
+    Implements a NOW TV / Sky EPG client which is able to fan out schedule
+    fetches across a bounded pool of threads, in priority order and subject
+    to a rate limit. Caching, and the semantics of all other methods, are
+    identical to the Client.
+    '''
+
+    def __init__(self, lock_path=None, store_path=None, store_capacity=None,
+                 limit=constants.EPG_FETCH_CONCURRENCY):
+        '''
+        Args:
+            lock_path (str): An optional directory in which to create lock
+                files, to coalesce identical fetches across processes.
+            store_path (str): An optional directory in which to persist
+                schedules as deltas, rather than caching each in full.
+            store_capacity (int): The maximum number of schedules the store
+                keeps in memory, or None to keep all.
+            limit (int): The maximum number of concurrent schedule fetches.
+        '''
+        super(PooledClient, self).__init__(
+            lock_path=lock_path,
+            store_path=store_path,
+            store_capacity=store_capacity,
+        )
+        self.scheduler = scheduler.Scheduler(
+            limit,
+            scheduler.TokenBucket(
+                constants.EPG_FETCH_RATE,
+                constants.EPG_FETCH_BURST,
+            ),
+        )
+
+    def _throttle(self):
+        '''
+        Blocks until the rate limit allows a schedule to be fetched from the
+        network. Schedules served from the store or cache are not limited.
+        '''
+        self.scheduler.throttle()
+
+    def schedules(self, date, service_keys, priorities=None):
+        '''
+        Attempts to query for the schedules for all of the provided service
+        keys on the given date, concurrently.
+
+        Args:
+            date (str): The yyyymmdd format date to query for data for.
+            service_keys (list of str): The service keys to query for schedule
+                data for.
+            priorities (dict): An optional priority for each service key,
+                where lower values are fetched first (default: 0).
+
+        Returns:
+            dict: The schedule information for each service key - as returned
+                by the EPG API.
+        '''
+        return self.scheduler.run(
+            lambda service_key: self.schedule(date, service_key),
+            service_keys,
+            priorities=priorities,
+        )
+
+    def prefetch(self, date, service_keys, priorities=None):
+        '''
+        Fetches the schedules for all of the provided service keys on the
+        given date into the schedule store or cache, concurrently. Schedules
+        are not retained once stored - beyond the capacity of the store - so
+        that they may later be read back one at a time via schedule().
+
+        Args:
+            date (str): The yyyymmdd format date to query for data for.
+            service_keys (list of str): The service keys to query for schedule
+                data for.
+            priorities (dict): An optional priority for each service key,
+                where lower values are fetched first (default: 0).
+        '''
+        self.scheduler.run(
+            lambda service_key: self.schedule(date, service_key) and None,
+            service_keys,
+            priorities=priorities,
         )
-        return channels
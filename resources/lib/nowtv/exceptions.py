@@ -19,3 +19,26 @@ class TokenExpiredError(BaseError):
 class SessionError(BaseError):
     ''' Indicates that no current, or valid, authentication session exists. '''
     pass
+
+
+class TransportError(BaseError):
+    ''' Indicates a timeout or connection error occurred during a request. '''
+    pass
+
+
+class RateLimitedError(BaseError):
+    ''' Indicates that the server has requested requests be deferred. '''
+
+    def __init__(self, message, retry_after):
+        '''
+        Args:
+            message (str): A description of the error.
+            retry_after (float): The number of seconds to defer requests for.
+        '''
+        super(RateLimitedError, self).__init__(message)
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(TransportError):
+    ''' Indicates that a request was not attempted as the host is failing. '''
+    pass
@@ -0,0 +1,343 @@
+'''
+Implements an in-process metrics registry of counters, gauges and latency
+histograms, which is persisted across plugin invocations and may be exported
+in Prometheus text format or as JSON.
+'''
+
+import os
+import json
+import errno
+import threading
+
+from resources.lib.nowtv import singleflight
+
+# Define the upper bounds of latency histogram buckets - in seconds.
+BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float('inf'))
+
+
+def _key(name, labels):
+    '''
+    Renders a metric name and labels into a Prometheus style series key.
+
+    Args:
+        name (str): The name of the metric.
+        labels (dict): The labels of the series.
+
+    Returns:
+        str: The series key.
+    '''
+    if not labels:
+        return name
+
+    return '{0}{{{1}}}'.format(
+        name,
+        ','.join(
+            '{0}="{1}"'.format(label, labels[label])
+            for label in sorted(labels)
+        ),
+    )
+
+
+def _with_label(key, label, value):
+    '''
+    Adds a label to an existing series key.
+
+    Args:
+        key (str): The series key.
+        label (str): The name of the label to add.
+        value (str): The value of the label to add.
+
+    Returns:
+        str: The series key with the label added.
+    '''
+    if key.endswith('}'):
+        return '{0},{1}="{2}"}}'.format(key[:-1], label, value)
+    return '{0}{{{1}="{2}"}}'.format(key, label, value)
+
+
+def _suffixed(key, suffix):
+    '''
+    Adds a suffix to the metric name of a series key.
+
+    Args:
+        key (str): The series key.
+        suffix (str): The suffix to add to the metric name.
+
+    Returns:
+        str: The series key with the suffix added.
+    '''
+    (name, _, labels) = key.partition('{')
+    if labels:
+        return '{0}{1}{{{2}'.format(name, suffix, labels)
+    return '{0}{1}'.format(name, suffix)
+
+
+def quantile(histogram, q):
+    '''
+    Estimates a quantile from a histogram, by linear interpolation within the
+    bucket containing it.
+
+    Args:
+        histogram (dict): The histogram state.
+        q (float): The quantile to estimate, between 0 and 1.
+
+    Returns:
+        float: The estimated quantile, or None if the histogram is empty.
+    '''
+    if not histogram['count']:
+        return None
+
+    rank = q * histogram['count']
+    lower = 0.0
+    seen = 0
+    for (bound, count) in zip(BUCKETS, histogram['buckets']):
+        if count and seen + count >= rank:
+            # The final bucket is unbounded, so use its lower bound.
+            if bound == float('inf'):
+                return lower
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+
+    return lower
+
+
+def empty():
+    '''
+    Returns:
+        dict: An empty metrics state.
+    '''
+    return {'counters': {}, 'gauges': {}, 'histograms': {}}
+
+
+class Registry(object):
+    '''
+    Implements a thread-safe metrics registry. Only changes made by the
+    current process are held in memory, and are merged into the persisted
+    state on save - so concurrent plugin invocations do not lose updates.
+    '''
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = empty()
+
+    def increment(self, name, value=1, **labels):
+        '''
+        Increments a counter.
+
+        Args:
+            name (str): The name of the counter.
+            value (int): The value to increment by (default: 1).
+            **labels: The labels of the series.
+        '''
+        key = _key(name, labels)
+        with self.lock:
+            counters = self.state['counters']
+            counters[key] = counters.get(key, 0) + value
+
+    def gauge(self, name, value, **labels):
+        '''
+        Sets a gauge.
+
+        Args:
+            name (str): The name of the gauge.
+            value (float): The value to set.
+            **labels: The labels of the series.
+        '''
+        with self.lock:
+            self.state['gauges'][_key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        '''
+        Records an observation in a histogram.
+
+        Args:
+            name (str): The name of the histogram.
+            value (float): The value to record.
+            **labels: The labels of the series.
+        '''
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.state['histograms'].setdefault(
+                key,
+                {'buckets': [0] * len(BUCKETS), 'count': 0, 'sum': 0.0},
+            )
+            for (index, bound) in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['count'] += 1
+            histogram['sum'] += value
+
+    def cache(self, cache, result):
+        '''
+        Records the result of a cache lookup.
+
+        Args:
+            cache (str): The name of the cache.
+            result (str): The result of the lookup, such as 'hit', 'miss' or
+                'eviction'.
+        '''
+        self.increment('nowtv_cache_total', cache=cache, result=result)
+
+    def save(self, path):
+        '''
+        Merges changes made by this process into the persisted state, and
+        resets them.
+
+        Args:
+            path (str): The path to the persisted state.
+
+        Returns:
+            dict: The merged state.
+        '''
+        with self.lock:
+            (changes, self.state) = (self.state, empty())
+
+        with singleflight.file_lock('{0}.lock'.format(path)):
+            state = load(path)
+            counters = state['counters']
+            for (key, value) in changes['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+
+            state['gauges'].update(changes['gauges'])
+
+            for (key, value) in changes['histograms'].items():
+                if key not in state['histograms']:
+                    state['histograms'][key] = value
+                    continue
+
+                merged = state['histograms'][key]
+                merged['buckets'] = [
+                    a + b
+                    for (a, b) in zip(merged['buckets'], value['buckets'])
+                ]
+                merged['count'] += value['count']
+                merged['sum'] += value['sum']
+
+            with open('{0}.tmp'.format(path), 'w') as fout:
+                json.dump(state, fout)
+
+            # Windows does not allow renaming over an existing file.
+            if os.name == 'nt' and os.path.exists(path):
+                os.remove(path)
+            os.rename('{0}.tmp'.format(path), path)
+
+        return state
+
+
+def load(path):
+    '''
+    Loads persisted metrics state.
+
+    Args:
+        path (str): The path to the persisted state.
+
+    Returns:
+        dict: The persisted state, or an empty state if none exists.
+    '''
+    try:
+        with open(path, 'r') as fin:
+            return json.load(fin)
+    except IOError as err:
+        if err.errno != errno.ENOENT:
+            raise err
+    except ValueError:
+        pass
+
+    return empty()
+
+
+def _family_order(series):
+    '''
+    Orders series keys so that all series of a metric are adjacent.
+
+    Args:
+        series (dict): The series to order, by key.
+
+    Returns:
+        list of str: The ordered series keys.
+    '''
+    return sorted(series, key=lambda key: (key.partition('{')[0], key))
+
+
+def prometheus(state):
+    '''
+    Renders metrics state in Prometheus text exposition format.
+
+    Args:
+        state (dict): The metrics state to render.
+
+    Returns:
+        str: The rendered metrics.
+    '''
+    lines = []
+    types = set()
+
+    def declare(key, kind):
+        # Each metric is declared once, ahead of its first series.
+        name = key.partition('{')[0]
+        if name not in types:
+            types.add(name)
+            lines.append('# TYPE {0} {1}'.format(name, kind))
+
+    for key in _family_order(state['counters']):
+        declare(key, 'counter')
+        lines.append('{0} {1}'.format(key, state['counters'][key]))
+
+    for key in _family_order(state['gauges']):
+        declare(key, 'gauge')
+        lines.append('{0} {1}'.format(key, state['gauges'][key]))
+
+    for key in _family_order(state['histograms']):
+        declare(key, 'histogram')
+        histogram = state['histograms'][key]
+        cumulative = 0
+        for (bound, count) in zip(BUCKETS, histogram['buckets']):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(
+                '{0} {1}'.format(
+                    _with_label(_suffixed(key, '_bucket'), 'le', le),
+                    cumulative,
+                )
+            )
+        lines.append(
+            '{0} {1}'.format(_suffixed(key, '_sum'), histogram['sum'])
+        )
+        lines.append(
+            '{0} {1}'.format(_suffixed(key, '_count'), histogram['count'])
+        )
+
+    return '\n'.join(lines) + '\n'
+
+
+def summary(state):
+    '''
+    Renders metrics state as a JSON compatible summary, with p50 and p95
+    estimates for each histogram.
+
+    Args:
+        state (dict): The metrics state to render.
+
+    Returns:
+        dict: The summarised metrics.
+    '''
+    histograms = {}
+    for (key, histogram) in state['histograms'].items():
+        histograms[key] = {
+            'count': histogram['count'],
+            'sum': histogram['sum'],
+            'p50': quantile(histogram, 0.5),
+            'p95': quantile(histogram, 0.95),
+        }
+
+    return {
+        'counters': state['counters'],
+        'gauges': state['gauges'],
+        'histograms': histograms,
+    }
+
+
+# Define a registry shared by all clients in the process.
+REGISTRY = Registry()
@@ -7,7 +7,9 @@ import simplecache
 
 from hashlib import md5
 
+from resources.lib.nowtv import profiles
 from resources.lib.nowtv import constants
+from resources.lib.nowtv import transport
 from resources.lib.nowtv import exceptions
 
 
@@ -20,7 +22,6 @@ class Client(object):
         browser.
         '''
         self.cache = simplecache.SimpleCache()
-        self.headers = constants.HTTP_HEADERS
 
         # Internal variables for properties.
         if self.cache.get(constants.CACHE_KEY_OTT_TOKEN):
@@ -58,15 +59,15 @@ class Client(object):
             }
         )
 
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Content-Type'] = 'application/vnd.tokens.v1+json'
-        headers['Accept'] = 'application/vnd.tokens.v1+json'
-        headers['Referer'] = 'https://www.nowtv.com/gb/sign-in'
-        headers['Content-MD5'] = md5(bytes(payload)).hexdigest()
+        headers = profiles.OTT_AUTH_TOKENS.build(
+            {
+                'Content-MD5': md5(bytes(payload)).hexdigest(),
+            }
+        )
 
         try:
-            request = requests.post(
+            request = transport.request(
+                'POST',
                 constants.URI_OTT_AUTH_TOKENS,
                 headers=headers,
                 data=payload,
@@ -136,16 +137,15 @@ class Client(object):
                 may be due to authentication failure, or underlying transport
                 issue.
         '''
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Content-Type'] = 'application/vnd.userinfo.v2+json'
-        headers['Accept'] = 'application/vnd.userinfo.v2+json'
-        headers['Referer'] = 'https://www.nowtv.com/gb/sign-in'
-        headers['Content-MD5'] = md5(bytes('')).hexdigest()
-        headers['X-SkyOTT-UserToken'] = self.token
+        headers = profiles.OTT_AUTH_USERS_ME.build(
+            {
+                'X-SkyOTT-UserToken': self.token,
+            }
+        )
 
         try:
-            request = requests.get(
+            request = transport.request(
+                'GET',
                 constants.URI_OTT_AUTH_USERS_ME,
                 headers=headers,
             )
@@ -0,0 +1,114 @@
+'''
+Implements immutable HTTP header profiles for each NOW TV / Sky endpoint. Each
+request builds its own copy of the headers from a profile, so no state is
+shared between requests - allowing clients to be safely used concurrently.
+'''
+
+from hashlib import md5
+
+from resources.lib.nowtv import constants
+
+# Python 3.3 moved the abstract base classes into collections.abc.
+try:
+    from collections.abc import Mapping
+except ImportError:
+    from collections import Mapping
+
+
+class Profile(Mapping):
+    ''' Implements an immutable set of HTTP headers. '''
+
+    def __init__(self, *layers):
+        '''
+        Args:
+            *layers (dict): Dictionaries of headers to merge, in order.
+        '''
+        self._headers = {}
+        for layer in layers:
+            self._headers.update(layer)
+
+    def __getitem__(self, key):
+        return self._headers[key]
+
+    def __iter__(self):
+        return iter(self._headers)
+
+    def __len__(self):
+        return len(self._headers)
+
+    def __repr__(self):
+        return 'Profile({0!r})'.format(self._headers)
+
+    def extend(self, headers):
+        '''
+        Derives a new profile from this one, with the given headers added.
+
+        Args:
+            headers (dict): The headers to add.
+
+        Returns:
+            Profile: The derived profile.
+        '''
+        return Profile(self._headers, headers)
+
+    def build(self, headers=None):
+        '''
+        Builds a mutable copy of the headers for use in a single request.
+
+        Args:
+            headers (dict): Optional, request specific, headers to add.
+
+        Returns:
+            dict: The headers for the request.
+        '''
+        request = dict(self._headers)
+        if headers:
+            request.update(headers)
+        return request
+
+
+# Define the common headers presented by all NOW TV clients.
+BASE = Profile(constants.HTTP_HEADERS)
+
+# Define the profiles for each endpoint.
+IDAPI_SIGNIN = BASE.extend(
+    {
+        'Accept': 'application/vnd.siren+json',
+        'Origin': 'https://www.nowtv.com',
+        'Referer': 'https://www.nowtv.com/gb/sign-in',
+    }
+)
+OOGATEWAY_PROFILE = BASE.extend(
+    {
+        'Accept': 'application/vnd.aggregator.v3+json',
+        'Referer': 'https://www.nowtv.com/gb/watch/home',
+        'Content-Type': 'application/vnd.aggregator.v3+json',
+    }
+)
+OTT_AUTH_TOKENS = BASE.extend(
+    {
+        'Content-Type': 'application/vnd.tokens.v1+json',
+        'Accept': 'application/vnd.tokens.v1+json',
+        'Referer': 'https://www.nowtv.com/gb/sign-in',
+    }
+)
+OTT_AUTH_USERS_ME = BASE.extend(
+    {
+        'Content-Type': 'application/vnd.userinfo.v2+json',
+        'Accept': 'application/vnd.userinfo.v2+json',
+        'Referer': 'https://www.nowtv.com/gb/sign-in',
+        'Content-MD5': md5(b'').hexdigest(),
+    }
+)
+EPG = BASE.extend(
+    {
+        'Accept': '*/*',
+        'Referer': 'https://www.nowtv.com/gb/watch/',
+    }
+)
+ATLAS = BASE.extend(
+    {
+        'Accept': '*/*',
+        'Referer': 'https://www.nowtv.com/gb/sign-in',
+    }
+)
@@ -0,0 +1,196 @@
+'''
+Implements a rate limited, priority ordered, fetch scheduler for NOW TV / Sky
+endpoints.
+'''
+
+import sys
+import time
+import heapq
+import logging
+import threading
+
+from resources.lib.nowtv import metrics
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import concurrency
+from resources.lib.nowtv import exceptions
+
+
+class TokenBucket(object):
+    '''
+    Implements a thread-safe token bucket rate limiter. The bucket may also be
+    paused, such as when the server has requested requests be deferred.
+    '''
+
+    def __init__(self, rate, capacity):
+        '''
+        Args:
+            rate (float): The number of tokens added to the bucket per second.
+            capacity (int): The maximum number of tokens in the bucket.
+        '''
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def pause(self, seconds):
+        '''
+        Empties the bucket, and prevents tokens being added to it for the
+        given number of seconds.
+
+        Args:
+            seconds (float): The number of seconds to pause for.
+        '''
+        with self.lock:
+            self.tokens = 0
+            self.updated = max(self.updated, time.time() + seconds)
+
+    def acquire(self):
+        ''' Blocks until a token is available, and consumes it. '''
+        while True:
+            with self.lock:
+                now = time.time()
+                if now >= self.updated:
+                    self.tokens = min(
+                        self.capacity,
+                        self.tokens + (now - self.updated) * self.rate,
+                    )
+                    self.updated = now
+
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+
+                    wait = (1 - self.tokens) / self.rate
+                else:
+                    wait = self.updated - now
+
+            time.sleep(wait)
+
+
+class Scheduler(object):
+    '''
+    Implements a fetch scheduler which runs fetches in priority order, across
+    a bounded pool of threads, subject to a rate limit. Fetches which are rate
+    limited by the server are paused for the requested interval, and retried.
+
+    The rate limit is only applied where fetches call throttle(), prior to
+    each network request - so that fetches served from cache are not limited.
+
+    The time taken for all fetches of each priority to complete is recorded
+    in the 'nowtv_fetch_priority_seconds' histogram. For the guide, priority
+    0 gives the time to the first visible rows.
+    '''
+
+    def __init__(self, limit, bucket):
+        '''
+        Args:
+            limit (int): The maximum number of concurrent fetches.
+            bucket (TokenBucket): The rate limiter to apply to fetches.
+        '''
+        self.limit = limit
+        self.bucket = bucket
+        self.logger = logging.getLogger('plugin.video.nowtv.scheduler')
+
+    def throttle(self):
+        ''' Blocks until the rate limit allows a network request. '''
+        self.bucket.acquire()
+
+    def run(self, func, keys, priorities=None):
+        '''
+        Calls the provided callable for each key, in priority order. Keys of
+        equal priority are called in the order provided.
+
+        Args:
+            func (callable): The callable to call with each key.
+            keys (list of str): The keys to call the callable with.
+            priorities (dict): An optional priority for each key, where lower
+                values are fetched first (default: 0).
+
+        Returns:
+            dict: The value returned by the callable for each key.
+
+        Raises:
+            Exception: The first exception raised by the callable.
+        '''
+        priorities = priorities or {}
+        started = time.time()
+
+        # Track the number of outstanding fetches, and completion time, for
+        # each priority.
+        outstanding = {}
+        completed = {}
+
+        queue = []
+        for (sequence, key) in enumerate(keys):
+            priority = priorities.get(key, 0)
+            outstanding[priority] = outstanding.get(priority, 0) + 1
+            queue.append((priority, sequence, key, 0))
+        heapq.heapify(queue)
+
+        results = {}
+        errors = []
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if errors or not queue:
+                        return
+                    (priority, sequence, key, attempt) = heapq.heappop(queue)
+
+                try:
+                    result = func(key)
+                except exceptions.RateLimitedError as err:
+                    self.logger.warning(
+                        'Rate limited fetching %s, deferring for %ss',
+                        key,
+                        err.retry_after,
+                    )
+                    self.bucket.pause(err.retry_after)
+                    with lock:
+                        if attempt + 1 < constants.RETRY_ATTEMPTS:
+                            heapq.heappush(
+                                queue,
+                                (priority, sequence, key, attempt + 1),
+                            )
+                        else:
+                            errors.append(sys.exc_info())
+                    continue
+                except Exception:
+                    with lock:
+                        errors.append(sys.exc_info())
+                    return
+
+                with lock:
+                    results[key] = result
+                    outstanding[priority] -= 1
+                    if outstanding[priority] == 0:
+                        completed[priority] = time.time() - started
+
+        workers = []
+        for _ in range(min(self.limit, len(keys))):
+            thread = threading.Thread(target=worker)
+            thread.daemon = True
+            thread.start()
+            workers.append(thread)
+
+        for thread in workers:
+            thread.join()
+
+        if errors:
+            concurrency.reraise(errors[0])
+
+        for priority in sorted(completed):
+            metrics.REGISTRY.observe(
+                'nowtv_fetch_priority_seconds',
+                completed[priority],
+                priority=priority,
+            )
+            self.logger.debug(
+                'Priority %d fetches completed in %.3fs',
+                priority,
+                completed[priority],
+            )
+
+        return results
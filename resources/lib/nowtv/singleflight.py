@@ -0,0 +1,147 @@
+'''
+Implements single-flight request coalescing, to ensure that concurrent callers
+requesting the same data share a single in-flight request.
+'''
+
+import os
+import sys
+import errno
+import hashlib
+import threading
+
+from contextlib import contextmanager
+
+from resources.lib.nowtv import concurrency
+
+# In-flight calls are tracked for the process, rather than per group, so that
+# callers are coalesced even when using separate client instances.
+_calls = {}
+_calls_lock = threading.Lock()
+
+
+class _Call(object):
+    ''' Tracks the state of an in-flight call. '''
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+@contextmanager
+def file_lock(path):
+    '''
+    Implements a context manager which holds an exclusive lock on the given
+    file until exited. The lock is released by the OS if the holding process
+    exits.
+
+    Args:
+        path (str): The path to the lock file.
+    '''
+    handle = open(path, 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+
+            # LK_LOCK only retries for ~10 seconds, so loop until acquired.
+            handle.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except IOError as err:
+                    if err.errno != errno.EDEADLOCK:
+                        raise err
+            try:
+                yield
+            finally:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    finally:
+        handle.close()
+
+
+class Group(object):
+    '''
+    Implements a group of single-flight calls. Within a process, concurrent
+    callers for the same key wait on, and share the result of, the first
+    caller. Where a lock path is provided, a lock file per key is also held
+    for the duration of the call to serialise callers across processes.
+
+    As callers in other processes do not share the result directly, the
+    provided callable should check for a cached result before fetching.
+    '''
+
+    def __init__(self, lock_path=None):
+        '''
+        Args:
+            lock_path (str): An optional directory in which to create lock
+                files, to coalesce calls across processes.
+        '''
+        self.lock_path = lock_path
+        if lock_path and not os.path.isdir(lock_path):
+            try:
+                os.makedirs(lock_path)
+            except OSError as err:
+                if err.errno != errno.EEXIST:
+                    raise err
+
+    def do(self, key, func, *args, **kwargs):
+        '''
+        Calls the provided callable, unless a call for the same key is already
+        in-flight - in which case its result is returned instead.
+
+        Args:
+            key (str): The key identifying the call.
+            func (callable): The callable to call.
+            *args: Positional arguments to pass to the callable.
+            **kwargs: Keyword arguments to pass to the callable.
+
+        Returns:
+            The value returned by the callable.
+
+        Raises:
+            Exception: Any exception raised by the callable.
+        '''
+        with _calls_lock:
+            call = _calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                _calls[key] = call
+
+        if not leader:
+            call.event.wait()
+            if call.error:
+                concurrency.reraise(call.error)
+            return call.result
+
+        try:
+            if self.lock_path:
+                # Keys are hashed as bytes, as required on Python 3.
+                digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+                lock = os.path.join(
+                    self.lock_path,
+                    '{0}.lock'.format(digest),
+                )
+                with file_lock(lock):
+                    call.result = func(*args, **kwargs)
+            else:
+                call.result = func(*args, **kwargs)
+        except Exception:
+            call.error = sys.exc_info()
+            raise
+        finally:
+            with _calls_lock:
+                del _calls[key]
+            call.event.set()
+
+        return call.result
@@ -1,10 +1,13 @@
 ''' Implements a NOW TV / Sky SSO client. '''
 
+import time
 import requests
 import datetime
 import simplecache
 
+from resources.lib.nowtv import profiles
 from resources.lib.nowtv import constants
+from resources.lib.nowtv import transport
 from resources.lib.nowtv import exceptions
 
 
@@ -17,13 +20,16 @@ class Client(object):
         browser.
         '''
         self.cache = simplecache.SimpleCache()
-        self.headers = constants.HTTP_HEADERS
 
         # Internal variables for properties.
         if self.cache.get(constants.CACHE_KEY_SSO_TOKEN):
             self._token = self.cache.get(constants.CACHE_KEY_SSO_TOKEN)
+            self._expires = self.cache.get(
+                constants.CACHE_KEY_SSO_TOKEN_EXPIRES
+            )
         else:
             self._token = None
+            self._expires = None
 
     def authenticate(self, username, password):
         '''
@@ -36,14 +42,11 @@ class Client(object):
         Raises:
             SinginError: Indicates the error that occured during signin.
         '''
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Accept'] = 'application/vnd.siren+json'
-        headers['Origin'] = 'https://www.nowtv.com'
-        headers['Referer'] = 'https://www.nowtv.com/gb/sign-in'
+        headers = profiles.IDAPI_SIGNIN.build()
 
         try:
-            request = requests.post(
+            request = transport.request(
+                'POST',
                 constants.URI_IDAPI_SIGNIN,
                 headers=headers,
                 data={
@@ -84,15 +87,15 @@ class Client(object):
             BaseError: Indicates the unknown error which occurred.
             TokenExpiredError: Indicates that the current token has expired.
         '''
-        # Bolt on additional headers.
-        headers = constants.HTTP_HEADERS
-        headers['Accept'] = 'application/vnd.aggregator.v3+json'
-        headers['Referer'] = 'https://www.nowtv.com/gb/watch/home'
-        headers['Content-Type'] = 'application/vnd.aggregator.v3+json'
-        headers['X-SkyId-Token'] = 'Session {0}'.format(self.token)
+        headers = profiles.OOGATEWAY_PROFILE.build(
+            {
+                'X-SkyId-Token': 'Session {0}'.format(self.token),
+            }
+        )
 
         try:
-            request = requests.get(
+            request = transport.request(
+                'GET',
                 constants.URI_OOGATEWAY_PROFILE,
                 headers=headers,
             )
@@ -133,11 +136,31 @@ class Client(object):
         Args:
             value (str): The value to set the token to.
         '''
+        lifetime = datetime.timedelta(hours=constants.CACHE_LIFETIME_SSO_TOKEN)
+
         self._token = value
+        self._expires = None
+        if value:
+            self._expires = int(time.time() + lifetime.total_seconds())
+
         self.cache.set(
             constants.CACHE_KEY_SSO_TOKEN,
             value,
-            expiration=datetime.timedelta(
-                hours=constants.CACHE_LIFETIME_SSO_TOKEN,
-            )
+            expiration=lifetime,
+        )
+        self.cache.set(
+            constants.CACHE_KEY_SSO_TOKEN_EXPIRES,
+            self._expires,
+            expiration=lifetime,
         )
+
+    @property
+    def expires(self):
+        '''
+        Implements a getter for the expires property.
+
+        Returns:
+            int: The epoch at which the current token leaves the cache, or
+                None if unknown.
+        '''
+        return self._expires
@@ -0,0 +1,325 @@
+'''
+Implements an on-disk schedule store. Rather than replacing the schedule for a
+channel on each fetch, new schedules are diffed against the stored schedule,
+and only the changed events are persisted.
+'''
+
+import os
+import json
+import time
+import errno
+import logging
+import threading
+import collections
+
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import singleflight
+
+
+def identity(event):
+    '''
+    Determines the identity of a schedule event, by its ID and start time.
+
+    Args:
+        event (dict): An event, as returned by the EPG API.
+
+    Returns:
+        str: The identity of the event.
+    '''
+    return '{0}@{1}'.format(
+        event.get('eventId') or event.get('title'),
+        event['startTimeEpoch'],
+    )
+
+
+class ScheduleStore(object):
+    '''
+    Implements an on-disk schedule store. The schedule for each channel is
+    kept as a log of deltas - each containing the events added or changed,
+    and the identities of those removed - which is compacted into a single
+    snapshot once it grows past a threshold.
+
+    Each change is assigned a version, and is recorded in a change log to
+    allow consumers to determine which channels have changed since a given
+    version.
+
+    Replayed schedules are kept in memory so that they are not replayed on
+    each read, up to an optional number of channels - beyond which the least
+    recently used are dropped.
+    '''
+
+    def __init__(self, path, capacity=None):
+        '''
+        Args:
+            path (str): The directory in which to persist schedules.
+            capacity (int): The maximum number of replayed schedules to keep
+                in memory, or None to keep all.
+        '''
+        self.path = path
+        self.capacity = capacity
+        self.logger = logging.getLogger('plugin.video.nowtv.store')
+        self.lock = threading.Lock()
+
+        # Track bytes written, to allow measurement of write volume.
+        self.written = 0
+
+        # Replayed schedules are kept in memory, alongside the size of the log
+        # they were replayed from, so changes by other processes are seen.
+        self._channels = collections.OrderedDict()
+        self._version = 0
+
+        try:
+            os.makedirs(path)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise err
+
+    def _log(self, service_key):
+        '''
+        Args:
+            service_key (str): The service key of the channel.
+
+        Returns:
+            str: The path to the delta log for the channel.
+        '''
+        return os.path.join(self.path, '{0}.jsonl'.format(service_key))
+
+    def _changes(self):
+        '''
+        Returns:
+            str: The path to the change log.
+        '''
+        return os.path.join(self.path, 'changes.jsonl')
+
+    def _changes_lock(self):
+        '''
+        Returns:
+            str: The path to the lock file for the change log.
+        '''
+        return os.path.join(self.path, 'changes.lock')
+
+    def _next_version(self):
+        '''
+        Returns:
+            int: A new version, greater than any previously issued.
+        '''
+        with self.lock:
+            self._version = max(int(time.time() * 1000), self._version + 1)
+            return self._version
+
+    def _append(self, path, records, mode='a'):
+        '''
+        Writes the given records to a log.
+
+        Args:
+            path (str): The path to the log to write to.
+            records (list of dict): The records to write.
+            mode (str): The mode to open the log with (default: 'a').
+        '''
+        data = ''.join(
+            json.dumps(record, separators=(',', ':')) + '\n'
+            for record in records
+        )
+        with open(path, mode) as fout:
+            fout.write(data)
+
+        with self.lock:
+            self.written += len(data)
+
+    def _load(self, service_key):
+        '''
+        Replays the delta log for a channel, if changed since last replayed.
+
+        Args:
+            service_key (str): The service key of the channel.
+
+        Returns:
+            dict: The state of the channel - containing the 'date', 'version',
+                and 'events' by identity - or None if not present.
+        '''
+        path = self._log(service_key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return None
+
+        with self.lock:
+            state = self._channels.pop(service_key, None)
+            if state and state['size'] == size:
+                self._channels[service_key] = state
+                return state
+
+        state = {'size': size, 'records': 0, 'events': {}}
+        with open(path, 'r') as fin:
+            for line in fin:
+                record = json.loads(line)
+                if record.get('snapshot'):
+                    state['events'] = {}
+
+                for event in record['upsert']:
+                    state['events'][identity(event)] = event
+                for key in record['remove']:
+                    state['events'].pop(key, None)
+
+                state['date'] = record['date']
+                state['version'] = record['version']
+                state['records'] += 1
+
+        with self.lock:
+            self._channels[service_key] = state
+            while self.capacity and len(self._channels) > self.capacity:
+                self._channels.popitem(last=False)
+        return state
+
+    def fresh(self, service_key, date):
+        '''
+        Determines whether the stored schedule for a channel is current.
+
+        Args:
+            service_key (str): The service key of the channel.
+            date (str): The yyyymmdd format date the schedule must be for.
+
+        Returns:
+            bool: Whether the stored schedule is current.
+        '''
+        state = self._load(service_key)
+        if not state or state['date'] != date:
+            return False
+
+        # The modification time of the log tracks the last fetch, as it is
+        # touched even when a fetch results in no changes.
+        age = time.time() - os.path.getmtime(self._log(service_key))
+        return age < constants.CACHE_LIFETIME_SCHEDULE * 3600
+
+    def get(self, service_key):
+        '''
+        Retrieves the stored schedule for a channel.
+
+        Args:
+            service_key (str): The service key of the channel.
+
+        Returns:
+            list: The schedule for the channel - in the format returned by the
+                EPG API - or None if not present.
+        '''
+        state = self._load(service_key)
+        if not state:
+            return None
+
+        events = sorted(
+            state['events'].values(),
+            key=lambda event: event['startTimeEpoch'],
+        )
+        return [{'serviceKey': service_key, 'events': events}]
+
+    def update(self, service_key, date, schedule):
+        '''
+        Diffs the given schedule against the stored schedule for a channel,
+        and persists any changes.
+
+        Args:
+            service_key (str): The service key of the channel.
+            date (str): The yyyymmdd format date of the schedule.
+            schedule (list): The schedule, as returned by the EPG API.
+
+        Returns:
+            int: The version of the change, or None if unchanged.
+        '''
+        path = self._log(service_key)
+        state = self._load(service_key)
+
+        events = {}
+        for event in schedule[0]['events']:
+            events[identity(event)] = event
+
+        previous = {}
+        if state:
+            previous = state['events']
+
+        upsert = [
+            event for (key, event) in events.items()
+            if previous.get(key) != event
+        ]
+        remove = [key for key in previous if key not in events]
+
+        if state and state['date'] == date and not upsert and not remove:
+            os.utime(path, None)
+            return None
+
+        # Compact the log into a single snapshot once it has grown too large.
+        version = self._next_version()
+        if state and state['records'] < constants.SCHEDULE_STORE_COMPACT:
+            record = {
+                'version': version,
+                'date': date,
+                'upsert': upsert,
+                'remove': remove,
+            }
+            self._append(path, [record])
+        else:
+            record = {
+                'version': version,
+                'date': date,
+                'upsert': list(events.values()),
+                'remove': [],
+                'snapshot': True,
+            }
+            self._append(path, [record], mode='w')
+
+        # The change log is shared by all channels, so is only written under
+        # lock to prevent interleaving with compaction.
+        with singleflight.file_lock(self._changes_lock()):
+            self._append(
+                self._changes(),
+                [{'version': version, 'serviceKey': service_key}],
+            )
+
+        self.logger.debug(
+            'Stored %d changed and %d removed events for %s (%d bytes total)',
+            len(upsert),
+            len(remove),
+            service_key,
+            self.written,
+        )
+        return version
+
+    def changed(self, since=0):
+        '''
+        Determines which channels have changed since the given version.
+
+        Args:
+            since (int): The version to find changes since (default: 0).
+
+        Returns:
+            dict: The latest version of each changed channel, by service key.
+        '''
+        changes = {}
+        records = 0
+
+        with singleflight.file_lock(self._changes_lock()):
+            try:
+                with open(self._changes(), 'r') as fin:
+                    for line in fin:
+                        record = json.loads(line)
+                        changes[record['serviceKey']] = record['version']
+                        records += 1
+            except IOError:
+                return {}
+
+            # Compact the change log down to the latest version of each
+            # channel, once it is mostly superseded entries.
+            if records > len(changes) * 2:
+                self._append(
+                    self._changes(),
+                    [
+                        {'version': version, 'serviceKey': service_key}
+                        for (service_key, version) in changes.items()
+                    ],
+                    mode='w',
+                )
+
+        return dict(
+            (service_key, version)
+            for (service_key, version) in changes.items()
+            if version > since
+        )
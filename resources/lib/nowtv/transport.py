@@ -0,0 +1,238 @@
+''' Implements a resilient HTTP transport for NOW TV / Sky endpoints. '''
+
+import time
+import random
+import calendar
+import logging
+import datetime
+import requests
+import threading
+import simplecache
+
+# Python 3 moved urlparse into urllib.parse.
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
+
+from email.utils import parsedate_tz
+
+from resources.lib.nowtv import metrics
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import exceptions
+
+# Circuit breakers are shared by all clients in the process, and persisted via
+# the cache so that they survive across plugin invocations.
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+class CircuitBreaker(object):
+    '''
+    Implements a per-host circuit breaker. Once a host has failed a number of
+    consecutive times the circuit is opened, and requests to the host fail
+    immediately until the reset interval has passed. After this, a single
+    trial request is permitted which will either close or re-open the circuit.
+    '''
+
+    def __init__(self, host):
+        '''
+        Args:
+            host (str): The host this circuit breaker protects.
+        '''
+        self.host = host
+        self.cache = simplecache.SimpleCache()
+        self.lock = threading.Lock()
+
+        state = self.cache.get(constants.CACHE_KEY_CIRCUIT.format(host))
+        if state:
+            (self.failures, self.opened) = state
+        else:
+            (self.failures, self.opened) = (0, None)
+
+    def _persist(self):
+        ''' Pushes the state of the circuit into cache. '''
+        self.cache.set(
+            constants.CACHE_KEY_CIRCUIT.format(self.host),
+            (self.failures, self.opened),
+            expiration=datetime.timedelta(
+                seconds=constants.CIRCUIT_RESET_INTERVAL * 2,
+            )
+        )
+
+    def allow(self):
+        '''
+        Determines whether a request to the host should be attempted.
+
+        Returns:
+            bool: Whether the request should be attempted.
+        '''
+        with self.lock:
+            if self.opened is None:
+                return True
+
+            # Permit a trial request once the reset interval has passed, while
+            # pushing the open time forward to hold off any others.
+            if time.time() - self.opened > constants.CIRCUIT_RESET_INTERVAL:
+                self.opened = time.time()
+                return True
+
+            return False
+
+    def success(self):
+        ''' Records a successful request, closing the circuit. '''
+        with self.lock:
+            if self.failures == 0 and self.opened is None:
+                return
+
+            self.failures = 0
+            self.opened = None
+            self._persist()
+
+    def failure(self):
+        ''' Records a failed request, opening the circuit if required. '''
+        with self.lock:
+            self.failures += 1
+            if self.failures >= constants.CIRCUIT_FAILURE_THRESHOLD:
+                self.opened = time.time()
+            self._persist()
+
+
+def breaker(host):
+    '''
+    Retrieves the circuit breaker for the given host.
+
+    Args:
+        host (str): The host to retrieve the circuit breaker for.
+
+    Returns:
+        CircuitBreaker: The circuit breaker for the host.
+    '''
+    with _breakers_lock:
+        if host not in _breakers:
+            _breakers[host] = CircuitBreaker(host)
+        return _breakers[host]
+
+
+def retry_after(response):
+    '''
+    Determines how long the server has requested requests be deferred for,
+    from the Retry-After header of a response.
+
+    Args:
+        response (requests.Response): The response to inspect.
+
+    Returns:
+        float: The number of seconds to defer requests for.
+    '''
+    value = response.headers.get('Retry-After', '')
+
+    # The header may either be a number of seconds, or an HTTP date.
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    parsed = parsedate_tz(value)
+    if parsed:
+        deadline = calendar.timegm(parsed[:9]) - (parsed[9] or 0)
+        return max(0.0, deadline - time.time())
+
+    return constants.RETRY_AFTER_DEFAULT
+
+
+def request(method, url, **kwargs):
+    '''
+    Performs an HTTP request with connect and read timeouts, guarded by the
+    circuit breaker for the target host. Idempotent (GET) requests are retried
+    with jittered exponential backoff on transport errors, and server errors.
+
+    Args:
+        method (str): The HTTP method to use.
+        url (str): The URL to request.
+        **kwargs: Additional arguments to pass to requests.
+
+    Returns:
+        requests.Response: The response from the final attempt.
+
+    Raises:
+        CircuitOpenError: The circuit for the host is open.
+        RateLimitedError: The server has requested requests be deferred.
+        TransportError: The request failed due to a transport issue.
+    '''
+    logger = logging.getLogger('plugin.video.nowtv.transport')
+    host = urlparse.urlparse(url).netloc
+    circuit = breaker(host)
+
+    attempts = 1
+    if method.upper() == 'GET':
+        attempts = constants.RETRY_ATTEMPTS
+
+    kwargs.setdefault(
+        'timeout',
+        (constants.HTTP_TIMEOUT_CONNECT, constants.HTTP_TIMEOUT_READ),
+    )
+
+    for attempt in range(attempts):
+        if not circuit.allow():
+            metrics.REGISTRY.increment(
+                'nowtv_requests_total',
+                host=host,
+                status='circuit_open',
+            )
+            raise exceptions.CircuitOpenError(
+                'Circuit open for {0}'.format(host)
+            )
+
+        # Back off prior to any retry, with full jitter.
+        if attempt > 0:
+            time.sleep(
+                random.uniform(0, constants.RETRY_BACKOFF * 2 ** attempt)
+            )
+
+        started = time.time()
+        try:
+            response = requests.request(method, url, **kwargs)
+        except (requests.exceptions.Timeout,
+                requests.exceptions.ConnectionError) as err:
+            metrics.REGISTRY.increment(
+                'nowtv_requests_total',
+                host=host,
+                status='error',
+            )
+            circuit.failure()
+            logger.warning('Request to %s failed: %s', host, err)
+            if attempt + 1 == attempts:
+                raise exceptions.TransportError(err)
+            continue
+
+        metrics.REGISTRY.observe(
+            'nowtv_request_duration_seconds',
+            time.time() - started,
+            host=host,
+        )
+        metrics.REGISTRY.increment(
+            'nowtv_requests_total',
+            host=host,
+            status=response.status_code,
+        )
+
+        # Rate limiting is not a failure of the host, so is left to the caller
+        # to schedule around.
+        if response.status_code == 429:
+            circuit.success()
+            raise exceptions.RateLimitedError(
+                'Rate limited by {0}'.format(host),
+                retry_after(response),
+            )
+
+        # Server errors are treated as a failure of the host, but the response
+        # is still returned on the final attempt for the caller to handle.
+        if response.status_code >= 500:
+            circuit.failure()
+            if attempt + 1 < attempts:
+                continue
+        else:
+            circuit.success()
+
+        return response
@@ -0,0 +1,392 @@
+''' Provides management of external player processes. '''
+
+import os
+import json
+import time
+import shlex
+import errno
+import signal
+import logging
+import subprocess
+
+# Windows process access rights and exit codes used for liveness checks.
+PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+STILL_ACTIVE = 259
+
+# Launch table entries are treated as stale this many seconds before their
+# token expires, to ensure the player does not receive a token mid-expiry.
+TOKEN_EXPIRY_MARGIN = 60
+
+# Define how long to wait for a terminated player to exit - in seconds.
+TERMINATE_TIMEOUT = 5
+
+
+def deeplink(service_key, token):
+    '''
+    Builds the player arguments required to play the given service key.
+
+    Args:
+        service_key (str): The service key of the channel to play.
+        token (str): A valid SkySSO Token.
+
+    Returns:
+        list of str: The arguments to pass to the player.
+    '''
+    return shlex.split(
+        "--deeplink nowtvplayer://live/{0}?messoToken={1}".format(
+            service_key,
+            token,
+        ),
+    )
+
+
+def alive(pid):
+    '''
+    Determines whether a process with the given PID is currently running.
+
+    On Windows this is performed via the Win32 API, as os.kill() would
+    terminate the process rather than probe it. Elsewhere, processes which
+    are children of the current process are reaped first, to prevent exited
+    players from being reported as running.
+
+    Args:
+        pid (int): The PID of the process to check.
+
+    Returns:
+        bool: Whether the process is running.
+    '''
+    if os.name == 'nt':
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(
+            PROCESS_QUERY_LIMITED_INFORMATION,
+            False,
+            pid,
+        )
+        if not handle:
+            return False
+
+        code = ctypes.c_ulong()
+        success = kernel32.GetExitCodeProcess(handle, ctypes.byref(code))
+        kernel32.CloseHandle(handle)
+        return bool(success) and code.value == STILL_ACTIVE
+
+    try:
+        (reaped, _) = os.waitpid(pid, os.WNOHANG)
+        if reaped == pid:
+            return False
+    except OSError as err:
+        # Not a child of this process, so fall through to probing it.
+        if err.errno != errno.ECHILD:
+            raise err
+
+    try:
+        os.kill(pid, 0)
+    except OSError as err:
+        return err.errno == errno.EPERM
+
+    return True
+
+
+def identity(pid):
+    '''
+    Determines the identity of the process with the given PID, by its start
+    time. PIDs are reused once a process exits, so the identity is used to
+    ensure that a registered PID still refers to the same process.
+
+    Args:
+        pid (int): The PID of the process.
+
+    Returns:
+        str: The identity of the process, or None if it could not be
+            determined.
+    '''
+    if os.name == 'nt':
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(
+            PROCESS_QUERY_LIMITED_INFORMATION,
+            False,
+            pid,
+        )
+        if not handle:
+            return None
+
+        times = [ctypes.c_ulonglong() for _ in range(4)]
+        success = kernel32.GetProcessTimes(
+            handle,
+            *[ctypes.byref(value) for value in times]
+        )
+        kernel32.CloseHandle(handle)
+        return str(times[0].value) if success else None
+
+    # The start time is the 22nd field of the stat file, counted from after
+    # the command name - which may itself contain spaces.
+    try:
+        with open('/proc/{0}/stat'.format(pid), 'r') as fin:
+            return fin.read().rpartition(')')[2].split()[19]
+    except (IOError, OSError, IndexError):
+        pass
+
+    # Otherwise, such as on macOS, fall back to querying ps.
+    try:
+        with open(os.devnull, 'w') as devnull:
+            started = subprocess.check_output(
+                ['ps', '-o', 'lstart=', '-p', str(pid)],
+                stderr=devnull,
+            )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    return started.strip() or None
+
+
+def terminate(pid, timeout=TERMINATE_TIMEOUT):
+    '''
+    Terminates the process with the given PID, and waits for it to exit. The
+    identity of the process must have been verified by the caller.
+
+    Args:
+        pid (int): The PID of the process to terminate.
+        timeout (float): The maximum time to wait for the process to exit in
+            seconds.
+
+    Returns:
+        bool: Whether the process has exited.
+    '''
+    # On Windows os.kill() calls TerminateProcess, regardless of the signal.
+    try:
+        os.kill(pid, signal.SIGTERM)
+    except OSError as err:
+        if err.errno != errno.ESRCH:
+            raise err
+
+    deadline = time.time() + timeout
+    while alive(pid):
+        if time.time() > deadline:
+            return False
+        time.sleep(0.05)
+
+    return True
+
+
+def _dump(path, data):
+    '''
+    Writes data as JSON to a temporary file and moves it into place, so that
+    a concurrent reader never reads a partial file.
+
+    Args:
+        path (str): The path of the file to write.
+        data (object): The data to write.
+    '''
+    with open('{0}.tmp'.format(path), 'w') as fout:
+        json.dump(data, fout)
+
+    # Windows does not allow renaming over an existing file.
+    if os.name == 'nt' and os.path.exists(path):
+        os.remove(path)
+    os.rename('{0}.tmp'.format(path), path)
+
+
+class Registry(object):
+    ''' Implements a file backed registry of running player processes. '''
+
+    def __init__(self, path):
+        '''
+        Args:
+            path (str): The path to the file used to persist the registry.
+        '''
+        self.path = path
+
+    def get(self):
+        '''
+        Retrieves the currently registered player process, if still running.
+        A process which has since exited, or whose PID has been reused by
+        another process, is removed from the registry.
+
+        Returns:
+            dict: The registered process information - containing 'pid',
+                'identity', 'service_key' and 'started' - or None if no
+                player is running.
+        '''
+        try:
+            with open(self.path, 'r') as fin:
+                entry = json.load(fin)
+        except (IOError, OSError, ValueError):
+            return None
+
+        if (not alive(entry['pid']) or
+                identity(entry['pid']) != entry.get('identity')):
+            self.clear()
+            return None
+
+        return entry
+
+    def set(self, pid, service_key):
+        '''
+        Registers a player process.
+
+        Args:
+            pid (int): The PID of the player process.
+            service_key (str): The service key the player is playing.
+        '''
+        _dump(
+            self.path,
+            {
+                'pid': pid,
+                'identity': identity(pid),
+                'service_key': service_key,
+                'started': time.time(),
+            },
+        )
+
+    def clear(self):
+        ''' Removes any registered player process. '''
+        try:
+            os.remove(self.path)
+        except OSError as err:
+            if err.errno != errno.ENOENT:
+                raise err
+
+
+class LaunchTable(object):
+    '''
+    Implements a precomputed, file backed, table of player arguments for each
+    channel. This allows the playback path to resolve the arguments for a
+    channel with a single file read, rather than building them at play time.
+    '''
+
+    def __init__(self, path):
+        '''
+        Args:
+            path (str): The path to the file used to persist the table.
+        '''
+        self.path = path
+
+    def load(self):
+        '''
+        Reads the launch table from disk.
+
+        Returns:
+            dict: The launch table, containing the token 'expires' epoch and
+                the 'channels' arguments by service key.
+        '''
+        try:
+            with open(self.path, 'r') as fin:
+                return json.load(fin)
+        except (IOError, OSError, ValueError):
+            return {'expires': None, 'channels': {}}
+
+    def get(self, service_key):
+        '''
+        Retrieves the player arguments for the given service key, if present
+        and the token they contain is still current.
+
+        Args:
+            service_key (str): The service key of the channel to play.
+
+        Returns:
+            list of str: The arguments to pass to the player, or None if not
+                present or stale.
+        '''
+        table = self.load()
+        if not table['expires']:
+            return None
+        if table['expires'] - TOKEN_EXPIRY_MARGIN < time.time():
+            return None
+
+        return table['channels'].get(service_key)
+
+    def refresh(self, token, expires, service_keys):
+        '''
+        Rebuilds the launch table for the given token. This must be called
+        whenever the token is rotated.
+
+        Args:
+            token (str): A valid SkySSO Token.
+            expires (int): The epoch at which the token expires.
+            service_keys (list of str): The service keys to build entries for.
+        '''
+        table = {
+            'expires': expires,
+            'channels': {},
+        }
+        for service_key in service_keys:
+            table['channels'][service_key] = deeplink(service_key, token)
+
+        # A concurrent playback never reads a partial table.
+        _dump(self.path, table)
+
+
+class Player(object):
+    '''
+    Implements a manager for an external player, which is run in the
+    background and tracked via a PID registry.
+
+    Where the launcher supports it, channel switches are handed off to the
+    running instance rather than starting a new one. The arguments for the
+    new channel are written to the handoff file, and the running instance is
+    sent SIGUSR1 to indicate that it should read them. Otherwise, the running
+    instance is terminated before the new one is started - so only a single
+    player is ever running.
+    '''
+
+    def __init__(self, launcher, path, handoff=False):
+        '''
+        Args:
+            launcher (str): The path to the player executable.
+            path (str): The directory to store the registry and handoff file.
+            handoff (bool): Whether the launcher supports signal handoff.
+        '''
+        self.launcher = launcher
+        self.logger = logging.getLogger('plugin.video.nowtv.player')
+        self.registry = Registry(os.path.join(path, 'player.json'))
+        self.handoff_path = os.path.join(path, 'player.handoff')
+
+        # Handoff is only possible where signals can be sent to the player.
+        self.handoff = handoff and hasattr(signal, 'SIGUSR1')
+
+    def play(self, service_key, arguments):
+        '''
+        Starts playback of the given service key, reusing a running instance
+        of the player where possible.
+
+        Args:
+            service_key (str): The service key of the channel to play.
+            arguments (list of str): The arguments to pass to the player.
+
+        Returns:
+            int: The PID of the player handling playback.
+        '''
+        running = self.registry.get()
+
+        if running and running['service_key'] == service_key:
+            self.logger.debug('Player %d already playing', running['pid'])
+            return running['pid']
+
+        # The registry has verified the identity of the running process, so
+        # signals cannot be delivered to an unrelated process which has
+        # since reused its PID.
+        if running and self.handoff:
+            with open(self.handoff_path, 'w') as fout:
+                json.dump(arguments, fout)
+
+            self.logger.debug('Handing off to player %d', running['pid'])
+            os.kill(running['pid'], signal.SIGUSR1)
+            self.registry.set(running['pid'], service_key)
+            return running['pid']
+
+        if running:
+            self.logger.debug('Terminating player %d', running['pid'])
+            if not terminate(running['pid']):
+                self.logger.warning(
+                    'Player %d did not exit when terminated',
+                    running['pid'],
+                )
+            self.registry.clear()
+
+        process = subprocess.Popen([self.launcher] + arguments)
+        self.registry.set(process.pid, service_key)
+        return process.pid
@@ -5,19 +5,64 @@ A simple Kodi add-on which wraps 'NOW TV Player' to integrate with Kodi.
 '''
 
 import os
-import shlex
+import time
 import json
-import urlparse
 import datetime
+import xbmc
 import xbmcaddon
 import xbmcplugin
 import simplecache
-import subprocess
+
+# Python 3 moved urlparse into urllib.parse.
+try:
+    import urlparse
+except ImportError:
+    import urllib.parse as urlparse
 
 from resources.lib import ui
+from resources.lib import guide
+from resources.lib import skin
 from resources.lib import view
+from resources.lib import export
+from resources.lib import artwork
 from resources.lib import nowtv
+from resources.lib import player
 from resources.lib import logger
+from resources.lib import profiler
+
+# The number of channel rows visible in the uEPG skin, whose schedules are
+# fetched first.
+GUIDE_VISIBLE_ROWS = 9
+
+# The default memory budget for low-memory mode - in megabytes - and the
+# estimated memory held by a single parsed schedule while it is fetched - in
+# bytes - used to bound concurrent fetches to the budget.
+MEMORY_BUDGET_DEFAULT = 32
+SCHEDULE_MEMORY_ESTIMATE = 512 * 1024
+
+# Map the values of the 'definition' setting - Automatic, SD, or HD - to
+# whether the HD variants of channels are played. Automatic leaves this to be
+# determined from the channel data.
+DEFINITIONS = {'1': False, '2': True}
+
+
+def thumbnails(sizes):
+    '''
+    Selects the programme thumbnail size to request, so that artwork is
+    requested at the size it is displayed in the guide.
+
+    Args:
+        sizes (dict): The artwork sizes, as returned by artwork_sizes().
+
+    Returns:
+        dict: The thumbnail 'aspect' and 'image_size' to request.
+    '''
+    # The largest thumbnail is always sufficient, so is requested where the
+    # skin could not be measured.
+    if not sizes:
+        return {'image_size': str(skin.THUMBNAIL_WIDTHS[-1])}
+
+    return {'aspect': sizes['aspect'], 'image_size': sizes['image_size']}
 
 
 class Plugin(object):
@@ -28,19 +73,108 @@ class Plugin(object):
         Args:
             args (list of str): A list of arguments provided by the trampoline.
         '''
+        self.started = time.time()
         self.addon = xbmcaddon.Addon(id='plugin.video.nowtv')
-        self.logger = logger.get(self.addon.getAddonInfo('id'))
         self.cache = simplecache.SimpleCache()
 
+        # Ensure the add-on profile directory exists for persisted state.
+        self.profile = xbmc.translatePath(self.addon.getAddonInfo('profile'))
+        if not os.path.isdir(self.profile):
+            os.makedirs(self.profile)
+
+        # Optionally write a structured log to the profile directory.
+        log_path = None
+        if self.addon.getSetting('log_file') == 'true':
+            log_path = os.path.join(self.profile, 'nowtv.log')
+        self.logger = logger.get(self.addon.getAddonInfo('id'), log_path)
+
         # Parse arguments.
         self.uri = str(args[0])
         self.handle = int(args[1])
         self.parameters = dict(urlparse.parse_qs(args[2][1:]))
 
-        # Setup all clients.
-        self.sso = nowtv.sso.Client()
-        self.ott = nowtv.ott.Client()
-        self.epg = nowtv.epg.Client()
+        # Clients are constructed on first use, as the playback path does not
+        # require all of them.
+        self._sso = None
+        self._ott = None
+        self._epg = None
+
+    @property
+    def sso(self):
+        '''
+        Implements a lazy getter for the SSO client.
+
+        Returns:
+            nowtv.sso.Client: A NOW TV / Sky SSO client.
+        '''
+        if self._sso is None:
+            self._sso = nowtv.sso.Client()
+        return self._sso
+
+    @property
+    def ott(self):
+        '''
+        Implements a lazy getter for the OTT client.
+
+        Returns:
+            nowtv.ott.Client: A NOW TV / Sky OTT client.
+        '''
+        if self._ott is None:
+            self._ott = nowtv.ott.Client()
+        return self._ott
+
+    @property
+    def epg(self):
+        '''
+        Implements a lazy getter for the EPG client.
+
+        Returns:
+            nowtv.epg.PooledClient: A NOW TV / Sky EPG client.
+        '''
+        if self._epg is None:
+            # In low-memory mode, each concurrent fetch holds a schedule, so
+            # concurrency is bounded by the memory budget.
+            limit = nowtv.constants.EPG_FETCH_CONCURRENCY
+            if self.memory_budget:
+                limit = max(
+                    1,
+                    min(limit, self.memory_budget // SCHEDULE_MEMORY_ESTIMATE),
+                )
+
+            # In low-memory mode, only the schedule being read is kept in
+            # memory by the schedule store.
+            self._epg = nowtv.epg.PooledClient(
+                lock_path=os.path.join(self.profile, 'locks'),
+                store_path=os.path.join(self.profile, 'schedules'),
+                store_capacity=1 if self.memory_budget else None,
+                limit=limit,
+            )
+        return self._epg
+
+    @property
+    def memory_budget(self):
+        '''
+        Returns:
+            int: The memory budget in bytes if low-memory mode is enabled,
+                otherwise None.
+        '''
+        if self.addon.getSetting('low_memory') != 'true':
+            return None
+
+        try:
+            budget = int(float(self.addon.getSetting('memory_budget')))
+        except ValueError:
+            budget = MEMORY_BUDGET_DEFAULT
+        return budget * 1024 * 1024
+
+    @property
+    def hd(self):
+        '''
+        Returns:
+            bool: Whether the HD variants of channels are played, or None to
+                determine this from the channel data.
+        '''
+        return DEFINITIONS.get(self.addon.getSetting('definition'))
 
     def setting(self, name):
         '''
@@ -65,117 +199,536 @@ class Plugin(object):
 
     def run(self):
         '''
-        Plugin entrypoint, called by Kodi on launch.
+        Plugin entrypoint, called by Kodi on launch. If the hidden 'profile'
+        setting is enabled, the invocation is profiled and the results are
+        written to the add-on profile directory.
+        '''
+        if self.addon.getSetting('profile') == 'true':
+            with profiler.Profiler(os.path.join(self.profile, 'profiles')):
+                return self.dispatch()
+
+        return self.dispatch()
+
+    def dispatch(self):
+        '''
+        Dispatches the invocation to the requested handler.
         '''
         xbmcplugin.setContent(self.handle, 'videos')
         xbmcplugin.endOfDirectory(self.handle)
 
-        # Determine if we need to start playback or launch the EPG.
-        if 'playback' in self.parameters:
-            self.start_player(self.parameters['service_key'][0])
+        # Playback is handled on a fast path which skips all guide work, as
+        # the guide is already on screen when a channel is selected. Metrics
+        # are still persisted, but only exported by the next guide open.
+        playback = 'playback' in self.parameters
+        try:
+            if playback:
+                self.start_player(self.parameters['service_key'][0])
+                return
+
+            # EPG.
+            self.start_guide()
+        finally:
+            self.save_metrics(export=not playback)
 
-        # EPG.
-        self.start_guide()
+            # Ensure all queued log records are emitted prior to exit.
+            logger.shutdown()
+
+    def save_metrics(self, export=True):
+        '''
+        Persists metrics from this invocation to the profile directory, and
+        exports the accumulated metrics in Prometheus text format - along with
+        a JSON summary with p50 and p95 latency estimates.
+
+        Args:
+            export (bool): Whether to export the accumulated metrics, rather
+                than only persisting them.
+        '''
+        try:
+            state = nowtv.metrics.REGISTRY.save(
+                os.path.join(self.profile, 'metrics.json'),
+            )
+            if not export:
+                return
+
+            path = os.path.join(self.profile, 'metrics.prom')
+            with open(path, 'w') as fout:
+                fout.write(nowtv.metrics.prometheus(state))
+
+            path = os.path.join(self.profile, 'metrics.summary.json')
+            with open(path, 'w') as fout:
+                json.dump(nowtv.metrics.summary(state), fout, indent=2)
+        except (IOError, OSError) as err:
+            self.logger.warning('Unable to save metrics: %s', err)
+
+    @property
+    def launch_table(self):
+        '''
+        Implements a getter for the launch table.
+
+        Returns:
+            player.LaunchTable: The precomputed player arguments by channel.
+        '''
+        return player.LaunchTable(os.path.join(self.profile, 'launch.json'))
 
     def start_player(self, service_key):
         '''
         Attempt to spawn an instance of the external NowTV player, passing in
         the required token and service key based on the user selection.
 
+        Player arguments are read from the precomputed launch table where
+        current. Otherwise, the SSO token is taken directly from cache - which
+        only returns tokens within their lifetime - and a new token is only
+        requested if there is no cached token. The player is run in the
+        background, with any running instance reused when switching channels.
+
         Args:
             service_key (str): The service key of the channel to play.
+
+        Returns:
+            bool: Whether the player was launched.
         '''
-        launcher = [os.path.normpath(self.setting('launcher'))]
-        deeplink = shlex.split(
-            "--deeplink nowtvplayer://live/{0}?messoToken={1}".format(
-                service_key,
+        profiler.mark('launch_table')
+        arguments = self.launch_table.get(service_key)
+
+        if not arguments:
+            if not self.sso.token:
+                try:
+                    self.logger.warning('Requesting a new SSO token')
+                    self.sso.authenticate(
+                        username=self.setting('username'),
+                        password=self.setting('password'),
+                    )
+                except nowtv.exceptions.BaseError as err:
+                    self.logger.error(err)
+                    ui.toast('Error', err)
+                    return False
+
+            # Rebuild the table for the current token, so subsequent channel
+            # switches can use it.
+            service_keys = set(self.launch_table.load()['channels'].keys())
+            service_keys.add(service_key)
+            self.launch_table.refresh(
                 self.sso.token,
+                self.sso.expires,
+                service_keys,
+            )
+            arguments = player.deeplink(service_key, self.sso.token)
+
+        profiler.mark('player')
+        instance = player.Player(
+            os.path.normpath(self.setting('launcher')),
+            self.profile,
+            handoff=self.addon.getSetting('handoff') == 'true',
+        )
+        instance.play(service_key, arguments)
+
+        elapsed = time.time() - self.started
+        nowtv.metrics.REGISTRY.observe(
+            'nowtv_playback_launch_seconds',
+            elapsed,
+        )
+        self.logger.info(
+            'Launched player for %s in %.3fs',
+            service_key,
+            elapsed,
+        )
+        return True
+
+    def authenticate(self):
+        '''
+        Ensures that valid SSO and OTT tokens are present, requesting new
+        tokens where required.
+
+        Returns:
+            set: The active entitlements for the account, or None if
+                authentication failed.
+
+        Raises:
+            TransportError: The authentication services are unavailable, so
+                the caller may fall back to cached entitlements.
+        '''
+        # Gated loop is in order to allow a retry if the SSO tokens have
+        # expired, without forcing the user to restart the plugin.
+        while True:
+            # See if there is a cached SSO token for use, otherwise request
+            # a new one.
+            if not self.sso.token:
+                try:
+                    self.logger.warning('Requesting a new SSO token')
+                    self.sso.authenticate(
+                        username=self.setting('username'),
+                        password=self.setting('password'),
+                    )
+                    self.logger.warning('Cached newly created SSO token')
+                except nowtv.exceptions.TransportError:
+                    raise
+                except nowtv.exceptions.BaseError as err:
+                    self.logger.error(err)
+                    ui.toast('Error', err)
+                    return None
+
+            # Check whether the SSO token is valid.
+            try:
+                self.sso.profile()
+            except nowtv.exceptions.TokenExpiredError:
+                self.logger.warning('SSO token expired, refetching')
+                self.sso.token = None
+                continue
+
+            # See if there is a cached OTT token for use, otherwise request
+            # a new one.
+            if not self.ott.token:
+                try:
+                    self.logger.warning('Requesting a new OTT token')
+                    self.ott.authenticate(sso_token=self.sso.token)
+                except nowtv.exceptions.TransportError:
+                    raise
+                except nowtv.exceptions.BaseError as err:
+                    self.logger.error(err)
+                    ui.toast('Error', err)
+                    return None
+
+            # Check whether the OTT token is valid.
+            try:
+                entitlements = self.ott.entitlements()
+            except nowtv.exceptions.TokenExpiredError:
+                self.logger.warning('OTT token expired, refetching')
+                self.ott.token = None
+                continue
+
+            # If we got here then our tokens are valid \o/
+            return entitlements
+
+    def artwork_sizes(self):
+        '''
+        Derives the artwork sizes to request from the uEPG skin and the
+        screen resolution. The skin is only parsed once, with the result
+        cached until the skin or screen resolution changes.
+
+        Returns:
+            dict: The thumbnail 'aspect' and 'image_size', and the
+                'logo_width' and 'logo_height' to request - or an empty dict
+                to request the default sizes.
+        '''
+        (path, skin_height) = skin.find(self.addon.getAddonInfo('path'))
+        if path is None:
+            return {}
+
+        screen_height = xbmc.getInfoLabel('System.ScreenHeight')
+        if not screen_height.isdigit():
+            screen_height = skin_height
+
+        cache_key = nowtv.constants.CACHE_KEY_ARTWORK_SIZES.format(
+            path,
+            int(os.path.getmtime(path)),
+            screen_height,
+        )
+        sizes = self.cache.get(cache_key)
+        if sizes:
+            return sizes
+
+        try:
+            sizes = skin.sizes(
+                skin.measure(path),
+                int(screen_height),
+                skin_height,
+            )
+        except (IOError, SyntaxError) as err:
+            self.logger.warning('Unable to measure skin artwork: %s', err)
+            return {}
+
+        self.logger.debug('Requesting artwork sized %s', sizes)
+        self.cache.set(
+            cache_key,
+            sizes,
+            expiration=datetime.timedelta(
+                hours=nowtv.constants.CACHE_LIFETIME_ARTWORK_SIZES,
+            )
+        )
+        return sizes
+
+    def guide(self, date, sections):
+        '''
+        Fetches channel and schedule data from the EPG, and renders it into
+        uEPG format. The EPG does not require authentication.
+
+        Args:
+            date (str): The yyyymmdd format date to fetch schedules for.
+            sections (list of str): The channel sections to fetch.
+
+        Returns:
+            tuple: The channel catalog, and a list of uEPG channeldata with
+                guidedata spliced in.
+
+        Raises:
+            BaseError: An error occurred while fetching data from the EPG.
+        '''
+        channels = self.epg.combined_channels(sections=sections, hd=self.hd)
+        service_keys = channels.service_keys
+
+        # Prioritise schedules for the channels initially visible in the
+        # guide.
+        priorities = {}
+        for (row, service_key) in enumerate(service_keys):
+            priorities[service_key] = 0 if row < GUIDE_VISIBLE_ROWS else 1
+
+        schedules = self.epg.schedules(
+            date=date,
+            service_keys=service_keys,
+            priorities=priorities,
+        )
+
+        sizes = self.artwork_sizes()
+        return (
+            channels,
+            [
+                self.channeldata(
+                    channel,
+                    schedules[channel['serviceKey']],
+                    sizes,
+                )
+                for channel in channels
+            ],
+        )
+
+    def stream_guide(self, date, sections, path):
+        '''
+        Fetches channel and schedule data from the EPG into the schedule
+        store, and streams it in uEPG format to a file - reading back only a
+        single schedule at a time. Channels which would take the file beyond
+        the memory budget are left out. The EPG does not require
+        authentication.
+
+        Args:
+            date (str): The yyyymmdd format date to fetch schedules for.
+            sections (list of str): The channel sections to fetch.
+            path (str): The path of the file to write the guide to.
+
+        Returns:
+            catalog.Catalog: The channels in the guide.
+
+        Raises:
+            BaseError: An error occurred while fetching data from the EPG.
+        '''
+        channels = self.epg.combined_channels(sections=sections, hd=self.hd)
+        service_keys = channels.service_keys
+
+        priorities = {}
+        for (row, service_key) in enumerate(service_keys):
+            priorities[service_key] = 0 if row < GUIDE_VISIBLE_ROWS else 1
+
+        self.epg.prefetch(
+            date=date,
+            service_keys=service_keys,
+            priorities=priorities,
+        )
+
+        sizes = self.artwork_sizes()
+        written = guide.write(
+            path,
+            (
+                self.channeldata(
+                    channel,
+                    self.epg.schedule(date, channel['serviceKey']),
+                    sizes,
+                )
+                for channel in channels
             ),
+            limit=self.memory_budget,
         )
-        launcher.extend(deeplink)
 
-        with ui.busy():
-            subprocess.call(launcher)
+        if written < len(channels):
+            self.logger.warning(
+                'Guide limited to %d of %d channels by the memory budget',
+                written,
+                len(channels),
+            )
+            ui.toast(
+                'Low-memory mode',
+                'Showing {0} of {1} channels'.format(written, len(channels)),
+            )
+
+        return channels
+
+    def channeldata(self, channel, schedule, sizes):
+        '''
+        Renders a channel and its schedule into uEPG format.
+
+        Args:
+            channel (dict): The channel, from the channel catalog.
+            schedule (list): The schedule, as returned by the EPG API.
+            sizes (dict): The artwork sizes to request, as returned by
+                artwork_sizes().
+
+        Returns:
+            dict: The uEPG channeldata, with guidedata spliced in.
+        '''
+        channeldata = view.channeldata(
+            channel,
+            logo_width=sizes.get('logo_width'),
+            logo_height=sizes.get('logo_height'),
+        )
+        channeldata['guidedata'] = view.guidedata(
+            schedule,
+            plugin_uri=self.uri,
+            **thumbnails(sizes)
+        )
+
+        return channeldata
+
+    def export(self, channels):
+        '''
+        Exports the guide as XMLTV and an M3U playlist to the profile
+        directory, for use by Kodi's native PVR clients - if enabled.
+        Programme artwork is requested at the size shown in the guide.
+
+        Args:
+            channels (catalog.Catalog): The channels in the guide.
+        '''
+        if self.addon.getSetting('export') != 'true':
+            return
+
+        profiler.mark('export')
+        try:
+            export.Exporter(
+                os.path.join(self.profile, 'export'),
+                **thumbnails(self.artwork_sizes())
+            ).update(channels, self.epg.store, self.uri)
+        except (IOError, OSError, nowtv.exceptions.BaseError) as err:
+            self.logger.warning('Unable to export guide: %s', err)
 
     def start_guide(self):
         '''
         Start the EPG.
+
+        As the EPG does not require authentication, channel and schedule data
+        for the previously entitled sections is fetched in the background
+        while tokens are validated. If the entitlements of the account have
+        since changed, the guide is fetched again for the new sections - with
+        any overlapping schedules served from cache.
         '''
         with ui.busy():
-            # Gated loop is in order to allow a retry if the SSO tokens have
-            # expired, without forcing the user to restart the plugin.
-            authenticated = False
-            entitlements = None
-            while not authenticated:
-                # See if there is a cached SSO token for use, otherwise request
-                # a new one.
-                if not self.sso.token:
-                    try:
-                        self.logger.warning('Requesting a new SSO token')
-                        self.sso.authenticate(
-                            username=self.setting('username'),
-                            password=self.setting('password'),
-                        )
-                        self.logger.warning('Cached newly created SSO token')
-                    except nowtv.exceptions.BaseError as err:
-                        self.logger.error(err)
-                        ui.toast('Error', err)
-                        return False
-
-                # Check whether the SSO token is valid.
-                try:
-                    self.sso.profile()
-                except nowtv.exceptions.TokenExpiredError:
-                    self.logger.warning('SSO token expired, refetching')
-                    self.sso.token = None
-                    continue
-
-                # See if there is a cached OTT token for use, otherwise request
-                # a new one.
-                if not self.ott.token:
-                    try:
-                        self.logger.warning('Requesting a new OTT token')
-                        self.ott.authenticate(sso_token=self.sso.token)
-                    except nowtv.exceptions.BaseError as err:
-                        self.logger.error(err)
-                        ui.toast('Error', err)
-                        return False
-
-                # Check whether the OTT token is valid.
-                try:
-                    entitlements = self.ott.entitlements()
-                except nowtv.exceptions.TokenExpiredError:
-                    self.logger.warning('OTT token expired, refetching')
-                    self.ott.token = None
-                    continue
+            date = datetime.datetime.now().strftime('%Y%m%d')
 
-                # If we got here then our tokens are valid \o/
-                authenticated = True
+            # In low-memory mode the guide is streamed to a file, so is only
+            # fetched once entitlements are known.
+            previous = self.cache.get(nowtv.constants.CACHE_KEY_ENTITLEMENTS)
+            speculative = None
+            if previous and not self.memory_budget:
+                speculative = nowtv.concurrency.Task(
+                    self.guide,
+                    date,
+                    sorted(previous),
+                )
 
-            # Fetch data from the EPG - which does not require authentication.
-            date = datetime.datetime.now().strftime('%Y%m%d')
-            guide = []
+            # If the authentication services are unavailable, fall back to
+            # the cached entitlements and tokens rather than failing outright.
+            profiler.mark('authenticate')
             try:
-                for channel in self.epg.channels(sections=entitlements):
-                    channeldata = view.channeldata(channel)
-                    guidedata = view.guidedata(
-                        self.epg.schedule(
-                            date=date,
-                            service_key=channel['serviceKey'],
-                        ),
-                        plugin_uri=self.uri,
-                    )
+                entitlements = self.authenticate()
+            except nowtv.exceptions.TransportError as err:
+                if previous:
+                    self.logger.warning('Using cached entitlements: %s', err)
+                    entitlements = set(previous)
+                else:
+                    self.logger.error(err)
+                    ui.toast('Error', err)
+                    entitlements = None
+
+            # The speculative fetch must not outlive the invocation, where it
+            # would keep writing to the cache and store after the logger has
+            # shut down.
+            if entitlements is None:
+                if speculative:
+                    speculative.wait()
+                return False
 
-                    # Splice guidedata into channel, and push into guide.
-                    channeldata['guidedata'] = guidedata
-                    guide.append(channeldata)
+            self.cache.set(
+                nowtv.constants.CACHE_KEY_ENTITLEMENTS,
+                sorted(entitlements),
+                expiration=datetime.timedelta(
+                    hours=nowtv.constants.CACHE_LIFETIME_ENTITLEMENTS,
+                )
+            )
+
+            # Reconcile the speculative fetch with the actual entitlements.
+            # Any failure of the speculative fetch is not fatal, as the guide
+            # is then fetched again below.
+            profiler.mark('guide')
+            data = None
+            try:
+                if speculative:
+                    (channels, data) = speculative.result()
+            except Exception as err:
+                self.logger.warning('Speculative guide fetch failed: %s', err)
+
+            guide_path = os.path.join(self.profile, guide.GUIDE_FILE)
+            try:
+                if self.memory_budget:
+                    channels = self.stream_guide(
+                        date,
+                        sorted(entitlements),
+                        guide_path,
+                    )
+                elif data is None or set(previous) != set(entitlements):
+                    (channels, data) = self.guide(date, sorted(entitlements))
             except nowtv.exceptions.BaseError as err:
                 self.logger.error(err)
                 ui.toast('Error', err)
                 return False
 
+            elapsed = time.time() - self.started
+            nowtv.metrics.REGISTRY.observe('nowtv_guide_open_seconds', elapsed)
+            self.logger.info('Guide data ready in %.3fs', elapsed)
+
+        # Ensure the launch table reflects the current token and channels.
+        profiler.mark('render')
+        self.launch_table.refresh(
+            self.sso.token,
+            self.sso.expires,
+            channels.service_keys,
+        )
+
+        # In low-memory mode, render the EPG from the streamed guide file,
+        # without prefetching artwork - as the guide is not held in memory.
+        if self.memory_budget:
+            ui.epg_file(
+                guide_path,
+                skin_path=self.addon.getAddonInfo('path'),
+            )
+
+            # uEPG runs as a separate script, so the guide is exported once
+            # it has been rendered.
+            self.export(channels)
+            return
+
+        # Prefetch artwork for the visible time window into the artwork
+        # cache, waiting briefly so that the first rows render from local
+        # paths. Any artwork not yet cached is left as a remote URL.
+        cache = artwork.ArtworkCache(os.path.join(self.profile, 'artwork'))
+        prefetch = cache.prefetch(artwork.visible(data, time.time()))
+        prefetch.wait(artwork.PREFETCH_TIMEOUT)
+        cache.substitute(data)
+
         # Render the EPG using the uEPG module.
         ui.epg(
-            json.dumps(guide),
+            json.dumps(data),
             skin_path=self.addon.getAddonInfo('path'),
         )
+        self.export(channels)
+
+        # uEPG runs as a separate script, so the remaining artwork is cached
+        # for the next time the guide is opened - for a short while only, so
+        # that the invocation is not held open. Any fetches still running
+        # are then cancelled, rather than abandoned mid-write.
+        if not prefetch.wait(artwork.PREFETCH_BACKGROUND_TIMEOUT):
+            cache.cancel()
+            prefetch.wait(artwork.PREFETCH_CANCEL_TIMEOUT)
+            self.logger.debug('Artwork prefetch incomplete, cancelled')
+        self.logger.info(
+            'Fetched %d bytes of artwork within the %dh prefetch window, '
+            '%d bytes cached',
+            cache.fetched,
+            artwork.PREFETCH_WINDOW,
+            cache.size,
+        )
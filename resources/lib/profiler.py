@@ -0,0 +1,233 @@
+'''
+Provides a profiler which captures a CPU profile - and, where available, memory
+allocation snapshots - of a plugin invocation, with markers for each phase.
+
+This module has no dependency on Kodi, so that profiles captured offline are
+directly comparable with those captured by the plugin.
+'''
+
+import os
+import sys
+import time
+import errno
+import pstats
+import cProfile
+import threading
+
+# tracemalloc is only available from Python 3.4, so memory snapshots are
+# skipped where it is not present.
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# Define the number of entries to report for CPU time and allocations.
+TOP_FUNCTIONS = 40
+TOP_ALLOCATORS = 20
+
+# From Python 3.12 cProfile is implemented on sys.monitoring, so a single
+# profile covers every thread and no other profile may be enabled alongside
+# it. Prior to this, each thread must be profiled separately.
+THREAD_PROFILES = sys.version_info < (3, 12)
+
+# Only a single profiler may be active at once, as cProfile and tracemalloc
+# are both process wide.
+_active = None
+
+
+def mark(phase):
+    '''
+    Records the start of a phase with the active profiler. This is a no-op if
+    no profiler is active, so may be called unconditionally.
+
+    Args:
+        phase (str): The name of the phase.
+    '''
+    if _active is not None:
+        _active.mark(phase)
+
+
+class Profiler(object):
+    '''
+    Implements a context manager which profiles the enclosed code. On exit,
+    the raw profile is written to '<prefix>.pstats' and a report containing
+    the phase markers, the top functions by cumulative time, and the top
+    allocators of each phase to '<prefix>.txt'.
+
+    The thread entering the context, and any threads started within it, are
+    profiled by cProfile - with the profile of each thread stopped and merged
+    on exit. Threads still running at exit may only remove their own profile
+    function prior to Python 3.12, so the merged profile is captured at exit
+    and anything recorded by them afterwards is discarded. Memory allocations
+    are tracked across all threads.
+    '''
+
+    def __init__(self, path, name='profile'):
+        '''
+        Args:
+            path (str): The directory to write the profile to.
+            name (str): The name to prefix the output files with, which is
+                suffixed with the time the profile was started - to the
+                millisecond - and the process ID, so that concurrent
+                invocations do not overwrite each other's profiles.
+        '''
+        started = time.time()
+        self.path = path
+        self.prefix = os.path.join(
+            path,
+            '{0}-{1}{2:03d}-{3}'.format(
+                name,
+                time.strftime('%Y%m%d-%H%M%S', time.localtime(started)),
+                int(started * 1000) % 1000,
+                os.getpid(),
+            ),
+        )
+        self.profile = cProfile.Profile()
+        self.threads = []
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.markers = []
+        self.snapshots = []
+
+        try:
+            os.makedirs(path)
+        except OSError as err:
+            if err.errno != errno.EEXIST:
+                raise err
+
+    def mark(self, phase):
+        '''
+        Records the start of a phase, with the elapsed wall-clock time and a
+        memory snapshot where supported.
+
+        Args:
+            phase (str): The name of the phase.
+        '''
+        self.markers.append((phase, time.time()))
+        if tracemalloc and tracemalloc.is_tracing():
+            self.snapshots.append(tracemalloc.take_snapshot())
+
+    def _profile_thread(self, frame, event, arg):
+        '''
+        Starts a profile for a newly started thread. This is installed as the
+        initial profile function of new threads, and is replaced by cProfile
+        on its first call. Threads which only start running once the profile
+        has been stopped are not profiled.
+        '''
+        profile = cProfile.Profile()
+        with self.lock:
+            if self.stopped:
+                return
+            self.threads.append(profile)
+        profile.enable()
+
+    def stats(self, stream=None):
+        '''
+        Args:
+            stream (file): The file object to report the statistics to.
+
+        Returns:
+            pstats.Stats: The merged profile of all profiled threads.
+        '''
+        stats = pstats.Stats(self.profile, stream=stream)
+        with self.lock:
+            threads = list(self.threads)
+        for profile in threads:
+            # pstats refuses profiles without any calls recorded.
+            try:
+                stats.add(profile)
+            except TypeError:
+                pass
+        return stats
+
+    def __enter__(self):
+        global _active
+
+        if _active is not None:
+            raise RuntimeError('A profiler is already active')
+        _active = self
+
+        if tracemalloc:
+            tracemalloc.start()
+        self.mark('start')
+        if THREAD_PROFILES:
+            threading.setprofile(self._profile_thread)
+        self.profile.enable()
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+
+        self.profile.disable()
+
+        # Clearing the initial profile function only affects threads started
+        # from now on, so the profile of each thread is stopped explicitly.
+        threading.setprofile(None)
+        with self.lock:
+            self.stopped = True
+            threads = list(self.threads)
+        for profile in threads:
+            profile.disable()
+
+        self.mark('end')
+        if tracemalloc:
+            tracemalloc.stop()
+        _active = None
+
+        stats = self.stats()
+        stats.dump_stats('{0}.pstats'.format(self.prefix))
+        with open('{0}.txt'.format(self.prefix), 'w') as fout:
+            self.report(fout, stats)
+
+        return False
+
+    def report(self, fout, stats=None):
+        '''
+        Writes a report of the profile to the given file object.
+
+        Args:
+            fout (file): The file object to write the report to.
+            stats (pstats.Stats): The merged profile to report, as captured
+                on exit (default: the current profile).
+        '''
+        started = self.markers[0][1]
+
+        fout.write('Phases:\n')
+        for (index, (phase, marked)) in enumerate(self.markers[:-1]):
+            fout.write(
+                '  {0:<24} +{1:8.3f}s {2:8.3f}s\n'.format(
+                    phase,
+                    marked - started,
+                    self.markers[index + 1][1] - marked,
+                )
+            )
+        fout.write(
+            '  {0:<24} +{1:8.3f}s\n\n'.format(
+                'total',
+                self.markers[-1][1] - started,
+            )
+        )
+
+        # Allocations are reported as the growth over each phase.
+        if self.snapshots:
+            for (index, snapshot) in enumerate(self.snapshots[1:]):
+                fout.write(
+                    'Top allocators during {0}:\n'.format(
+                        self.markers[index][0],
+                    )
+                )
+                allocations = snapshot.compare_to(
+                    self.snapshots[index],
+                    'lineno',
+                )
+                for stat in allocations[:TOP_ALLOCATORS]:
+                    fout.write('  {0}\n'.format(stat))
+                fout.write('\n')
+        else:
+            fout.write('Allocations not tracked: tracemalloc unavailable\n\n')
+
+        fout.write('Top functions by cumulative time:\n')
+        if stats is None:
+            stats = self.stats()
+        stats.stream = fout
+        stats.sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
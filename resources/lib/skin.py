@@ -0,0 +1,165 @@
+'''
+Provides an artwork sizing layer, which derives the dimensions artwork is
+displayed at from the controls of the uEPG skin - so that the smallest
+sufficient artwork is requested from the image service.
+
+This module has no dependency on Kodi, so that sizes may be derived offline.
+'''
+
+import os
+
+from xml.etree import ElementTree
+
+# Define the uEPG guide window, and the vertical resolution of each skin
+# resolution directory - in pixels.
+GUIDE_WINDOW = 'script.module.uepg.guide.xml'
+RESOLUTIONS = (
+    ('2160p', 2160),
+    ('1080i', 1080),
+    ('1080p', 1080),
+    ('720p', 720),
+)
+
+# Define the IDs of the image controls uEPG renders channel logos into.
+LOGO_CONTROLS = tuple(str(control) for control in range(33411, 33420))
+
+# Define the texture displaying event thumbnails in the guide.
+THUMBNAIL_TEXTURE = 'Art(thumb)'
+
+# Define the aspect ratios of thumbnail templates, and the widths requested -
+# in pixels - from smallest to largest. The largest is the size requested
+# prior to sizing, so is always sufficient.
+THUMBNAIL_ASPECTS = {'16-9': 16.0 / 9}
+THUMBNAIL_WIDTHS = (200, 400, 600, 800, 1000)
+
+
+def find(path):
+    '''
+    Locates the uEPG guide window of the skin, preferring the highest
+    resolution provided.
+
+    Args:
+        path (str): The path of the add-on providing the skin.
+
+    Returns:
+        tuple: The path to the guide window, and the vertical resolution of
+            its coordinates - or (None, None) if the skin has no guide window.
+    '''
+    for (directory, height) in RESOLUTIONS:
+        window = os.path.join(
+            path,
+            'resources',
+            'skins',
+            'default',
+            directory,
+            GUIDE_WINDOW,
+        )
+        if os.path.exists(window):
+            return (window, height)
+
+    return (None, None)
+
+
+def _dimension(control, name):
+    '''
+    Args:
+        control (Element): The control element.
+        name (str): The name of the dimension, such as 'width'.
+
+    Returns:
+        int: The dimension in pixels, or None if the dimension is missing,
+            relative or automatic.
+    '''
+    value = control.findtext(name)
+    if value is None or not value.strip().isdigit():
+        return None
+
+    return int(value.strip())
+
+
+def measure(path):
+    '''
+    Measures the largest size that thumbnails and channel logos are displayed
+    at in a guide window. Only plain types are used, so that the result may
+    be cached.
+
+    Args:
+        path (str): The path to the guide window.
+
+    Returns:
+        dict: The 'thumb' and 'logo' sizes as [width, height] lists, in the
+            coordinates of the skin - either may be None if not displayed.
+    '''
+    sizes = {'thumb': None, 'logo': None}
+
+    for control in ElementTree.parse(path).iter('control'):
+        if control.get('type') != 'image':
+            continue
+
+        if control.get('id') in LOGO_CONTROLS:
+            kind = 'logo'
+        elif THUMBNAIL_TEXTURE in (control.findtext('texture') or ''):
+            kind = 'thumb'
+        else:
+            continue
+
+        width = _dimension(control, 'width')
+        height = _dimension(control, 'height')
+        if width is None or height is None:
+            continue
+
+        largest = sizes[kind] or [0, 0]
+        if width * height > largest[0] * largest[1]:
+            sizes[kind] = [width, height]
+
+    return sizes
+
+
+def thumbnail_width(box, aspect, scale=1.0):
+    '''
+    Determines the smallest thumbnail width which fills a control, as drawn
+    with its aspect ratio kept.
+
+    Args:
+        box (list of int): The [width, height] of the control.
+        aspect (str): The aspect ratio of the thumbnail template.
+        scale (float): The ratio of the screen to skin resolution.
+
+    Returns:
+        int: The thumbnail width to request.
+    '''
+    if not box:
+        return THUMBNAIL_WIDTHS[-1]
+
+    ratio = THUMBNAIL_ASPECTS[aspect]
+    needed = min(box[0], box[1] * ratio) * scale
+    for width in THUMBNAIL_WIDTHS:
+        if width >= needed:
+            return width
+
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def sizes(measured, screen_height, skin_height, aspect='16-9'):
+    '''
+    Derives the artwork sizes to request for the screen resolution.
+
+    Args:
+        measured (dict): The displayed sizes, as returned by measure().
+        screen_height (int): The vertical resolution of the screen.
+        skin_height (int): The vertical resolution of the skin coordinates.
+        aspect (str): The aspect ratio of thumbnails.
+
+    Returns:
+        dict: The thumbnail 'aspect' and 'image_size', and the 'logo_width'
+            and 'logo_height' to request - in pixels.
+    '''
+    scale = float(screen_height) / skin_height
+    logo = measured['logo'] or [None, None]
+
+    return {
+        'aspect': aspect,
+        'image_size': str(thumbnail_width(measured['thumb'], aspect, scale)),
+        'logo_width': logo[0] and int(round(logo[0] * scale)),
+        'logo_height': logo[1] and int(round(logo[1] * scale)),
+    }
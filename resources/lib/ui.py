@@ -1,11 +1,24 @@
 ''' Provides wrappers for interacting with the Kodi UI. '''
 
+import time
 import xbmc
 import xbmcgui
-import urllib
 
 from contextlib import contextmanager
 
+# Python 3 moved quote into urllib.parse.
+try:
+    from urllib import quote
+except ImportError:
+    from urllib.parse import quote
+
+from resources.lib import skin
+
+# Define the home window property used to hand EPG data to uEPG, and how long
+# to wait for uEPG to open its guide window before releasing it - in seconds.
+UEPG_PROPERTY = 'plugin.video.nowtv.guide'
+UEPG_OPEN_TIMEOUT = 10
+
 
 def toast(title, message, time=300):
     '''
@@ -33,8 +46,51 @@ def epg(json, skin_path=None):
         json (str): A stringified JSON object containing the EPG data.
         skin_path (str): An optional path to the skin to use for uEPG.
     '''
-    uepg = 'RunScript(script.module.uepg,json={}&include_hdhr={}'.format(
-        urllib.quote(json),
+    # Release any EPG data left by a previous guide opened from file.
+    xbmcgui.Window(10000).clearProperty(UEPG_PROPERTY)
+
+    _uepg('json={}'.format(quote(json)), skin_path)
+
+
+def epg_file(path, skin_path=None):
+    '''
+    Renders an EPG using uEPG, from a file containing the EPG data. The data
+    is handed over via a home window property, rather than quoted into the
+    RunScript command. The property is cleared once uEPG has opened its
+    guide window, so that the data is not held for the rest of the session.
+
+    Args:
+        path (str): The path to a file containing the EPG data as JSON.
+        skin_path (str): An optional path to the skin to use for uEPG.
+    '''
+    window = xbmcgui.Window(10000)
+    with open(path, 'r') as fin:
+        window.setProperty(UEPG_PROPERTY, fin.read())
+
+    _uepg('property={}'.format(UEPG_PROPERTY), skin_path)
+
+    # uEPG runs as a separate script, and reads the data prior to opening
+    # its guide window.
+    monitor = xbmc.Monitor()
+    visible = 'Window.IsVisible({0})'.format(skin.GUIDE_WINDOW)
+    deadline = time.time() + UEPG_OPEN_TIMEOUT
+    while not xbmc.getCondVisibility(visible) and time.time() < deadline:
+        if monitor.waitForAbort(0.1):
+            break
+
+    window.clearProperty(UEPG_PROPERTY)
+
+
+def _uepg(source, skin_path=None):
+    '''
+    Runs uEPG with the provided source of EPG data.
+
+    Args:
+        source (str): The uEPG parameter providing the EPG data.
+        skin_path (str): An optional path to the skin to use for uEPG.
+    '''
+    uepg = 'RunScript(script.module.uepg,{}&include_hdhr={}'.format(
+        source,
         False,
     )
 
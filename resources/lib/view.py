@@ -1,5 +1,7 @@
 ''' Provides functions for formatting data ready for rendering. '''
 
+from resources.lib.nowtv import catalog
+
 
 def guidedata(schedule, plugin_uri='', aspect='16-9', image_size='400'):
     '''
@@ -9,8 +11,8 @@ def guidedata(schedule, plugin_uri='', aspect='16-9', image_size='400'):
     Args:
         schedule (dict): A dictionary of schedule data from the NOW TV client.
         plugin_uri (string): The base URI for the generated playback URLs.
-        aspect (string): The aspect ratio for thumbnails (default: '19-6')
-        image_size (string): The width of thumbnails (default: '1000')
+        aspect (string): The aspect ratio for thumbnails (default: '16-9')
+        image_size (string): The width of thumbnails (default: '400')
 
     Returns:
         A Python dictionary of uEPG guidedata.
@@ -22,8 +24,8 @@ def guidedata(schedule, plugin_uri='', aspect='16-9', image_size='400'):
         thumbnail = None
         if show['programmeImageUrlTemplate']:
             thumbnail = show['programmeImageUrlTemplate'].format(
-                type='16-9',
-                size='1000',
+                type=aspect,
+                size=image_size,
             )
 
         # TODO: Fallback for titles with no image(s):
@@ -52,7 +54,6 @@ def guidedata(schedule, plugin_uri='', aspect='16-9', image_size='400'):
                 'streamdetails': {
                     'video': '',
                 },
-                'raw': show,
             }
         )
 
@@ -60,33 +61,29 @@ def guidedata(schedule, plugin_uri='', aspect='16-9', image_size='400'):
     return guidedata
 
 
-def channeldata(channel, logo_width=75, logo_height=75):
+def channeldata(channel, logo_width=None, logo_height=None):
     '''
     Attempts to transform the input channel data from the Sky EPG into a format
     compatible with uEPG channeldata elements.
 
     Args:
-        channel (dict): A dictionary of Channel data from the NOW TV client.
-        logo_width (int): The horizontal size of the logo to render in pixels.
-        logo_height (int): The vertical size of the logo to render in pixels.
+        channel (dict): A dictionary of Channel data from the NOW TV channel
+            catalog, with the logo URL precomputed.
+        logo_width (int): The width of the logo, if other than that
+            precomputed in the catalog.
+        logo_height (int): The height of the logo, if other than that
+            precomputed in the catalog.
 
     Returns:
         A Python dictionary of uEPG channeldata.
     '''
-    # Extract and construct the logo URI.
-    logo = None
-    for entry in channel['logo']:
-        if entry['type'] == 'Dark':
-            # Render the template out
-            logo = entry['template'].format(
-                key=entry['key'],
-                width=logo_width,
-                height=logo_height,
-            )
+    logo = channel['logoUrl']
+    if logo_width and logo_height:
+        logo = catalog.logo(channel, logo_width, logo_height)
 
     # Render down the uEPG compatible channeldata.
     return {
-        'isHD': True if channel['formatType'] == 'HD' else False,
+        'isHD': channel['isHD'],
         'channelname': channel['channelName'],
         'channelnumber': channel['serviceKey'],
         'channellogo': logo,
@@ -1,129 +1,209 @@
 ''' This module is intended to unpack and repack ASAR format archives. '''
 
-import re
+import io
 import os
+import mmap
 import json
+import time
 import errno
 import shutil
 import struct
+import hashlib
+import logging
 import collections
 
+from multiprocessing.pool import ThreadPool
 
-_Archive = collections.namedtuple('Archive', ['entries', 'content'])
+# Define the size of the buffer used to stream file content into an archive.
+CHUNK_SIZE = 1024 * 1024
+
+# Define the number of threads used to write files when unpacking.
+UNPACK_WORKERS = 8
+
+# Define the algorithm and block size of entry integrity hashes, per Electron.
+INTEGRITY_ALGORITHM = 'SHA256'
+INTEGRITY_BLOCK_SIZE = 4 * 1024 * 1024
+
+
+class IntegrityError(Exception):
+    ''' Indicates that the content of an entry does not match its hash. '''
+    pass
+
+
+_Archive = collections.namedtuple('Archive', ['entries', 'files'])
 class Archive(_Archive):  # noqa: E302
     '''
-    An object which contains ASAR compatible archived data and a dictionary of
-    associated metadata to track each entry offset and size.
+    An object which contains a dictionary of ASAR archive entries - tracking
+    each entry offset and size - and the files to stream into the archive.
 
     Args:
         entries (dict): A dictionary of archive entries.
-        content (bytearray): A bytearray containing the archive data.
+        files (list): A list of tuples of the path, archive path, and size of
+            each file, in the order their content appears in the archive.
     '''
     pass
 
 
+class Integrity(object):
+    '''
+    Computes the integrity of an entry - a SHA256 hash of the content and of
+    each block - as the content is streamed, so that no second read of the
+    content is required.
+
+    The integrity metadata is allocated up front, with placeholder hashes of
+    the correct length, so that the header may be written before the content
+    and rewritten in place once hashing is complete.
+    '''
+
+    def __init__(self, size):
+        '''
+        Args:
+            size (int): The size of the entry in bytes.
+        '''
+        placeholder = '0' * hashlib.sha256().digest_size * 2
+
+        # As with Electron, the final block is always recorded - so an entry
+        # which is an exact multiple of the block size ends with the hash of
+        # an empty block.
+        blocks = size // INTEGRITY_BLOCK_SIZE + 1
+
+        self.meta = {
+            'algorithm': INTEGRITY_ALGORITHM,
+            'hash': placeholder,
+            'blockSize': INTEGRITY_BLOCK_SIZE,
+            'blocks': [placeholder] * blocks,
+        }
+        self.hash = hashlib.sha256()
+        self.block = hashlib.sha256()
+        self.filled = 0
+        self.index = 0
+
+    def _finish_block(self):
+        ''' Records the hash of the current block, and starts the next. '''
+        self.meta['blocks'][self.index] = self.block.hexdigest()
+        self.block = hashlib.sha256()
+        self.filled = 0
+        self.index += 1
+
+    def update(self, chunk):
+        '''
+        Args:
+            chunk (str): The next chunk of the content of the entry.
+        '''
+        self.hash.update(chunk)
+        while chunk:
+            take = min(len(chunk), INTEGRITY_BLOCK_SIZE - self.filled)
+            self.block.update(chunk[:take])
+            self.filled += take
+            chunk = chunk[take:]
+            if self.filled == INTEGRITY_BLOCK_SIZE:
+                self._finish_block()
+
+    def finish(self):
+        '''
+        Records the final hashes, once all content has been streamed,
+        including that of the final - possibly empty - block.
+        '''
+        self._finish_block()
+        self.meta['hash'] = self.hash.hexdigest()
+
+
 def _parse_header(header):
     '''
-    Attempts to recursively parse an ASAR header into a dictionary of files,
-    their sizes, and offsets.
+    Attempts to parse an ASAR header into a dictionary of files, their sizes,
+    and offsets. The header is walked iteratively, so the depth of the tree
+    is not bounded by the recursion limit.
 
     Args:
-        header (dict): A dictionary of header data to process. This may be the
-            entire header or just a chunk - in order to support recursion.
+        header (dict): A dictionary of header data to process.
     '''
     candidates = {}
-
-    for p_name, p_meta in header.iteritems():
-        # Recurse on the presence of a files entry.
-        if 'files' in p_meta:
-            for c_name, c_meta in _parse_header(p_meta['files']).iteritems():
-                candidates['{0}/{1}'.format(p_name, c_name)] = c_meta
-        else:
-            # Otherwise, just track as a file in the current context.
-            candidates[p_name] = p_meta
+    pending = [('', header)]
+
+    while pending:
+        (prefix, files) = pending.pop()
+        for p_name, p_meta in files.items():
+            # Descend on the presence of a files entry.
+            if 'files' in p_meta:
+                pending.append(
+                    ('{0}{1}/'.format(prefix, p_name), p_meta['files'])
+                )
+            else:
+                # Otherwise, just track as a file in the current context.
+                candidates[prefix + p_name] = p_meta
 
     return candidates
 
 
 def _generate_archive(input_path):
     '''
-    Attempts to generate an archive in memory of all of the content under the
-    provided input_path.
+    Attempts to generate the layout of an archive of all of the content under
+    the provided input_path. Only the size of each file is read, as content is
+    streamed into the archive when written.
 
     Args:
         input_path (str): The path to the directory to archive.
 
     Returns:
-        Archive: A namedtuple containing the archive content as a bytearray,
-            and a dictionary of entries - including sizes and offsets.
+        Archive: A namedtuple containing a dictionary of entries - including
+            sizes and offsets - and the files to stream into the archive.
     '''
     entries = {}
-    content = bytearray()
+    files = []
+    file_start = 0
+
+    # Determine whether the top-level directory should be packed.
+    parent = input_path.split('/')[-1]
 
     for (path, dir_names, file_names) in os.walk(input_path):
+        # Determine the archive relative path for the directory once, rather
+        # than for each file.
+        directory = os.path.relpath(path, input_path).replace(os.sep, '/')
+        if directory == '.':
+            directory = ''
+
+        prefix = '/'.join(c for c in (parent, directory) if c)
+        if prefix:
+            prefix += '/'
+
         for file_name in file_names:
-            file_start = len(content)
             file_path = os.path.join(path, file_name)
 
             # Skip if the file is a symlink.
             if os.path.islink(file_path):
                 continue
 
-            # Read the entire file into the byte-array. For large archives this
-            # will eat a lot of memory.
-            with open(file_path, 'rb') as fin:
-                content.extend(bytearray(fin.read()))
-
-            # Determine the archive relative path for the file - including
-            # whether the top-level directory should be packed.
-            parent = input_path.split('/')[-1]
-            archive_path = re.sub(r'^{0}'.format(input_path), '', file_path)
-            archive_path = archive_path.lstrip('/')
-
-            if parent:
-                archive_path = "{0}/{1}".format(parent, archive_path)
+            file_size = os.path.getsize(file_path)
+            files.append((file_path, prefix + file_name, file_size))
 
             # Track the entry for the header.
-            entries[archive_path] = {
+            entries[prefix + file_name] = {
                 "offset": str(file_start),
-                "size": len(content) - file_start
+                "size": file_size
             }
+            file_start += file_size
 
-    return Archive(entries, content)
+    return Archive(entries, files)
 
 
 def _add_header_entry(entry, header, meta):
     '''
-    Provides a recursive function to build-out an hierarchy from the provided
-    file paths, with the deepest entry containing the file metadata.
+    Builds-out an hierarchy from the provided file path, with the deepest
+    entry containing the file metadata. The path is split once and walked
+    iteratively, so the cost is linear in the length of the path.
 
     Args:
-        entry (str): A string representation of the current directory.
+        entry (str): The archive relative path of the file.
         header (dict): The header entry to append to.
         meta (dict): The metadata to append to the file entry.
     '''
     components = entry.split('/')
 
-    # This could be handled by default dict, but this keeps things simple.
-    if "files" not in header:
-        header["files"] = {}
-
-    # While we have nested entries left...
-    if len(components) > 1:
-        # Reverse the order of the path (x/y/ becomes /y/x).
-        components.reverse()
+    for cwd in components[:-1]:
+        header = header.setdefault("files", {}).setdefault(cwd, {})
 
-        cwd = components.pop()
-        if cwd not in header["files"]:
-            header["files"][cwd] = {}
-
-        # Flip the ordering back, and rejoin as a path before recursing on the
-        # remaining children.
-        components.reverse()
-        _add_header_entry('/'.join(components), header["files"][cwd], meta)
-    else:
-        # It looks like we're at the end of the path (the file).
-        header["files"][components[0]] = meta
+    # It looks like we're at the end of the path (the file).
+    header.setdefault("files", {})[components[-1]] = meta
 
 
 def _generate_header(entries):
@@ -144,98 +224,410 @@ def _generate_header(entries):
     return json.dumps(header, separators=(',', ':'))
 
 
-def unpack(input_path, output_path, filename=None):
+_Entry = collections.namedtuple('Entry', ['offset', 'size', 'unpacked'])
+class Entry(_Entry):  # noqa: E302
     '''
-    Attempts to unpack the specified ASAR to the given output directory. An
-    optional 'file' parameter can be used to extract single files from the
-    archive.
+    An object which describes an entry in an ASAR.
 
     Args:
-        input_path (str): The path to the ASAR to unpack.
-        output_path (str): The path to the directory unpack the ASAR into.
-        filename (str): An optional single file to extract from the ASAR.
+        offset (int): The absolute offset of the entry content in the ASAR.
+        size (int): The size of the entry in bytes.
+        unpacked (bool): Whether the content is stored outside of the ASAR.
     '''
-    buffer = bytearray()
-
-    with open(input_path, 'rb') as fin:
-        buffer.extend(fin.read())
+    pass
 
-    # Determine the geometry of the header.
-    (pickle_size, header_sz) = struct.unpack('<II', buffer[0:8])
-    (pickle_size, document_sz) = struct.unpack('<II', buffer[8:16])
 
-    # Determine where the header JSON starts and ends.
-    header_start = 16
-    header_end = document_sz + header_start
+class EntryFile(io.RawIOBase):
+    '''
+    Implements a read-only, seekable file-like object over the content of an
+    entry in a memory-mapped ASAR. Content is only copied out of the mapping
+    as it is read.
+    '''
 
-    # Determine where the content section starts - ensuring that we take 32-bit
-    # alignment / padding into account.
-    content_start = header_end
-    while content_start % 4 != 0:
-        content_start += 1
+    def __init__(self, mapping, entry, verify=None):
+        '''
+        Args:
+            mapping (mmap.mmap): The memory-mapped ASAR.
+            entry (Entry): The entry to read.
+            verify (callable): An optional callable to verify a range of the
+                entry - relative to its start - prior to it being read.
+        '''
+        super(EntryFile, self).__init__()
+        self.mapping = mapping
+        self.entry = entry
+        self.verify = verify
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.entry.size
+
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buf):
+        count = max(0, min(len(buf), self.entry.size - self.position))
+        if self.verify and count:
+            self.verify(self.position, self.position + count)
+
+        start = self.entry.offset + self.position
+        buf[0:count] = self.mapping[start:start + count]
+        self.position += count
+        return count
+
+
+class AsarReader(object):
+    '''
+    Implements a random-access reader for ASARs. The archive is memory-mapped
+    and only the header is parsed up front, so listing or extracting a single
+    entry is proportional to the size of the header rather than the archive.
 
-    # As the header is JSON, we can just cast to string from the bytearray.
-    header = json.loads(str(buffer[header_start:header_end]))
+    Views returned by read() reference the mapping directly, and must not be
+    used once the reader is closed.
 
-    for file, meta in _parse_header(header['files']).iteritems():
-        directory = os.path.dirname(file)
+    Where entries carry integrity metadata, the blocks of an entry are
+    verified lazily as they are first accessed.
+    '''
 
-        # Allow for optional extraction of a single file by path, in which case
-        # the directory hierarchy will NOT be created.
-        if filename:
-            if file == filename:
-                file = os.path.basename(file)
-                directory = None
-            else:
+    def __init__(self, path, verify=True):
+        '''
+        Args:
+            path (str): The path to the ASAR to read.
+            verify (bool): Whether to verify the integrity of entries as they
+                are accessed, where present (default: True).
+        '''
+        self.path = path
+        self.verify = verify
+        self.verified = set()
+        self.handle = open(path, 'rb')
+        self.mapping = mmap.mmap(
+            self.handle.fileno(),
+            0,
+            access=mmap.ACCESS_READ,
+        )
+
+        # Python 2 mmap objects do not support memoryview, in which case the
+        # legacy buffer interface is used instead - which is also zero-copy.
+        try:
+            self.view = memoryview(self.mapping)
+        except TypeError:
+            self.view = None
+
+        # Determine the geometry of the header.
+        (pickle_size, header_sz) = struct.unpack('<II', self.mapping[0:8])
+        (pickle_size, document_sz) = struct.unpack('<II', self.mapping[8:16])
+
+        # Determine where the header JSON starts and ends.
+        header_start = 16
+        header_end = document_sz + header_start
+
+        # Determine where the content section starts - ensuring that we take
+        # 32-bit alignment / padding into account.
+        content_start = header_end
+        while content_start % 4 != 0:
+            content_start += 1
+
+        header = json.loads(self.mapping[header_start:header_end])
+
+        # Index the entries by path, with absolute offsets. The metadata of
+        # each entry is also retained, as it may carry additional fields.
+        self.content_start = content_start
+        self.meta = _parse_header(header['files'])
+        self.index = {}
+        for (name, meta) in self.meta.items():
+            unpacked = bool(meta.get('unpacked'))
+            offset = None
+            if not unpacked:
+                offset = content_start + int(meta['offset'])
+            self.index[name] = Entry(offset, meta['size'], unpacked)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        ''' Unmaps and closes the ASAR. '''
+        if self.view is not None:
+            self.view.release()
+        self.mapping.close()
+        self.handle.close()
+
+    def list(self):
+        '''
+        Returns:
+            list of str: The paths of all entries in the ASAR.
+        '''
+        return sorted(self.index)
+
+    def stat(self, name):
+        '''
+        Args:
+            name (str): The path of the entry in the ASAR.
+
+        Returns:
+            Entry: The offset, size, and location of the entry.
+
+        Raises:
+            KeyError: The entry does not exist.
+        '''
+        return self.index[name]
+
+    def unpacked_path(self, name):
+        '''
+        Args:
+            name (str): The path of the entry in the ASAR.
+
+        Returns:
+            str: The path of the entry, if it is stored outside of the ASAR.
+        '''
+        return os.path.join(os.path.dirname(self.path), name)
+
+    def _view(self, offset, size):
+        '''
+        Args:
+            offset (int): The absolute offset of the range in the ASAR.
+            size (int): The size of the range in bytes.
+
+        Returns:
+            A zero-copy memoryview (or buffer on Python 2) of the range.
+        '''
+        if self.view is not None:
+            return self.view[offset:offset + size]
+        return buffer(self.mapping, offset, size)  # noqa: F821
+
+    def check(self, name, start=0, end=None):
+        '''
+        Verifies the blocks of an entry which overlap the given range, where
+        the entry carries integrity metadata. Each block is only verified
+        once.
+
+        Args:
+            name (str): The path of the entry in the ASAR.
+            start (int): The start of the range, relative to the entry.
+            end (int): The end of the range, relative to the entry (default:
+                the end of the entry).
+
+        Raises:
+            IntegrityError: The content of a block does not match its hash.
+        '''
+        integrity = self.meta[name].get('integrity')
+        if not self.verify or not integrity:
+            return
+
+        entry = self.index[name]
+        if end is None:
+            end = entry.size
+
+        block_size = integrity['blockSize']
+        first = start // block_size
+        last = max(first, (end - 1) // block_size)
+        if end >= entry.size:
+            last = len(integrity['blocks']) - 1
+
+        for index in range(first, last + 1):
+            if (name, index) in self.verified:
                 continue
 
-        # If the meta section contains 'unpacked' then the file is not actually
-        # in the archive (?!).
-        file_outside_archive = False
+            offset = index * block_size
+            size = max(0, min(block_size, entry.size - offset))
+            digest = hashlib.sha256(self._view(entry.offset + offset, size))
+            if digest.hexdigest() != integrity['blocks'][index]:
+                raise IntegrityError(
+                    'Block {0} of {1} is corrupt'.format(index, name)
+                )
+            self.verified.add((name, index))
+
+    def open(self, name):
+        '''
+        Args:
+            name (str): The path of the entry in the ASAR.
+
+        Returns:
+            file: A read-only file-like object for the content of the entry,
+                which raises IntegrityError if a block read is corrupt.
+
+        Raises:
+            KeyError: The entry does not exist.
+        '''
+        entry = self.index[name]
+        if entry.unpacked:
+            return open(self.unpacked_path(name), 'rb')
+
+        return io.BufferedReader(
+            EntryFile(
+                self.mapping,
+                entry,
+                verify=lambda start, end: self.check(name, start, end),
+            )
+        )
+
+    def read(self, name):
+        '''
+        Reads the content of an entry, without copying it where it is stored
+        in the ASAR.
+
+        Args:
+            name (str): The path of the entry in the ASAR.
 
-        if 'unpacked' in meta and meta['unpacked']:
-            file_outside_archive = True
+        Returns:
+            The content of the entry, as a memoryview (or buffer on Python 2)
+                of the mapping - or a str if stored outside of the ASAR.
+
+        Raises:
+            KeyError: The entry does not exist.
+            IntegrityError: The content of the entry does not match its hash.
+        '''
+        entry = self.index[name]
+        if entry.unpacked:
+            with open(self.unpacked_path(name), 'rb') as fin:
+                return fin.read()
+
+        self.check(name)
+        return self._view(entry.offset, entry.size)
+
+
+def _extract(reader, name, output_path):
+    '''
+    Extracts a single entry from an ASAR to the given output directory. The
+    directory hierarchy for the entry must already exist.
 
-        # Ensure the required directory structure is hydrated.
-        if directory:
+    Args:
+        reader (AsarReader): The reader for the ASAR.
+        name (str): The path of the entry in the ASAR.
+        output_path (str): The path to the directory to extract into.
+    '''
+    # If the entry is marked 'unpacked' then the file is not actually in the
+    # archive (?!).
+    if reader.stat(name).unpacked:
+        shutil.copy2(
+            reader.unpacked_path(name),
+            os.path.join(output_path, name),
+        )
+    else:
+        with open(os.path.join(output_path, name), 'wb') as fout:
+            fout.write(reader.read(name))
+
+
+def _create_directories(output_path, files):
+    '''
+    Ensures the directory hierarchy of the given entries exists, creating
+    each unique directory once - parents first, due to the ordering.
+
+    Args:
+        output_path (str): The path to the directory to extract into.
+        files (list of str): The paths of the entries to be extracted.
+    '''
+    directories = set(os.path.dirname(file) for file in files)
+    for directory in sorted(directories):
+        path = os.path.join(output_path, directory)
+        if directory and not os.path.isdir(path):
             try:
-                os.makedirs(os.path.join(output_path, directory))
+                os.makedirs(path)
             except OSError as err:
                 # Ignore the exception if it's due to a leaf being already
                 # present.
-                if err.errno == errno.EEXIST:
-                    pass
-                else:
+                if err.errno != errno.EEXIST:
                     raise err
 
-        # Attempt to extract the file and write to the given path.
-        if file_outside_archive:
-            shutil.copy2(
-                os.path.join(os.path.dirname(input_path), file),
-                os.path.join(output_path, file),
-            )
-        else:
-            # Determine the correct location for each file. The actual offset
-            # is actually the offset from the header, plus the size of the
-            # header.
-            file_start = content_start + int(meta['offset'])
-            file_end = file_start + meta['size']
 
-            with open(os.path.join(output_path, file), 'wb') as fout:
-                fout.write(buffer[file_start:file_end])
+def _extract_all(reader, files, output_path, workers):
+    '''
+    Extracts the given entries from an ASAR, concurrently where more than
+    one worker is requested. The directory hierarchy must already exist.
 
+    Args:
+        reader (AsarReader): The reader for the ASAR.
+        files (list of str): The paths of the entries to extract.
+        output_path (str): The path to the directory to extract into.
+        workers (int): The number of threads to write files with.
+    '''
+    if workers <= 1:
+        for file in files:
+            _extract(reader, file, output_path)
+        return
+
+    pool = ThreadPool(workers)
+    try:
+        pool.map(lambda file: _extract(reader, file, output_path), files)
+    finally:
+        pool.close()
+        pool.join()
 
-def pack(input_path, output_path):
+
+def unpack(input_path, output_path, filename=None, workers=UNPACK_WORKERS):
     '''
-    Attempts to pack the specified file path into an ASAR.
+    Attempts to unpack the specified ASAR to the given output directory. An
+    optional 'file' parameter can be used to extract single files from the
+    archive.
+
+    The directory hierarchy is created up front, after which files are
+    written concurrently by a pool of threads.
 
     Args:
-        input_path (str): The path to the directory to pack into an ASAR.
-        output_path (str): The path to the ASAR file to generate.
+        input_path (str): The path to the ASAR to unpack.
+        output_path (str): The path to the directory unpack the ASAR into.
+        filename (str): An optional single file to extract from the ASAR.
+        workers (int): The number of threads to write files with, where 1
+            writes files serially (default: UNPACK_WORKERS).
     '''
-    archive = _generate_archive(input_path)
-    header = _generate_header(archive.entries)
+    logger = logging.getLogger(__name__)
+    started = time.time()
+
+    with AsarReader(input_path) as reader:
+        # Allow for optional extraction of a single file by path, in which
+        # case the directory hierarchy will NOT be created.
+        if filename:
+            if filename not in reader.index:
+                return
+
+            with open(
+                os.path.join(output_path, os.path.basename(filename)),
+                'wb',
+            ) as fout:
+                fout.write(reader.read(filename))
+            return
+
+        files = reader.list()
+        _create_directories(output_path, files)
+        _extract_all(reader, files, output_path, workers)
+        size = sum(reader.stat(file).size for file in files)
+
+    elapsed = max(time.time() - started, 1e-6)
+    logger.info(
+        'Unpacked %d files (%d bytes) in %.2fs - %.1f MB/s, %.0f files/s',
+        len(files),
+        size,
+        elapsed,
+        size / elapsed / 1024 / 1024,
+        len(files) / elapsed,
+    )
 
+
+def _generate_pickle(header):
+    '''
+    Generates the Chromium-Pickle like prefix of an ASAR, containing the
+    given header.
+
+    Args:
+        header (str): A stringified JSON header for the ASAR.
+
+    Returns:
+        bytearray: The prefix of the ASAR, up to the start of the content.
+    '''
     # Use the document size to calculate an aligned header size.
     document_sz = len(header)
     header_sz = document_sz + 4
@@ -251,12 +643,359 @@ def pack(input_path, output_path):
 
     # Pad the header with NULLs until 32-bit aligned before appending the
     # content.
-    while len(pickle) % 4 > 1:
+    while len(pickle) % 4 > 0:
         pickle.extend([0x0])
 
-    # Finally, append the content / archive and write to file.
-    pickle.extend(archive.content)
+    return pickle
+
+
+def _copy(fin, fout, size, integrity=None):
+    '''
+    Streams the given number of bytes from one file object to another, in
+    chunks of at most CHUNK_SIZE.
+
+    Args:
+        fin (file): The file object to read from.
+        fout (file): The file object to write to.
+        size (int): The number of bytes to copy.
+        integrity (Integrity): An optional integrity to update with the
+            streamed content, which is finished once all bytes are copied.
+
+    Raises:
+        IOError: The input ended before the given number of bytes were read.
+    '''
+    while size > 0:
+        chunk = fin.read(min(CHUNK_SIZE, size))
+        if not chunk:
+            raise IOError(
+                'Unexpected end of file in {0}'.format(
+                    getattr(fin, 'name', 'archive'),
+                )
+            )
+        if integrity:
+            integrity.update(chunk)
+        fout.write(chunk)
+        size -= len(chunk)
+
+    if integrity:
+        integrity.finish()
+
+
+def _rewrite_pickle(fout, pickle, entries):
+    '''
+    Rewrites the header at the start of an ASAR, once the integrity of all
+    entries has been computed. As placeholder hashes are the same length as
+    the final hashes, the header does not change in size.
+
+    Args:
+        fout (file): The file object of the ASAR.
+        pickle (bytearray): The header originally written.
+        entries (dict): The archive entries, with integrity computed.
+
+    Raises:
+        IOError: The size of the header changed.
+    '''
+    final = _generate_pickle(_generate_header(entries))
+    if len(final) != len(pickle):
+        raise IOError('ASAR header changed size when rewritten')
+
+    fout.seek(0)
+    fout.write(final)
+
+
+def pack(input_path, output_path, integrity=False):
+    '''
+    Attempts to pack the specified file path into an ASAR. The tree is walked
+    once to determine the header, after which the content of each file is
+    streamed into the archive - so memory use is bounded by the size of the
+    header, rather than the archive.
+
+    Where integrity is requested, the hashes of each file are computed as it
+    is streamed. The header is written with placeholder hashes, and rewritten
+    once all content has been written.
+
+    Args:
+        input_path (str): The path to the directory to pack into an ASAR.
+        output_path (str): The path to the ASAR file to generate.
+        integrity (bool): Whether to include the integrity of each file in
+            the header (default: False).
+    '''
+    archive = _generate_archive(input_path)
+
+    hashes = {}
+    if integrity:
+        for (file_path, name, file_size) in archive.files:
+            hashes[name] = Integrity(file_size)
+            archive.entries[name]['integrity'] = hashes[name].meta
+
+    pickle = _generate_pickle(_generate_header(archive.entries))
+
     with open(output_path, 'wb') as fout:
         fout.write(pickle)
+        for (file_path, name, file_size) in archive.files:
+            with open(file_path, 'rb') as fin:
+                _copy(fin, fout, file_size, hashes.get(name))
+
+        if integrity:
+            _rewrite_pickle(fout, pickle, archive.entries)
 
     return
+
+
+def _kernel_copy(src, dst, count, offset):
+    '''
+    Copies bytes between file descriptors within the kernel, via
+    copy_file_range or sendfile - whichever is available. The bytes are
+    written at, and advance, the current position of the destination.
+
+    Args:
+        src (int): The file descriptor to copy from.
+        dst (int): The file descriptor to copy to.
+        count (int): The maximum number of bytes to copy.
+        offset (int): The offset in the source to copy from.
+
+    Returns:
+        int: The number of bytes copied.
+    '''
+    if hasattr(os, 'copy_file_range'):
+        return os.copy_file_range(src, dst, count, offset)
+    return os.sendfile(dst, src, offset, count)
+
+
+def _copy_range(reader, fout, offset, size):
+    '''
+    Copies a byte range of an ASAR to the current position of a file object.
+    Where supported, the copy is performed by the kernel via copy_file_range
+    or sendfile; otherwise, it is written directly from the mapping.
+
+    Args:
+        reader (AsarReader): The reader for the ASAR to copy from.
+        fout (file): The unbuffered file object to write to.
+        offset (int): The absolute offset of the range in the ASAR.
+        size (int): The number of bytes to copy.
+    '''
+    supported = hasattr(os, 'copy_file_range') or hasattr(os, 'sendfile')
+
+    while size > 0 and supported:
+        try:
+            copied = _kernel_copy(
+                reader.handle.fileno(),
+                fout.fileno(),
+                min(size, CHUNK_SIZE * 64),
+                offset,
+            )
+        except OSError:
+            # Fall back to writing from the mapping, such as where the file
+            # systems do not support the call.
+            break
+
+        if not copied:
+            break
+        offset += copied
+        size -= copied
+
+    while size > 0:
+        count = min(size, CHUNK_SIZE)
+        fout.write(reader.mapping[offset:offset + count])
+        offset += count
+        size -= count
+
+
+def _source_path(input_path, name):
+    '''
+    Determines the path on disk of an archive entry, under the path the
+    archive was packed from.
+
+    Args:
+        input_path (str): The path to the directory the ASAR was packed from.
+        name (str): The path of the entry in the ASAR.
+
+    Returns:
+        str: The path of the entry on disk.
+    '''
+    # The archive path includes the top-level directory, where packed.
+    if input_path.split('/')[-1]:
+        return os.path.join(os.path.dirname(input_path), name)
+    return os.path.join(input_path, name)
+
+
+def _layout_entry(reader, input_path, name, changed, integrity):
+    '''
+    Determines the metadata of an entry in a repacked ASAR, and where its
+    content is copied from.
+
+    Args:
+        reader (AsarReader): The reader for the original ASAR.
+        input_path (str): The path to the directory the ASAR was packed from.
+        name (str): The path of the entry in the ASAR.
+        changed (set of str): The archive paths of changed entries.
+        integrity (bool): Whether to include the integrity of the entry.
+
+    Returns:
+        tuple: The metadata of the entry, without its offset, and a tuple of
+            the kind, source, size, and integrity of its content - where the
+            kind is either a range of the original ASAR, an entry of the
+            original ASAR to be hashed, or a file. None is returned where the
+            entry has been removed from disk.
+    '''
+    meta = dict(reader.meta.get(name, {}))
+
+    if name in changed:
+        path = _source_path(input_path, name)
+        if not os.path.isfile(path):
+            return None
+
+        meta['size'] = os.path.getsize(path)
+        meta.pop('integrity', None)
+        hasher = None
+        if integrity:
+            hasher = Integrity(meta['size'])
+            meta['integrity'] = hasher.meta
+        return (meta, ('file', path, meta['size'], hasher))
+
+    if integrity and 'integrity' not in meta:
+        hasher = Integrity(meta['size'])
+        meta['integrity'] = hasher.meta
+        return (meta, ('entry', name, meta['size'], hasher))
+
+    return (meta, ('range', reader.index[name].offset, meta['size'], None))
+
+
+def _layout(reader, input_path, changed, integrity):
+    '''
+    Lays out the entries of a repacked ASAR in their original order, followed
+    by any new entries.
+
+    Args:
+        reader (AsarReader): The reader for the original ASAR.
+        input_path (str): The path to the directory the ASAR was packed from.
+        changed (set of str): The archive paths of changed entries.
+        integrity (bool): Whether to include the integrity of each entry.
+
+    Returns:
+        tuple: The archive entries, by path, and the content of each entry -
+            in the order it is written - as returned by _layout_entry().
+    '''
+    layout = []
+    entries = {}
+    offset = 0
+
+    existing = sorted(
+        (name for name in reader.index if not reader.index[name].unpacked),
+        key=lambda name: reader.index[name].offset,
+    )
+    added = sorted(name for name in changed if name not in reader.index)
+
+    for name in existing + added:
+        laid = _layout_entry(reader, input_path, name, changed, integrity)
+        if laid is None:
+            continue
+
+        (meta, content) = laid
+        meta['offset'] = str(offset)
+        entries[name] = meta
+        layout.append(content)
+        offset += meta['size']
+
+    # Entries stored outside of the ASAR are retained as-is.
+    for name in reader.index:
+        if reader.index[name].unpacked:
+            entries[name] = reader.meta[name]
+
+    return (entries, layout)
+
+
+def _write_layout(reader, fout, layout):
+    '''
+    Writes the content of a repacked ASAR, coalescing adjacent ranges of the
+    original ASAR into one copy.
+
+    Args:
+        reader (AsarReader): The reader for the original ASAR.
+        fout (file): The unbuffered file object to write to.
+        layout (list of tuple): The content of each entry, as returned by
+            _layout().
+
+    Returns:
+        int: The number of bytes copied from the original ASAR.
+    '''
+    copied = 0
+    pending = None
+
+    for (kind, source, size, hasher) in layout:
+        if kind == 'range':
+            copied += size
+            if pending and pending[0] + pending[1] == source:
+                pending = (pending[0], pending[1] + size)
+                continue
+            if pending:
+                _copy_range(reader, fout, *pending)
+            pending = (source, size)
+            continue
+
+        if pending:
+            _copy_range(reader, fout, *pending)
+            pending = None
+
+        if kind == 'entry':
+            with reader.open(source) as fin:
+                _copy(fin, fout, size, hasher)
+        else:
+            with open(source, 'rb') as fin:
+                _copy(fin, fout, size, hasher)
+
+    if pending:
+        _copy_range(reader, fout, *pending)
+
+    return copied
+
+
+def repack(archive_path, input_path, output_path, changed, integrity=False):
+    '''
+    Attempts to repack an ASAR after changes to the directory it was packed
+    from. The content of unchanged entries is copied directly from the
+    original ASAR, and only the content of changed or added entries is read
+    from disk. Entries which have been removed from disk are dropped.
+
+    Args:
+        archive_path (str): The path to the original ASAR.
+        input_path (str): The path to the directory the ASAR was packed from,
+            as provided to pack().
+        output_path (str): The path to the ASAR file to generate, which may
+            be the same as the original.
+        changed (set of str): The archive paths of entries which have been
+            changed, added, or removed.
+        integrity (bool): Whether to include the integrity of each entry in
+            the header. Existing integrity of unchanged entries is retained,
+            and is otherwise computed as the content is streamed (default:
+            False).
+    '''
+    logger = logging.getLogger(__name__)
+    started = time.time()
+
+    with AsarReader(archive_path) as reader:
+        (entries, layout) = _layout(reader, input_path, changed, integrity)
+        pickle = _generate_pickle(_generate_header(entries))
+
+        # The output is written unbuffered, as ranges may be copied by the
+        # kernel - and to a temporary file, in case the original is replaced.
+        with open('{0}.tmp'.format(output_path), 'wb', 0) as fout:
+            fout.write(pickle)
+            copied = _write_layout(reader, fout, layout)
+
+            if integrity:
+                _rewrite_pickle(fout, pickle, entries)
+
+    # Windows does not allow renaming over an existing file.
+    if os.name == 'nt' and os.path.exists(output_path):
+        os.remove(output_path)
+    os.rename('{0}.tmp'.format(output_path), output_path)
+
+    written = sum(size for (_, _, size, _) in layout)
+    logger.info(
+        'Repacked %d entries in %.2fs - %d bytes copied, %d bytes written',
+        len(entries),
+        time.time() - started,
+        copied,
+        written - copied,
+    )
@@ -0,0 +1,38 @@
+'''
+Tests for plugin.video.nowtv.
+
+The Kodi modules are provided by Kodistubs. However, simplecache is provided
+by Kodi's script.module.simplecache add-on, which is not published to PyPI -
+so an in-memory equivalent is installed where it is not importable.
+'''
+
+import sys
+import types
+
+try:
+    import simplecache  # noqa: F401
+except ImportError:
+    class SimpleCache(object):
+        '''
+        Implements an in-memory equivalent of simplecache. As with
+        simplecache, values are shared by all instances in the process.
+        '''
+
+        values = {}
+
+        def get(self, key, **kwargs):
+            return self.values.get(key)
+
+        def set(self, key, value, **kwargs):
+            self.values[key] = value
+
+    simplecache = types.ModuleType('simplecache')
+    simplecache.SimpleCache = SimpleCache
+    sys.modules['simplecache'] = simplecache
+
+
+def reset():
+    ''' Empties the in-memory cache, between tests. '''
+    cache = sys.modules['simplecache'].SimpleCache
+    if isinstance(getattr(cache, 'values', None), dict):
+        cache.values.clear()
@@ -0,0 +1,7 @@
+'''
+Benchmarks for plugin.video.nowtv, which are run against local stub servers
+rather than the NOW TV / Sky endpoints. Each is run as a module from the root
+of this repository, for example:
+
+    python -m tests.benchmarks.guide_open
+'''
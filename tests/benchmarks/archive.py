@@ -0,0 +1,168 @@
+'''
+Measures the time to pack and unpack an ASAR of generated files - unpacking
+serially and with a pool of threads - and to repack it after a single entry
+has changed, with the unchanged content copied by the kernel against writing
+it from the mapping of the original ASAR.
+'''
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(
+    0,
+    os.path.join(os.path.dirname(__file__), '..', '..', 'scripts'),
+)
+
+import asar  # noqa: E402
+
+
+def generate(path, files, size):
+    '''
+    Generates a directory of files with random content.
+
+    Args:
+        path (str): The path of the directory to generate.
+        files (int): The number of files to generate.
+        size (int): The size of each file in bytes.
+    '''
+    for index in range(files):
+        directory = os.path.join(path, str(index % 16))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, str(index)), 'wb') as fout:
+            fout.write(os.urandom(size))
+
+
+def timed(function, *args, **kwargs):
+    '''
+    Args:
+        function (callable): The function to call.
+
+    Returns:
+        float: The time taken by the call - in seconds.
+    '''
+    started = time.time()
+    function(*args, **kwargs)
+    return time.time() - started
+
+
+def unpack(path, workers):
+    '''
+    Unpacks the ASAR once, into a fresh directory.
+
+    Args:
+        path (str): The path of the directory containing the packed tree.
+        workers (int): The number of threads to write files with.
+
+    Returns:
+        float: The time taken to unpack - in seconds.
+    '''
+    output_path = os.path.join(path, 'out')
+    if os.path.isdir(output_path):
+        shutil.rmtree(output_path)
+    return timed(
+        asar.unpack,
+        os.path.join(path, 'app.asar'),
+        output_path,
+        workers=workers,
+    )
+
+
+def repack(path, kernel):
+    '''
+    Repacks the ASAR once, after changing a single file.
+
+    Args:
+        path (str): The path of the directory containing the packed tree.
+        kernel (bool): Whether unchanged content may be copied by the kernel.
+
+    Returns:
+        float: The time taken to repack - in seconds.
+    '''
+    input_path = os.path.join(path, 'app')
+    with open(os.path.join(input_path, '0', '0'), 'wb') as fout:
+        fout.write(os.urandom(1024))
+
+    kernel_copy = asar._kernel_copy
+    if not kernel:
+        def unsupported(src, dst, count, offset):
+            raise OSError('Not supported')
+        asar._kernel_copy = unsupported
+
+    try:
+        return timed(
+            asar.repack,
+            os.path.join(path, 'app.asar'),
+            input_path,
+            os.path.join(path, 'repacked.asar'),
+            set(['app/0/0']),
+        )
+    finally:
+        asar._kernel_copy = kernel_copy
+
+
+def summarise(timings):
+    '''
+    Args:
+        timings (list of float): The time taken by each run - in seconds.
+
+    Returns:
+        dict: The median, minimum, and maximum of the timings.
+    '''
+    timings = sorted(timings)
+    return {
+        'median': timings[len(timings) // 2],
+        'min': timings[0],
+        'max': timings[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=256)
+    parser.add_argument('--size', type=int, default=256 * 1024)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    path = tempfile.mkdtemp()
+    try:
+        generate(os.path.join(path, 'app'), args.files, args.size)
+
+        results = {}
+        for integrity in (False, True):
+            results['pack-integrity' if integrity else 'pack'] = summarise(
+                [
+                    timed(
+                        asar.pack,
+                        os.path.join(path, 'app'),
+                        os.path.join(path, 'app.asar'),
+                        integrity=integrity,
+                    )
+                    for _ in range(args.runs)
+                ]
+            )
+
+        for (name, workers) in (('unpack-serial', 1),
+                                ('unpack-threaded', asar.UNPACK_WORKERS)):
+            results[name] = summarise(
+                [unpack(path, workers) for _ in range(args.runs)]
+            )
+
+        for (name, kernel) in (('repack-mapping', False),
+                               ('repack-kernel', True)):
+            results[name] = summarise(
+                [repack(path, kernel) for _ in range(args.runs)]
+            )
+    finally:
+        shutil.rmtree(path)
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+'''
+Measures the time to open the guide, with the guide fetched speculatively
+while authenticating - as where entitlements are cached from a previous
+invocation - against fetching it only once authenticated.
+'''
+
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import tests
+
+from tests import fakes
+from resources.lib import plugin
+from resources.lib.nowtv import constants
+
+
+def guide_open(channels, latency, auth, speculative):
+    '''
+    Opens the guide once, against a fresh cache and profile.
+
+    Args:
+        channels (int): The number of channels in the guide.
+        latency (float): The latency of each upstream request - in seconds.
+        auth (float): The time taken to authenticate - in seconds.
+        speculative (bool): Whether entitlements are cached, so that the
+            guide is fetched while authenticating.
+
+    Returns:
+        float: The time taken for the guide data to be ready - in seconds.
+    '''
+    tests.reset()
+    profile = tempfile.mkdtemp()
+    try:
+        with fakes.StubServer(delay=latency) as stub:
+            stub.epg([fakes.channel(str(key)) for key in range(channels)])
+            with fakes.endpoints(stub):
+                instance = fakes.addon_plugin(profile)
+                if speculative:
+                    instance.cache.set(
+                        constants.CACHE_KEY_ENTITLEMENTS,
+                        ['entertainment'],
+                    )
+
+                def authenticate():
+                    time.sleep(auth)
+                    return set(['entertainment'])
+
+                rendered = []
+                instance.authenticate = authenticate
+                plugin.ui.epg = lambda data, **kwargs: rendered.append(
+                    time.time()
+                )
+
+                started = time.time()
+                instance.started = started
+                instance.start_guide()
+                return rendered[0] - started
+    finally:
+        shutil.rmtree(profile)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--channels', type=int, default=60)
+    parser.add_argument('--latency', type=float, default=0.1)
+    parser.add_argument('--auth', type=float, default=1.0)
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    # The stub server is not rate limited.
+    constants.EPG_FETCH_RATE = 1000
+    constants.EPG_FETCH_BURST = 1000
+
+    epg = plugin.ui.epg
+    try:
+        results = {}
+        for (name, speculative) in (('sequential', False),
+                                    ('speculative', True)):
+            timings = sorted(
+                guide_open(args.channels, args.latency, args.auth, speculative)
+                for _ in range(args.runs)
+            )
+            results[name] = {
+                'median': timings[len(timings) // 2],
+                'min': timings[0],
+                'max': timings[-1],
+            }
+    finally:
+        plugin.ui.epg = epg
+
+    print(json.dumps(results, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+'''
+Implements fakes shared by the tests - a local HTTP stub server which may be
+used in place of the NOW TV / Sky endpoints, payloads as returned by the EPG
+and Atlas APIs, and a plugin constructed against a fake add-on.
+'''
+
+import json
+import time
+import logging
+import threading
+import contextlib
+
+try:
+    from BaseHTTPServer import HTTPServer
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse
+    from urlparse import parse_qs
+except ImportError:
+    from http.server import HTTPServer
+    from http.server import BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse
+    from urllib.parse import parse_qs
+
+import xbmc
+import xbmcaddon
+
+from resources.lib import plugin
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import transport
+
+# Define the number of events in each schedule, a day of half hour slots.
+EVENTS = 48
+
+# Define the start of the schedule day, 2020-01-01 00:00:00 UTC.
+EPOCH = 1577836800
+
+# Define the constants which locate each endpoint, by the path they are served
+# from by the stub server.
+ENDPOINTS = {
+    'URI_EPG_SCHEDULE': '/schedule',
+    'URI_EPG_NOWNEXT': '/nownext',
+    'URI_ATLAS_LINEAR_CHAN': '/channels',
+}
+
+
+def event(service_key, index):
+    '''
+    Args:
+        service_key (str): The service key of the channel.
+        index (int): The position of the event in the day.
+
+    Returns:
+        dict: A half hour event, as returned by the EPG API.
+    '''
+    return {
+        'eventId': '{0}-{1}'.format(service_key, index),
+        'title': 'Programme {0}'.format(index),
+        'description': 'A description of the programme. ' * 8,
+        'startTimeEpoch': EPOCH + index * 1800,
+        'durationInSeconds': 1800,
+        'programmeImageUrlTemplate':
+            'https://images.example/{0}/{{type}}/{{size}}.jpg'.format(index),
+        'parentalRatingCode': '12',
+        'isNewShow': False,
+        'isHD': False,
+    }
+
+
+def schedule(service_key, events=EVENTS):
+    '''
+    Args:
+        service_key (str): The service key of the channel.
+        events (int): The number of events in the schedule.
+
+    Returns:
+        dict: A day's schedule for the channel, as returned by the EPG API.
+    '''
+    return {
+        'schedule': [
+            {
+                'serviceKey': service_key,
+                'events': [
+                    event(service_key, index) for index in range(events)
+                ],
+            }
+        ]
+    }
+
+
+def channel(service_key, name=None, section='entertainment',
+            format_type='SD'):
+    '''
+    Args:
+        service_key (str): The service key of the channel.
+        name (str): The name of the channel (default: its service key).
+        section (str): The section the channel is entitled by.
+        format_type (str): The format of the channel, either 'SD' or 'HD'.
+
+    Returns:
+        dict: A channel, as returned by the Atlas API.
+    '''
+    return {
+        'attributes': {
+            'serviceKey': service_key,
+            'channelName': name or 'Channel {0}'.format(service_key),
+            'section': section,
+            'formatType': format_type,
+            'logo': [
+                {
+                    'type': 'Dark',
+                    'key': service_key,
+                    'template':
+                        'https://images.example/{key}/{width}x{height}.png',
+                }
+            ],
+        }
+    }
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    ''' Implements a threaded HTTP server. '''
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients which time out disconnect part way through slow responses.
+        pass
+
+
+class Handler(BaseHTTPRequestHandler):
+    ''' Dispatches each request to the routes of the stub server. '''
+
+    def do_GET(self):
+        self.server.stub.dispatch(self)
+
+    def do_POST(self):
+        self.server.stub.dispatch(self)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(object):
+    '''
+    Implements a local HTTP stub server. Each route maps a path prefix to a
+    function called with the method, path, and query of the request - which
+    returns the status, headers, and body of the response. Bodies which are
+    not strings are serialised as JSON. Every request is recorded, and may be
+    delayed to simulate a distant upstream.
+    '''
+
+    def __init__(self, delay=0):
+        '''
+        Args:
+            delay (float): The time to wait before each response - in seconds.
+        '''
+        self.delay = delay
+        self.routes = []
+        self.requests = []
+        self.lock = threading.Lock()
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.stub = self
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def url(self, path=''):
+        '''
+        Args:
+            path (str): The path to locate.
+
+        Returns:
+            str: The URL of the path on the stub server.
+        '''
+        return 'http://127.0.0.1:{0}{1}'.format(
+            self.server.server_address[1],
+            path,
+        )
+
+    def route(self, prefix, handler):
+        '''
+        Args:
+            prefix (str): The path prefix of the requests to handle.
+            handler (callable): Called with the method, path, and query of
+                each request, returning a tuple of its status, headers, and
+                body.
+        '''
+        self.routes.insert(0, (prefix, handler))
+
+    def count(self, prefix=''):
+        '''
+        Args:
+            prefix (str): The path prefix of the requests to count.
+
+        Returns:
+            int: The number of requests received with the path prefix.
+        '''
+        with self.lock:
+            return len(
+                [path for (_, path) in self.requests
+                 if path.startswith(prefix)]
+            )
+
+    def dispatch(self, request):
+        '''
+        Responds to a request via the first matching route, or with a 404.
+
+        Args:
+            request (BaseHTTPRequestHandler): The request to respond to.
+        '''
+        parsed = urlparse(request.path)
+        with self.lock:
+            self.requests.append((request.command, parsed.path))
+
+        if self.delay:
+            time.sleep(self.delay)
+
+        (status, headers, body) = (404, {}, '')
+        for (prefix, handler) in self.routes:
+            if parsed.path.startswith(prefix):
+                (status, headers, body) = handler(
+                    request.command,
+                    parsed.path,
+                    parse_qs(parsed.query),
+                )
+                break
+
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body)
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+
+        try:
+            request.send_response(status)
+            for (name, value) in headers.items():
+                request.send_header(name, value)
+            request.send_header('Content-Length', str(len(body)))
+            request.end_headers()
+            request.wfile.write(body)
+        except (IOError, OSError):
+            # The client has timed out, and disconnected.
+            pass
+
+    def epg(self, channels):
+        '''
+        Serves channel data and schedules for the given channels, as the EPG
+        and Atlas APIs would.
+
+        Args:
+            channels (list of dict): The channels, as returned by channel().
+        '''
+        self.route(
+            ENDPOINTS['URI_ATLAS_LINEAR_CHAN'],
+            lambda method, path, query: (200, {}, channels),
+        )
+        self.route(
+            ENDPOINTS['URI_EPG_SCHEDULE'],
+            lambda method, path, query: (
+                200,
+                {},
+                schedule(path.rsplit('/', 1)[1]),
+            ),
+        )
+
+
+@contextlib.contextmanager
+def endpoints(stub):
+    '''
+    Points the EPG and Atlas endpoints at a stub server, with fresh circuit
+    breakers, for the duration of the context.
+
+    Args:
+        stub (StubServer): The stub server to point the endpoints at.
+    '''
+    original = dict(
+        (name, getattr(constants, name)) for name in ENDPOINTS
+    )
+    for (name, path) in ENDPOINTS.items():
+        setattr(constants, name, stub.url(path))
+    transport._breakers.clear()
+    try:
+        yield stub
+    finally:
+        for (name, value) in original.items():
+            setattr(constants, name, value)
+        transport._breakers.clear()
+
+
+def silence(test):
+    '''
+    Discards the log records of the add-on for the duration of a test, where
+    failures are expected.
+
+    Args:
+        test (unittest.TestCase): The test to silence.
+    '''
+    logger = logging.getLogger('plugin.video.nowtv')
+    handler = logging.NullHandler()
+    logger.addHandler(handler)
+    test.addCleanup(logger.removeHandler, handler)
+    test.addCleanup(setattr, logger, 'propagate', logger.propagate)
+    logger.propagate = False
+
+
+class Addon(object):
+    ''' Implements a fake add-on, with the given settings and profile. '''
+
+    def __init__(self, profile, settings=None):
+        '''
+        Args:
+            profile (str): The path of the add-on profile directory.
+            settings (dict): The add-on settings, by name.
+        '''
+        self.profile = profile
+        self.settings = settings or {}
+
+    def getSetting(self, name):
+        return self.settings.get(name, '')
+
+    def getAddonInfo(self, name):
+        return {
+            'id': 'plugin.video.nowtv',
+            'path': self.profile,
+            'profile': self.profile,
+        }.get(name, '')
+
+
+def addon_plugin(profile, settings=None, query=''):
+    '''
+    Constructs the plugin against a fake add-on.
+
+    Args:
+        profile (str): The path of the add-on profile directory.
+        settings (dict): The add-on settings, by name.
+        query (str): The query string the plugin is invoked with.
+
+    Returns:
+        plugin.Plugin: The plugin.
+    '''
+    addon = Addon(profile, settings)
+    missing = object()
+    original = (
+        xbmcaddon.Addon,
+        getattr(xbmc, 'translatePath', missing),
+    )
+
+    xbmcaddon.Addon = lambda *args, **kwargs: addon
+    xbmc.translatePath = lambda path: path
+    try:
+        return plugin.Plugin(['plugin://plugin.video.nowtv/', '1', query])
+    finally:
+        xbmcaddon.Addon = original[0]
+        if original[1] is missing:
+            del xbmc.translatePath
+        else:
+            xbmc.translatePath = original[1]
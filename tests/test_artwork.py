@@ -0,0 +1,152 @@
+''' Tests for the artwork cache, against a local image stub server. '''
+
+import os
+import time
+import shutil
+import tempfile
+import unittest
+import threading
+
+try:
+    from BaseHTTPServer import HTTPServer
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import HTTPServer
+    from http.server import BaseHTTPRequestHandler
+    from socketserver import ThreadingMixIn
+
+from resources.lib import artwork
+
+# Define the size of each stub image - in bytes.
+IMAGE_SIZE = 4096
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    ''' Implements a threaded image stub server. '''
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Cancelled fetches disconnect part way through slow responses.
+        pass
+
+
+class Handler(BaseHTTPRequestHandler):
+    '''
+    Serves a stub image for any path beginning '/images/', slowly for any
+    beginning '/slow/', and a 404 for anything else.
+    '''
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path.startswith('/slow/'):
+            self.send_response(200)
+            self.send_header('Content-Length', str(IMAGE_SIZE * 64))
+            self.end_headers()
+            for _ in range(64):
+                self.wfile.write(b'\0' * IMAGE_SIZE)
+                self.wfile.flush()
+                time.sleep(0.05)
+            return
+
+        if not self.path.startswith('/images/'):
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(IMAGE_SIZE))
+        self.end_headers()
+        self.wfile.write(b'\0' * IMAGE_SIZE)
+
+    def log_message(self, *args):
+        pass
+
+
+class ArtworkCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.path)
+
+    def url(self, path):
+        return 'http://127.0.0.1:{0}{1}'.format(
+            self.server.server_address[1],
+            path,
+        )
+
+    def test_prefetch_stores_artwork(self):
+        cache = artwork.ArtworkCache(self.path)
+        urls = [self.url('/images/{0}.jpg'.format(i)) for i in range(8)]
+
+        self.assertTrue(cache.prefetch(urls + urls[:2]).wait(10))
+        self.assertEqual(len(self.server.requests), 8)
+        self.assertEqual(cache.fetched, 8 * IMAGE_SIZE)
+        for url in urls:
+            self.assertEqual(os.path.getsize(cache.get(url)), IMAGE_SIZE)
+
+        # Stored artwork is served from disk, including by a new invocation.
+        cache = artwork.ArtworkCache(self.path)
+        self.assertTrue(cache.prefetch(urls).wait(10))
+        self.assertEqual(len(self.server.requests), 8)
+        self.assertEqual(cache.size, 8 * IMAGE_SIZE)
+
+    def test_least_recently_used_artwork_is_evicted(self):
+        cache = artwork.ArtworkCache(self.path, capacity=3 * IMAGE_SIZE)
+        urls = [self.url('/images/{0}.jpg'.format(i)) for i in range(4)]
+
+        for url in urls[:3]:
+            cache.fetch(url)
+        cache.get(urls[0])
+        cache.fetch(urls[3])
+
+        self.assertEqual(cache.size, 3 * IMAGE_SIZE)
+        self.assertIsNone(cache.get(urls[1]))
+        self.assertEqual(len(os.listdir(self.path)), 3)
+
+    def test_failed_fetch_is_not_stored(self):
+        cache = artwork.ArtworkCache(self.path)
+
+        self.assertIsNone(cache.fetch(self.url('/missing.jpg')))
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_cancelled_prefetch_discards_partial_artwork(self):
+        cache = artwork.ArtworkCache(self.path)
+        urls = [self.url('/slow/{0}.jpg'.format(i)) for i in range(8)]
+
+        prefetch = cache.prefetch(urls, limit=2)
+        self.assertFalse(prefetch.wait(0.5))
+        cache.cancel()
+
+        self.assertTrue(prefetch.wait(artwork.PREFETCH_CANCEL_TIMEOUT))
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_abandoned_partial_artwork_is_removed(self):
+        stale = os.path.join(self.path, 'stale.jpg.1.tmp')
+        active = os.path.join(self.path, 'active.jpg.1.tmp')
+        for path in (stale, active):
+            open(path, 'w').close()
+        expired = time.time() - artwork.TEMPORARY_MAX_AGE - 1
+        os.utime(stale, (expired, expired))
+
+        cache = artwork.ArtworkCache(self.path)
+
+        self.assertEqual(os.listdir(self.path), ['active.jpg.1.tmp'])
+        self.assertEqual(cache.size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
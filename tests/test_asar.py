@@ -0,0 +1,458 @@
+'''
+Tests for packing, unpacking, and repacking ASAR archives with the asar
+script.
+'''
+
+import os
+import sys
+import shutil
+import struct
+import hashlib
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+import asar  # noqa: E402
+
+# Define whether copies may be performed by the kernel on this platform.
+KERNEL_COPY = hasattr(os, 'copy_file_range') or hasattr(os, 'sendfile')
+
+
+class AsarTestCase(unittest.TestCase):
+    ''' Implements a test case against a directory of files to pack. '''
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.input_path = os.path.join(self.path, 'app')
+        self.archive_path = os.path.join(self.path, 'app.asar')
+
+    def write(self, name, content):
+        '''
+        Writes a file to the directory to pack.
+
+        Args:
+            name (str): The path of the file, relative to the directory.
+            content (bytes): The content of the file.
+        '''
+        path = os.path.join(self.input_path, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'wb') as fout:
+            fout.write(content)
+
+    def read(self, path, name):
+        '''
+        Args:
+            path (str): The path of the ASAR.
+            name (str): The path of the entry in the ASAR.
+
+        Returns:
+            bytes: The content of the entry.
+        '''
+        with asar.AsarReader(path) as reader:
+            return bytes(reader.read(name))
+
+    def tree(self, path):
+        '''
+        Args:
+            path (str): The path of a directory.
+
+        Returns:
+            dict: The content of each file under the directory, by its path
+                relative to the directory.
+        '''
+        files = {}
+        for (directory, _, file_names) in os.walk(path):
+            for file_name in file_names:
+                file_path = os.path.join(directory, file_name)
+                with open(file_path, 'rb') as fin:
+                    files[os.path.relpath(file_path, path)] = fin.read()
+        return files
+
+
+class RoundTripTest(AsarTestCase):
+
+    def setUp(self):
+        super(RoundTripTest, self).setUp()
+        self.write('package.json', b'{"main": "main.js"}')
+        self.write('empty.txt', b'')
+        self.write('lib/main.js', b'console.log(1);\n' * 100)
+        self.write('lib/vendor/large.bin', os.urandom(asar.CHUNK_SIZE + 3))
+        self.write('assets/icons/icon.png', os.urandom(1024))
+        self.output_path = os.path.join(self.path, 'out')
+
+    def test_unpacked_tree_matches_packed_tree(self):
+        asar.pack(self.input_path, self.archive_path)
+        for workers in (1, asar.UNPACK_WORKERS):
+            output_path = os.path.join(self.output_path, str(workers))
+            asar.unpack(self.archive_path, output_path, workers=workers)
+            self.assertEqual(
+                self.tree(os.path.join(output_path, 'app')),
+                self.tree(self.input_path),
+            )
+
+    def test_contents_of_directory_may_be_packed(self):
+        # With a trailing separator, the top-level directory is not packed.
+        asar.pack(self.input_path + '/', self.archive_path)
+        with asar.AsarReader(self.archive_path) as reader:
+            self.assertIn('lib/main.js', reader.list())
+
+        asar.unpack(self.archive_path, self.output_path)
+        self.assertEqual(
+            self.tree(self.output_path),
+            self.tree(self.input_path),
+        )
+
+    def test_single_file_may_be_extracted(self):
+        asar.pack(self.input_path, self.archive_path)
+        os.makedirs(self.output_path)
+
+        asar.unpack(self.archive_path, self.output_path, 'app/lib/main.js')
+        self.assertEqual(
+            self.tree(self.output_path),
+            {'main.js': b'console.log(1);\n' * 100},
+        )
+
+        # Missing entries are ignored.
+        asar.unpack(self.archive_path, self.output_path, 'app/missing.js')
+        self.assertEqual(os.listdir(self.output_path), ['main.js'])
+
+    def test_entries_are_read_in_place(self):
+        asar.pack(self.input_path, self.archive_path)
+        with asar.AsarReader(self.archive_path) as reader:
+            self.assertEqual(
+                sorted(reader.list()),
+                sorted(
+                    'app/' + name.replace(os.sep, '/')
+                    for name in self.tree(self.input_path)
+                ),
+            )
+            with reader.open('app/lib/vendor/large.bin') as fin:
+                self.assertEqual(
+                    fin.read(),
+                    self.tree(self.input_path)[
+                        os.path.join('lib', 'vendor', 'large.bin')
+                    ],
+                )
+
+    def test_integrity_does_not_change_content(self):
+        asar.pack(self.input_path, self.archive_path, integrity=True)
+        asar.unpack(self.archive_path, self.output_path)
+        self.assertEqual(
+            self.tree(os.path.join(self.output_path, 'app')),
+            self.tree(self.input_path),
+        )
+
+
+class PaddingTest(AsarTestCase):
+
+    def test_headers_of_every_length_are_aligned(self):
+        documents = set()
+        for length in range(1, 9):
+            name = 'n' * length
+            self.write(name, b'x' * length)
+            archive_path = os.path.join(self.path, '{0}.asar'.format(name))
+            asar.pack(self.input_path, archive_path)
+
+            with open(archive_path, 'rb') as fin:
+                prefix = fin.read(16)
+            (size, pickle_size, header_sz, document_sz) = struct.unpack(
+                '<IIII',
+                prefix,
+            )
+            documents.add(document_sz % 4)
+
+            # The header is padded to 32-bit alignment, per Chromium pickle.
+            self.assertEqual((size, pickle_size), (4, header_sz + 4))
+            self.assertEqual(header_sz % 4, 0)
+            self.assertLess(header_sz - 4 - document_sz, 4)
+
+            # Each entry reads back from the aligned content section, which
+            # follows the size pickle and the header pickle.
+            with asar.AsarReader(archive_path) as reader:
+                self.assertEqual(reader.content_start, pickle_size + 8)
+                for entry in reader.list():
+                    self.assertEqual(
+                        bytes(reader.read(entry)),
+                        b'x' * len(entry.split('/')[-1]),
+                    )
+
+        self.assertEqual(documents, set(range(4)))
+
+
+class DeepTreeTest(unittest.TestCase):
+
+    def test_headers_deeper_than_recursion_limit(self):
+        # The JSON codecs recurse, so the header is built and walked as a
+        # dictionary, which is how pack and the reader handle it.
+        depth = sys.getrecursionlimit() + 100
+        name = '/'.join(['d'] * depth + ['file.txt'])
+        meta = {'offset': '0', 'size': 1}
+
+        header = {}
+        asar._add_header_entry(name, header, meta)
+        asar._add_header_entry('top.txt', header, meta)
+
+        self.assertEqual(
+            asar._parse_header(header['files']),
+            {name: meta, 'top.txt': meta},
+        )
+
+
+class RepackTest(AsarTestCase):
+
+    def setUp(self):
+        super(RepackTest, self).setUp()
+        self.write('a.txt', b'alpha')
+        self.write('lib/b.bin', os.urandom(asar.CHUNK_SIZE + 5))
+        self.write('lib/c.txt', b'charlie')
+        asar.pack(self.input_path, self.archive_path, integrity=True)
+
+        # Change, add, and remove an entry.
+        self.write('a.txt', b'changed')
+        self.write('lib/d.txt', b'delta')
+        os.remove(os.path.join(self.input_path, 'lib', 'c.txt'))
+        self.changed = set(['app/a.txt', 'app/lib/c.txt', 'app/lib/d.txt'])
+
+        self.expected_path = os.path.join(self.path, 'expected')
+        asar.pack(self.input_path, os.path.join(self.path, 'expected.asar'))
+        asar.unpack(
+            os.path.join(self.path, 'expected.asar'),
+            self.expected_path,
+        )
+
+    def assertRepacked(self, path):
+        '''
+        Asserts that a repacked ASAR holds the content of the changed
+        directory, with the integrity of every entry verified.
+
+        Args:
+            path (str): The path of the repacked ASAR.
+        '''
+        with asar.AsarReader(path) as reader:
+            self.assertEqual(
+                reader.list(),
+                ['app/a.txt', 'app/lib/b.bin', 'app/lib/d.txt'],
+            )
+            for name in reader.list():
+                self.assertIn('integrity', reader.meta[name])
+                reader.check(name)
+
+        output_path = os.path.join(self.path, 'repacked')
+        asar.unpack(path, output_path)
+        self.assertEqual(
+            self.tree(output_path),
+            self.tree(self.expected_path),
+        )
+
+    def test_repack_to_new_file(self):
+        output_path = os.path.join(self.path, 'repacked.asar')
+        with open(self.archive_path, 'rb') as fin:
+            original = fin.read()
+
+        asar.repack(
+            self.archive_path,
+            self.input_path,
+            output_path,
+            self.changed,
+            integrity=True,
+        )
+        self.assertRepacked(output_path)
+
+        # The original is left untouched.
+        with open(self.archive_path, 'rb') as fin:
+            self.assertEqual(fin.read(), original)
+
+    def test_repack_in_place(self):
+        asar.repack(
+            self.archive_path,
+            self.input_path,
+            self.archive_path,
+            self.changed,
+            integrity=True,
+        )
+        self.assertRepacked(self.archive_path)
+        self.assertEqual(os.listdir(self.path).count('app.asar.tmp'), 0)
+
+    def test_integrity_is_added_to_unchanged_entries(self):
+        asar.pack(self.input_path, self.archive_path)
+        asar.repack(
+            self.archive_path,
+            self.input_path,
+            self.archive_path,
+            set(),
+            integrity=True,
+        )
+
+        with asar.AsarReader(self.archive_path) as reader:
+            for name in reader.list():
+                self.assertEqual(
+                    reader.meta[name]['integrity']['hash'],
+                    hashlib.sha256(reader.read(name)).hexdigest(),
+                )
+
+
+class KernelCopyTest(AsarTestCase):
+
+    def setUp(self):
+        super(KernelCopyTest, self).setUp()
+        self.write('a.txt', b'alpha')
+        self.write('b.bin', os.urandom(asar.CHUNK_SIZE * 3 + 7))
+        self.write('c.txt', b'charlie')
+        asar.pack(self.input_path, self.archive_path)
+
+        self.write('a.txt', b'changed')
+        self.output_path = os.path.join(self.path, 'repacked.asar')
+
+        # Pack the changed directory from scratch, for comparison.
+        self.expected_path = os.path.join(self.path, 'expected.asar')
+        asar.pack(self.input_path, self.expected_path)
+
+        self.calls = []
+        kernel_copy = asar._kernel_copy
+        self.addCleanup(setattr, asar, '_kernel_copy', kernel_copy)
+
+        def counted(src, dst, count, offset):
+            self.calls.append((offset, count))
+            return kernel_copy(src, dst, count, offset)
+
+        asar._kernel_copy = counted
+
+    def repack(self):
+        '''
+        Returns:
+            bytes: The content of the repacked ASAR.
+        '''
+        asar.repack(
+            self.archive_path,
+            self.input_path,
+            self.output_path,
+            set(['app/a.txt']),
+        )
+        with open(self.output_path, 'rb') as fin:
+            return fin.read()
+
+    @unittest.skipIf(not KERNEL_COPY, 'Kernel copies are not supported')
+    def test_unchanged_ranges_are_copied_by_the_kernel(self):
+        with open(self.expected_path, 'rb') as fin:
+            self.assertEqual(self.repack(), fin.read())
+
+        # The unchanged entries are adjacent, so are copied as one range.
+        with asar.AsarReader(self.archive_path) as reader:
+            entry = reader.stat('app/b.bin')
+        self.assertEqual(
+            self.calls[0],
+            (entry.offset, entry.size + len(b'charlie')),
+        )
+
+    def test_ranges_are_written_from_the_mapping_without_kernel_support(self):
+        def unsupported(src, dst, count, offset):
+            self.calls.append((offset, count))
+            raise OSError('Not supported')
+
+        asar._kernel_copy = unsupported
+
+        with open(self.expected_path, 'rb') as fin:
+            self.assertEqual(self.repack(), fin.read())
+
+
+class IntegrityTest(AsarTestCase):
+
+    def setUp(self):
+        super(IntegrityTest, self).setUp()
+        self.addCleanup(
+            setattr,
+            asar,
+            'INTEGRITY_BLOCK_SIZE',
+            asar.INTEGRITY_BLOCK_SIZE,
+        )
+
+    def corrupt(self, name, position):
+        '''
+        Flips a byte of an entry in the packed ASAR.
+
+        Args:
+            name (str): The path of the entry in the ASAR.
+            position (int): The position of the byte, relative to the entry.
+        '''
+        with asar.AsarReader(self.archive_path) as reader:
+            offset = reader.stat(name).offset + position
+        with open(self.archive_path, 'r+b') as fout:
+            fout.seek(offset)
+            byte = bytearray(fout.read(1))
+            fout.seek(offset)
+            fout.write(bytes(bytearray([byte[0] ^ 0xff])))
+
+    def test_exact_multiple_has_a_trailing_empty_block(self):
+        content = b'\0' * asar.INTEGRITY_BLOCK_SIZE
+        integrity = asar.Integrity(len(content))
+        integrity.update(content)
+        integrity.finish()
+
+        self.assertEqual(
+            integrity.meta['blocks'],
+            [
+                hashlib.sha256(content).hexdigest(),
+                hashlib.sha256(b'').hexdigest(),
+            ],
+        )
+        self.assertEqual(
+            integrity.meta['hash'],
+            hashlib.sha256(content).hexdigest(),
+        )
+
+    def test_block_counts_match_electron(self):
+        asar.INTEGRITY_BLOCK_SIZE = 4
+        for (size, blocks) in ((0, 1), (3, 1), (4, 2), (5, 2), (8, 3)):
+            integrity = asar.Integrity(size)
+            integrity.update(b'x' * size)
+            integrity.finish()
+            self.assertEqual(len(integrity.meta['blocks']), blocks)
+            self.assertNotIn('0' * 64, integrity.meta['blocks'])
+
+    def test_packed_entries_are_verified(self):
+        asar.INTEGRITY_BLOCK_SIZE = 16
+        self.write('empty.txt', b'')
+        self.write('exact.bin', os.urandom(32))
+        self.write('partial.bin', os.urandom(40))
+        asar.pack(self.input_path, self.archive_path, integrity=True)
+
+        with asar.AsarReader(self.archive_path) as reader:
+            for name in reader.list():
+                meta = reader.meta[name]['integrity']
+                self.assertEqual(
+                    len(meta['blocks']),
+                    reader.stat(name).size // 16 + 1,
+                )
+                with reader.open(name) as fin:
+                    self.assertEqual(
+                        hashlib.sha256(fin.read()).hexdigest(),
+                        meta['hash'],
+                    )
+
+    def test_corrupt_blocks_raise(self):
+        asar.INTEGRITY_BLOCK_SIZE = 16
+        self.write('exact.bin', os.urandom(32))
+        asar.pack(self.input_path, self.archive_path, integrity=True)
+        self.corrupt('app/exact.bin', 20)
+
+        with asar.AsarReader(self.archive_path) as reader:
+            # Blocks before the corruption are verified successfully.
+            reader.check('app/exact.bin', 0, 16)
+
+            with self.assertRaises(asar.IntegrityError):
+                reader.read('app/exact.bin')
+            with self.assertRaises(asar.IntegrityError):
+                with reader.open('app/exact.bin') as fin:
+                    fin.read()
+
+        # Corruption is not detected where verification is disabled.
+        with asar.AsarReader(self.archive_path, verify=False) as reader:
+            self.assertEqual(len(bytes(reader.read('app/exact.bin'))), 32)
+
+
+if __name__ == '__main__':
+    unittest.main()
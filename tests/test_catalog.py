@@ -0,0 +1,123 @@
+''' Tests for lookups in the channel catalog, and the merging of variants. '''
+
+import json
+import unittest
+
+from resources.lib.nowtv import catalog
+
+CHANNELS = [
+    {'serviceKey': '1', 'channelName': 'Sky One', 'formatType': 'SD'},
+    {'serviceKey': '2', 'channelName': 'Sky One HD', 'formatType': 'HD'},
+    {'serviceKey': '3', 'channelName': 'Sky Arts HD', 'formatType': 'HD'},
+    {'serviceKey': '4', 'channelName': 'Pick', 'formatType': 'SD'},
+]
+
+
+class MergeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.data = catalog.build(CHANNELS)
+
+    def test_sd_variant_is_played_without_hd_entitlement(self):
+        channels = catalog.Catalog(catalog.merge([self.data]))
+
+        self.assertEqual(channels.service_keys, ['1', '3', '4'])
+        self.assertEqual(channels.get('2')['serviceKey'], '1')
+        self.assertFalse(channels.get('1')['isHD'])
+        self.assertEqual(
+            channels.get('1')['variants'],
+            {'SD': '1', 'HD': '2'},
+        )
+
+    def test_hd_variant_is_played_with_hd_entitlement(self):
+        channels = catalog.Catalog(catalog.merge([self.data], hd=True))
+
+        self.assertEqual(channels.service_keys, ['2', '3', '4'])
+        self.assertEqual(channels.get('1')['serviceKey'], '2')
+        self.assertEqual(channels.get('1')['channelName'], 'Sky One')
+        self.assertTrue(channels.get('1')['isHD'])
+
+    def test_merge_preserves_catalog_precedence(self):
+        sd = catalog.build(CHANNELS[::3])
+        hd = catalog.build(CHANNELS[1:3])
+        channels = catalog.Catalog(catalog.merge([hd, sd]))
+
+        self.assertEqual(channels.service_keys, ['1', '3', '4'])
+
+
+class LookupTest(unittest.TestCase):
+
+    def setUp(self):
+        channels = [dict(channel) for channel in CHANNELS]
+        for channel in channels:
+            channel['section'] = {'4': 'sports'}.get(
+                channel['serviceKey'],
+                'entertainment',
+            )
+            channel['logo'] = [
+                {
+                    'type': 'Light',
+                    'key': 'light-{0}'.format(channel['serviceKey']),
+                    'template': 'https://images.example/{key}/{width}',
+                },
+                {
+                    'type': 'Dark',
+                    'key': 'dark-{0}'.format(channel['serviceKey']),
+                    'template':
+                        'https://images.example/{key}/{width}x{height}.png',
+                },
+            ]
+        del channels[3]['logo']
+
+        self.channels = catalog.Catalog(catalog.build(channels, 50, 40))
+
+    def test_channels_are_looked_up_by_section(self):
+        self.assertEqual(
+            [channel['serviceKey']
+             for channel in self.channels.section('entertainment')],
+            ['1', '2', '3'],
+        )
+        self.assertEqual(
+            [channel['serviceKey']
+             for channel in self.channels.section('sports')],
+            ['4'],
+        )
+        self.assertEqual(self.channels.section('movies'), [])
+
+    def test_channels_are_looked_up_by_format(self):
+        self.assertEqual(
+            [channel['serviceKey']
+             for channel in self.channels.format_type('HD')],
+            ['2', '3'],
+        )
+        self.assertEqual(
+            [channel['isHD'] for channel in self.channels.format_type('SD')],
+            [False, False],
+        )
+        self.assertEqual(self.channels.format_type('UHD'), [])
+
+    def test_channels_are_looked_up_by_service_key(self):
+        self.assertEqual(len(self.channels), 4)
+        self.assertIn('3', self.channels)
+        self.assertNotIn('5', self.channels)
+        self.assertEqual(self.channels.get('3')['channelName'], 'Sky Arts HD')
+        self.assertIsNone(self.channels.get('5'))
+
+    def test_dark_logo_is_rendered_at_the_requested_size(self):
+        self.assertEqual(
+            self.channels.get('1')['logoUrl'],
+            'https://images.example/dark-1/50x40.png',
+        )
+        self.assertIsNone(self.channels.get('4')['logoUrl'])
+
+        # Lookups are unchanged once the catalog has been cached as data.
+        cached = catalog.Catalog(json.loads(json.dumps(self.channels.data)))
+        self.assertEqual(
+            cached.get('1')['logoUrl'],
+            self.channels.get('1')['logoUrl'],
+        )
+        self.assertEqual(cached.service_keys, self.channels.service_keys)
+
+
+if __name__ == '__main__':
+    unittest.main()
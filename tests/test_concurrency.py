@@ -0,0 +1,45 @@
+''' Tests for the concurrency helpers used by the NOW TV clients. '''
+
+import sys
+import traceback
+import unittest
+
+from resources.lib.nowtv import concurrency
+
+
+def fail(message):
+    raise ValueError(message)
+
+
+class RaiseTest(unittest.TestCase):
+
+    def assertRaisedIn(self, name, func, *args):
+        '''
+        Asserts that the callable raises a ValueError, with a traceback which
+        includes the given function - in which it was originally raised.
+        '''
+        try:
+            func(*args)
+        except ValueError:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+        else:
+            self.fail('ValueError not raised')
+
+        self.assertIn(name, [frame[2] for frame in frames])
+
+    def test_task_preserves_worker_traceback(self):
+        task = concurrency.Task(fail, 'Task')
+        self.assertRaisedIn('fail', task.result)
+
+    def test_fan_out_preserves_worker_traceback(self):
+        self.assertRaisedIn(
+            'fail',
+            concurrency.fan_out,
+            fail,
+            ['First', 'Second'],
+            2,
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
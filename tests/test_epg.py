@@ -0,0 +1,148 @@
+'''
+Tests for the EPG clients against a local stub server - that the pooled client
+returns the same schedules as the EPG client, and the channel variants chosen
+for the combined catalog.
+'''
+
+import shutil
+import tempfile
+import unittest
+
+import tests
+
+from tests import fakes
+from resources.lib.nowtv import epg
+from resources.lib.nowtv import scheduler
+from resources.lib.nowtv import exceptions
+
+DATE = '20200101'
+
+# Define the service keys fetched, and one for which the EPG returns an error.
+KEYS = [str(key) for key in range(12)]
+MISSING = 'missing'
+
+
+class EquivalenceTest(unittest.TestCase):
+
+    def setUp(self):
+        tests.reset()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.stub = fakes.StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        self.stub.epg([])
+        self.stub.route(
+            '/schedule/{0}/{1}'.format(DATE, MISSING),
+            lambda method, path, query: (404, {}, ''),
+        )
+
+        endpoints = fakes.endpoints(self.stub)
+        endpoints.__enter__()
+        self.addCleanup(endpoints.__exit__, None, None, None)
+
+        # The schedules fetched by the EPG client, one at a time, from a cold
+        # cache.
+        client = epg.Client()
+        self.expected = dict(
+            (key, client.schedule(DATE, key)) for key in KEYS
+        )
+        with self.assertRaises(exceptions.BaseError):
+            client.schedule(DATE, MISSING)
+        tests.reset()
+
+    def pooled(self, **kwargs):
+        '''
+        Returns:
+            epg.PooledClient: A pooled client which is not rate limited.
+        '''
+        client = epg.PooledClient(limit=4, **kwargs)
+        client.scheduler = scheduler.Scheduler(
+            4,
+            scheduler.TokenBucket(1000, 1000),
+        )
+        return client
+
+    def test_schedules_match_client(self):
+        self.assertEqual(self.pooled().schedules(DATE, KEYS), self.expected)
+
+    def test_prefetched_schedules_match_client(self):
+        client = self.pooled(store_path=self.path)
+        client.prefetch(DATE, KEYS)
+        requested = self.stub.count()
+
+        # Schedules are read back from the store, without further requests.
+        self.assertEqual(
+            dict((key, client.schedule(DATE, key)) for key in KEYS),
+            self.expected,
+        )
+        self.assertEqual(self.stub.count(), requested)
+
+    def test_errors_match_client(self):
+        client = self.pooled(store_path=self.path)
+
+        with self.assertRaises(exceptions.BaseError):
+            client.schedules(DATE, KEYS + [MISSING])
+        with self.assertRaises(exceptions.BaseError):
+            client.prefetch(DATE, [MISSING] + KEYS)
+
+
+class CombinedChannelsTest(unittest.TestCase):
+
+    def setUp(self):
+        tests.reset()
+        self.stub = fakes.StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+
+        endpoints = fakes.endpoints(self.stub)
+        endpoints.__enter__()
+        self.addCleanup(endpoints.__exit__, None, None, None)
+
+        # Only the boost section carries HD variants.
+        channels = {
+            'entertainment': [
+                fakes.channel('1', 'Sky One'),
+                fakes.channel('3', 'Pick'),
+            ],
+            'boost': [
+                fakes.channel('2', 'Sky One HD', 'boost', 'HD'),
+            ],
+        }
+        self.stub.route(
+            '/channels',
+            lambda method, path, query: (
+                200,
+                {},
+                [
+                    channel
+                    for section in query['section'][0].split(',')
+                    for channel in channels[section]
+                ],
+            ),
+        )
+        self.client = epg.Client()
+
+    def test_hd_variants_are_used_where_present(self):
+        channels = self.client.combined_channels(['boost', 'entertainment'])
+
+        self.assertEqual(channels.service_keys, ['2', '3'])
+        self.assertEqual(channels.get('1')['variants'], {'SD': '1', 'HD': '2'})
+
+    def test_sd_variants_are_used_where_no_hd_is_present(self):
+        channels = self.client.combined_channels(['entertainment'])
+        self.assertEqual(channels.service_keys, ['1', '3'])
+
+    def test_variants_may_be_specified(self):
+        sections = ['boost', 'entertainment']
+        self.assertEqual(
+            self.client.combined_channels(sections, hd=False).service_keys,
+            ['1', '3'],
+        )
+        self.assertEqual(
+            self.client.combined_channels(sections, hd=True).service_keys,
+            ['2', '3'],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
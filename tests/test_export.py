@@ -0,0 +1,168 @@
+''' Tests for the XMLTV and M3U exporter. '''
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from xml.etree import ElementTree
+
+from tests import fakes
+from resources.lib import export
+from resources.lib.nowtv import store
+
+TEMPLATE = 'https://images.example/{type}/{size}.jpg'
+
+CHANNELS = [{'serviceKey': '1234', 'channelName': 'Channel'}]
+
+SCHEDULE = [
+    {
+        'events': [
+            {
+                'startTimeEpoch': 1577836800,
+                'durationInSeconds': 3600,
+                'title': 'Programme',
+                'programmeImageUrlTemplate': TEMPLATE,
+            },
+        ],
+    },
+]
+
+
+class Store(object):
+    ''' Implements a schedule store holding a single unchanging schedule. '''
+
+    def changed(self, since=0):
+        return {'1234': 1} if since < 1 else {}
+
+    def get(self, service_key):
+        return SCHEDULE
+
+
+class ExporterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def guide(self):
+        path = os.path.join(self.path, export.XMLTV_FILE)
+        with io.open(path, 'r', encoding='utf-8') as fin:
+            return fin.read()
+
+    def test_programme_icons_use_guide_thumbnail_size(self):
+        exporter = export.Exporter(self.path, aspect='4-3', image_size=600)
+
+        self.assertEqual(exporter.update(CHANNELS, Store(), 'plugin://'), 1)
+        self.assertIn(TEMPLATE.format(type='4-3', size=600), self.guide())
+
+    def test_unchanged_programmes_are_rendered_once(self):
+        exporter = export.Exporter(self.path)
+
+        self.assertEqual(exporter.update(CHANNELS, Store(), 'plugin://'), 1)
+        self.assertEqual(exporter.update(CHANNELS, Store(), 'plugin://'), 0)
+
+    def test_programmes_are_rerendered_when_icon_size_changes(self):
+        export.Exporter(self.path).update(CHANNELS, Store(), 'plugin://')
+
+        exporter = export.Exporter(self.path, image_size=800)
+        self.assertEqual(exporter.update(CHANNELS, Store(), 'plugin://'), 1)
+        self.assertIn(TEMPLATE.format(type='16-9', size=800), self.guide())
+
+
+class CatalogExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.store = store.ScheduleStore(os.path.join(self.path, 'store'))
+        self.channels = [
+            {
+                'serviceKey': str(key),
+                'channelName': 'Channel {0}'.format(key),
+            }
+            for key in range(500)
+        ]
+        for entry in self.channels:
+            self.store.update(
+                entry['serviceKey'],
+                '20200101',
+                fakes.schedule(entry['serviceKey'])['schedule'],
+            )
+
+        self.exporter = export.Exporter(os.path.join(self.path, 'export'))
+
+    def update(self, channels):
+        '''
+        Args:
+            channels (list of dict): The channels to export.
+
+        Returns:
+            int: The number of channels whose programmes were re-rendered.
+        '''
+        return self.exporter.update(channels, self.store, 'plugin://')
+
+    def parse(self):
+        '''
+        Returns:
+            Element: The root of the exported XMLTV guide.
+        '''
+        return ElementTree.parse(
+            os.path.join(self.exporter.path, export.XMLTV_FILE),
+        ).getroot()
+
+    def test_all_channels_are_exported(self):
+        self.assertEqual(self.update(self.channels), 500)
+
+        root = self.parse()
+        self.assertEqual(len(root.findall('channel')), 500)
+        self.assertEqual(
+            len(root.findall('programme')),
+            500 * fakes.EVENTS,
+        )
+        with io.open(
+            os.path.join(self.exporter.path, export.M3U_FILE),
+            'r',
+            encoding='utf-8',
+        ) as fin:
+            self.assertEqual(len(fin.read().splitlines()), 1 + 500 * 2)
+
+    def test_only_changed_channels_are_rerendered(self):
+        self.update(self.channels)
+        self.assertEqual(self.update(self.channels), 0)
+
+        changed = fakes.schedule('7', events=fakes.EVENTS - 1)['schedule']
+        self.store.update('7', '20200101', changed)
+
+        self.assertEqual(self.update(self.channels), 1)
+        self.assertEqual(
+            len(self.parse().findall('programme')),
+            500 * fakes.EVENTS - 1,
+        )
+
+    def test_fragments_of_removed_channels_are_pruned(self):
+        self.update(self.channels)
+        self.update(self.channels[:250])
+
+        self.assertEqual(
+            sorted(os.listdir(self.exporter.fragments)),
+            sorted('{0}.xml'.format(key) for key in range(250)),
+        )
+        root = self.parse()
+        self.assertEqual(len(root.findall('channel')), 250)
+        self.assertEqual(
+            set(element.get('channel')
+                for element in root.findall('programme')),
+            set(str(key) for key in range(250)),
+        )
+
+        # Channels which return are rendered again.
+        self.assertEqual(self.update(self.channels), 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
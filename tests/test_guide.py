@@ -0,0 +1,42 @@
+''' Tests for the streaming guide writer. '''
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from resources.lib import guide
+
+
+class WriteTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.file = os.path.join(self.path, guide.GUIDE_FILE)
+        self.consumed = []
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def channels(self, count):
+        for index in range(count):
+            self.consumed.append(index)
+            yield {'channelnumber': str(index), 'guidedata': ['x' * 100]}
+
+    def test_all_channels_are_written(self):
+        self.assertEqual(guide.write(self.file, self.channels(10)), 10)
+        with open(self.file, 'r') as fin:
+            self.assertEqual(len(json.load(fin)), 10)
+
+    def test_channels_beyond_limit_are_not_consumed(self):
+        written = guide.write(self.file, self.channels(10), limit=1024)
+
+        self.assertLessEqual(os.path.getsize(self.file), 1024)
+        self.assertEqual(len(self.consumed), written + 1)
+        with open(self.file, 'r') as fin:
+            self.assertEqual(len(json.load(fin)), written)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,195 @@
+''' Tests for the queued Kodi and structured log handlers. '''
+
+import os
+import json
+import shutil
+import logging
+import tempfile
+import unittest
+import threading
+
+from resources.lib import logger
+
+
+class LoggerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        # Emit records queued by earlier tests, before Kodi is patched.
+        logger.shutdown()
+
+        # Capture records emitted to Kodi, and the thread they are emitted
+        # from.
+        self.emitted = []
+        self.debug = False
+        self.patch(
+            'log',
+            lambda message, level: self.emitted.append(
+                (message, level, threading.current_thread())
+            ),
+        )
+        self.patch('getCondVisibility', lambda condition: self.debug)
+
+        # The logger is not a child of the add-on logger, which may have
+        # handlers installed by plugins constructed in other tests.
+        self.name = 'nowtv.test.{0}'.format(self.id())
+        self.addCleanup(self.remove_handlers)
+        self.addCleanup(logger.shutdown)
+
+    def patch(self, name, value):
+        '''
+        Overrides a function of the Kodi module for the duration of the test.
+
+        Args:
+            name (str): The name of the function.
+            value (callable): The function to use.
+        '''
+        self.addCleanup(
+            setattr,
+            logger.xbmc,
+            name,
+            getattr(logger.xbmc, name),
+        )
+        setattr(logger.xbmc, name, value)
+
+    def remove_handlers(self):
+        log = logging.getLogger(self.name)
+        for handler in list(log.handlers):
+            log.removeHandler(handler)
+            for queued in getattr(handler, 'handlers', []):
+                queued.close()
+
+    def messages(self):
+        '''
+        Returns:
+            list of str: The messages emitted to Kodi.
+        '''
+        return [message for (message, _, _) in self.emitted]
+
+    def test_records_are_emitted_by_the_listener(self):
+        log = logger.get(self.name)
+        log.warning('Queued')
+        logger.shutdown()
+
+        self.assertEqual(self.messages(), ['Queued'])
+        self.assertIsNot(self.emitted[0][2], threading.current_thread())
+
+        # Logging after shutdown starts a new listener.
+        log.error('Restarted')
+        logger.shutdown()
+        self.assertEqual(self.messages(), ['Queued', 'Restarted'])
+
+    def test_handlers_are_installed_once(self):
+        log = logger.get(self.name)
+        self.assertIs(logger.get(self.name), log)
+        self.assertEqual(len(log.handlers), 1)
+
+        log.warning('Once')
+        logger.shutdown()
+        self.assertEqual(self.messages(), ['Once'])
+
+    def test_records_are_gated_by_level(self):
+        log = logger.get(self.name)
+        self.assertFalse(log.isEnabledFor(logging.INFO))
+
+        log.debug('Discarded')
+        log.info('Discarded')
+        log.warning('Emitted')
+        logger.shutdown()
+        self.assertEqual(self.messages(), ['Emitted'])
+
+    def test_debug_records_are_emitted_with_debug_logging(self):
+        self.debug = True
+        log = logger.get(self.name)
+
+        log.debug('Debug')
+        logger.shutdown()
+        self.assertEqual(
+            self.emitted[0][:2],
+            ('Debug', logger.xbmc.LOGDEBUG),
+        )
+
+    def test_structured_log_is_sampled_and_rotated(self):
+        path = os.path.join(self.path, 'nowtv.log')
+        self.addCleanup(
+            setattr,
+            logger,
+            'FILE_MAX_BYTES',
+            logger.FILE_MAX_BYTES,
+        )
+        logger.FILE_MAX_BYTES = 1024
+
+        log = logger.get(self.name, path)
+        self.assertTrue(log.isEnabledFor(logging.DEBUG))
+        for index in range(logger.FILE_SAMPLE_RATE * 10):
+            log.debug('Sampled %d', index)
+        try:
+            raise ValueError('Failure')
+        except ValueError:
+            log.exception('Failed')
+        logger.shutdown()
+
+        # Debug records reach the file, but not Kodi.
+        self.assertEqual(self.messages()[-1].splitlines()[0], 'Failed')
+        self.assertEqual(len(self.emitted), 1)
+
+        entries = []
+        for name in sorted(os.listdir(self.path), reverse=True):
+            with open(os.path.join(self.path, name)) as fin:
+                entries.extend(json.loads(line) for line in fin)
+
+        self.assertTrue(os.path.exists('{0}.1'.format(path)))
+        self.assertEqual(
+            [entry['message'] for entry in entries[:-1]],
+            [
+                'Sampled {0}'.format(index)
+                for index in range(0, logger.FILE_SAMPLE_RATE * 10,
+                                   logger.FILE_SAMPLE_RATE)
+            ],
+        )
+        self.assertEqual(entries[-1]['level'], 'ERROR')
+        self.assertIn('ValueError: Failure', entries[-1]['exception'])
+
+    def test_shutdown_emits_all_queued_records(self):
+        log = logger.get(self.name)
+        for index in range(1000):
+            log.warning('Record %d', index)
+        logger.shutdown()
+
+        self.assertEqual(
+            self.messages(),
+            ['Record {0}'.format(index) for index in range(1000)],
+        )
+
+
+class SamplingFilterTest(unittest.TestCase):
+
+    def record(self, level, message):
+        return logging.LogRecord('test', level, __file__, 1, message, (), None)
+
+    def test_one_in_every_n_debug_records_is_retained(self):
+        sampling = logger.SamplingFilter(3)
+
+        retained = [
+            sampling.filter(self.record(logging.DEBUG, 'First'))
+            for _ in range(7)
+        ]
+        self.assertEqual(retained.count(True), 3)
+
+        # Each message is sampled separately.
+        self.assertTrue(sampling.filter(self.record(logging.DEBUG, 'Second')))
+
+    def test_higher_levels_are_always_retained(self):
+        sampling = logger.SamplingFilter(3)
+        self.assertTrue(
+            all(
+                sampling.filter(self.record(logging.INFO, 'Info'))
+                for _ in range(7)
+            )
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
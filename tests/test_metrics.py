@@ -0,0 +1,62 @@
+''' Tests for the metrics registry and its exports. '''
+
+import unittest
+
+from resources.lib.nowtv import metrics
+
+
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        registry = metrics.Registry()
+        registry.cache('schedule', 'hit')
+        registry.cache('schedule', 'miss')
+        registry.increment('nowtv_cache')
+        registry.gauge('nowtv_artwork_cache_bytes', 1024)
+        for value in (0.01, 0.2, 0.2, 0.7, 3.0):
+            registry.observe('nowtv_guide_open_seconds', value)
+        self.state = registry.state
+
+    def test_prometheus_declares_each_metric_once(self):
+        lines = metrics.prometheus(self.state).splitlines()
+        types = [line for line in lines if line.startswith('# TYPE')]
+
+        self.assertEqual(
+            sorted(types),
+            [
+                '# TYPE nowtv_artwork_cache_bytes gauge',
+                '# TYPE nowtv_cache counter',
+                '# TYPE nowtv_cache_total counter',
+                '# TYPE nowtv_guide_open_seconds histogram',
+            ],
+        )
+
+        # Each declaration precedes all series of its metric.
+        for line in types:
+            name = line.split()[2]
+            declared = lines.index(line)
+            for (index, series) in enumerate(lines):
+                if series.partition('{')[0].partition(' ')[0] == name:
+                    self.assertGreater(index, declared)
+
+        self.assertIn('nowtv_guide_open_seconds_count 5', lines)
+        self.assertIn(
+            'nowtv_guide_open_seconds_bucket{le="+Inf"} 5',
+            lines,
+        )
+
+    def test_summary_estimates_quantiles(self):
+        summary = metrics.summary(self.state)
+        histogram = summary['histograms']['nowtv_guide_open_seconds']
+
+        self.assertEqual(histogram['count'], 5)
+        self.assertTrue(0.1 <= histogram['p50'] <= 0.25)
+        self.assertTrue(2.5 <= histogram['p95'] <= 5.0)
+        self.assertEqual(
+            summary['gauges'],
+            {'nowtv_artwork_cache_bytes': 1024},
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+''' Tests for the management of external player processes. '''
+
+import os
+import json
+import stat
+import time
+import shutil
+import signal
+import tempfile
+import unittest
+import subprocess
+
+from resources.lib import player
+
+# A dummy launcher, which records its arguments and the contents of the
+# handoff file on each SIGUSR1, as a real player supporting handoff would.
+LAUNCHER = '''#!/bin/sh
+trap 'cat "{handoff}" >> "{log}"; echo >> "{log}"' USR1
+echo "$@" >> "{log}"
+while true; do
+    sleep 0.05
+done
+'''
+
+
+def wait_for(condition, timeout=5):
+    ''' Polls the condition until it is true, or the timeout expires. '''
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@unittest.skipUnless(
+    os.path.isdir('/proc/self') and hasattr(signal, 'SIGUSR1'),
+    'requires Linux',
+)
+class PlayerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.log = os.path.join(self.path, 'launcher.log')
+        self.launcher = os.path.join(self.path, 'launcher.sh')
+        with open(self.launcher, 'w') as fout:
+            fout.write(
+                LAUNCHER.format(
+                    handoff=os.path.join(self.path, 'player.handoff'),
+                    log=self.log,
+                )
+            )
+        os.chmod(self.launcher, stat.S_IRWXU)
+        self.processes = []
+
+    def tearDown(self):
+        entry = player.Registry(os.path.join(self.path, 'player.json')).get()
+        if entry:
+            os.kill(entry['pid'], signal.SIGKILL)
+            os.waitpid(entry['pid'], 0)
+        for process in self.processes:
+            process.kill()
+            process.wait()
+        shutil.rmtree(self.path)
+
+    def lines(self):
+        try:
+            with open(self.log, 'r') as fin:
+                return [line.strip() for line in fin if line.strip()]
+        except IOError:
+            return []
+
+    def test_play_starts_launcher_in_background(self):
+        instance = player.Player(self.launcher, self.path)
+
+        started = time.time()
+        pid = instance.play('1234', ['--deeplink', 'a'])
+        self.assertLess(time.time() - started, 1)
+
+        self.assertTrue(player.alive(pid))
+        self.assertTrue(wait_for(lambda: self.lines() == ['--deeplink a']))
+        self.assertEqual(
+            instance.registry.get()['identity'],
+            player.identity(pid),
+        )
+
+    def test_play_reuses_instance_playing_channel(self):
+        instance = player.Player(self.launcher, self.path)
+
+        pid = instance.play('1234', ['--deeplink', 'a'])
+        self.assertEqual(instance.play('1234', ['--deeplink', 'a']), pid)
+        self.assertTrue(wait_for(lambda: len(self.lines()) == 1))
+
+    def test_play_hands_off_to_running_instance(self):
+        instance = player.Player(self.launcher, self.path, handoff=True)
+
+        pid = instance.play('1234', ['--deeplink', 'a'])
+        self.assertTrue(wait_for(lambda: len(self.lines()) == 1))
+
+        self.assertEqual(instance.play('5678', ['--deeplink', 'b']), pid)
+        self.assertTrue(
+            wait_for(lambda: self.lines()[1:] == ['["--deeplink", "b"]'])
+        )
+        self.assertEqual(instance.registry.get()['service_key'], '5678')
+
+    def test_switch_without_handoff_terminates_running_instance(self):
+        instance = player.Player(self.launcher, self.path)
+
+        first = instance.play('1234', ['--deeplink', 'a'])
+        self.assertTrue(wait_for(lambda: len(self.lines()) == 1))
+
+        second = instance.play('5678', ['--deeplink', 'b'])
+
+        self.assertNotEqual(second, first)
+        self.assertFalse(player.alive(first))
+        self.assertTrue(player.alive(second))
+        self.assertEqual(instance.registry.get()['pid'], second)
+        self.assertTrue(
+            wait_for(lambda: self.lines() == ['--deeplink a', '--deeplink b'])
+        )
+
+    def test_registry_is_written_atomically(self):
+        instance = player.Player(self.launcher, self.path)
+        instance.play('1234', ['--deeplink', 'a'])
+
+        self.assertIn('player.json', os.listdir(self.path))
+        self.assertEqual(
+            [name for name in os.listdir(self.path) if name.endswith('.tmp')],
+            [],
+        )
+
+    def test_exited_player_is_not_reused(self):
+        instance = player.Player(self.launcher, self.path, handoff=True)
+
+        pid = instance.play('1234', ['--deeplink', 'a'])
+        os.kill(pid, signal.SIGKILL)
+        self.assertTrue(wait_for(lambda: not player.alive(pid)))
+
+        self.assertIsNone(instance.registry.get())
+        self.assertNotEqual(instance.play('5678', ['--deeplink', 'b']), pid)
+
+    def test_reused_pid_is_not_signalled(self):
+        # Register an unrelated process, as if it had reused the PID of an
+        # exited player.
+        unrelated = subprocess.Popen(['sleep', '30'])
+        self.processes.append(unrelated)
+        with open(os.path.join(self.path, 'player.json'), 'w') as fout:
+            json.dump(
+                {
+                    'pid': unrelated.pid,
+                    'identity': 'another process',
+                    'service_key': '1234',
+                    'started': time.time(),
+                },
+                fout,
+            )
+
+        instance = player.Player(self.launcher, self.path, handoff=True)
+        pid = instance.play('5678', ['--deeplink', 'b'])
+
+        self.assertNotEqual(pid, unrelated.pid)
+        self.assertIsNone(unrelated.poll())
+        self.assertTrue(wait_for(lambda: self.lines() == ['--deeplink b']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+''' Tests for the plugin helpers, and guide open against a stub server. '''
+
+import json
+import shutil
+import tempfile
+import unittest
+
+import tests
+
+from tests import fakes
+from resources.lib import skin
+from resources.lib import plugin
+from resources.lib import nowtv
+
+
+class ThumbnailsTest(unittest.TestCase):
+
+    def test_measured_size_is_requested(self):
+        sizes = {
+            'aspect': '16-9',
+            'image_size': '600',
+            'logo_width': 75,
+            'logo_height': 75,
+        }
+
+        self.assertEqual(
+            plugin.thumbnails(sizes),
+            {'aspect': '16-9', 'image_size': '600'},
+        )
+
+    def test_largest_size_is_requested_if_unmeasured(self):
+        self.assertEqual(
+            plugin.thumbnails({}),
+            {'image_size': str(skin.THUMBNAIL_WIDTHS[-1])},
+        )
+
+
+class DefinitionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.profile = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.profile)
+
+    def hd(self, definition):
+        settings = {'definition': definition}
+        return fakes.addon_plugin(self.profile, settings).hd
+
+    def test_definition_setting_is_mapped(self):
+        self.assertIsNone(self.hd(''))
+        self.assertIsNone(self.hd('0'))
+        self.assertIs(self.hd('1'), False)
+        self.assertIs(self.hd('2'), True)
+
+
+class StartGuideTest(unittest.TestCase):
+
+    def setUp(self):
+        tests.reset()
+        self.profile = tempfile.mkdtemp()
+        self.stub = fakes.StubServer(delay=0.05).__enter__()
+        self.stub.epg([fakes.channel(str(key)) for key in range(16)])
+        self.endpoints = fakes.endpoints(self.stub)
+        self.endpoints.__enter__()
+
+        # Entitlements from a previous invocation start a speculative fetch.
+        self.plugin = fakes.addon_plugin(self.profile)
+        self.plugin.cache.set(
+            nowtv.constants.CACHE_KEY_ENTITLEMENTS,
+            ['entertainment'],
+        )
+
+    def tearDown(self):
+        self.endpoints.__exit__(None, None, None)
+        self.stub.__exit__(None, None, None)
+        shutil.rmtree(self.profile)
+
+    def test_speculative_fetch_is_joined_on_failed_authentication(self):
+        self.plugin.authenticate = lambda: None
+
+        self.assertFalse(self.plugin.start_guide())
+
+        # Every schedule was fetched before returning, and nothing after.
+        fetched = self.stub.count('/schedule')
+        self.assertEqual(fetched, 16)
+        self.stub.delay = 0
+        self.assertEqual(self.stub.count('/schedule'), fetched)
+        self.assertTrue(self.plugin.epg.store.get('15'))
+
+    def test_unavailable_authentication_falls_back_to_cache(self):
+        def authenticate():
+            raise nowtv.exceptions.TransportError('Unavailable')
+
+        rendered = []
+        self.addCleanup(setattr, plugin.ui, 'epg', plugin.ui.epg)
+        plugin.ui.epg = lambda data, **kwargs: rendered.append(data)
+        self.plugin.authenticate = authenticate
+
+        self.plugin.start_guide()
+
+        # The speculative fetch is used, rather than fetching again.
+        self.assertEqual(len(json.loads(rendered[0])), 16)
+        self.assertEqual(self.stub.count('/schedule'), 16)
+        self.assertEqual(self.stub.count('/channels'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
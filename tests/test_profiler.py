@@ -0,0 +1,95 @@
+''' Tests for the invocation profiler. '''
+
+import os
+import shutil
+import pstats
+import tempfile
+import unittest
+import threading
+
+from resources.lib import profiler
+
+
+def work():
+    ''' Implements a unit of work, to be found in the profile. '''
+    return sum(value * value for value in range(10000))
+
+
+class ProfilerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def calls(self):
+        '''
+        Returns:
+            list of int: The number of calls to work() in each profile.
+        '''
+        calls = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith('.pstats'):
+                continue
+
+            stats = pstats.Stats(os.path.join(self.path, name))
+            calls.extend(
+                stat[1]
+                for (function, stat) in stats.stats.items()
+                if function[2] == 'work'
+            )
+        return calls
+
+    def test_worker_threads_are_profiled(self):
+        with profiler.Profiler(self.path) as instance:
+            threads = [threading.Thread(target=work) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(self.calls(), [4])
+        threads = 4 if profiler.THREAD_PROFILES else 0
+        self.assertEqual(len(instance.threads), threads)
+
+        # Threads started after the profile has ended are not profiled.
+        thread = threading.Thread(target=work)
+        thread.start()
+        thread.join()
+        self.assertEqual(len(instance.threads), threads)
+
+    def test_running_threads_are_stopped_on_exit(self):
+        ended = threading.Event()
+        started = threading.Event()
+        self.addCleanup(ended.set)
+
+        def worker():
+            work()
+            started.set()
+            ended.wait()
+            work()
+
+        with profiler.Profiler(self.path):
+            thread = threading.Thread(target=worker)
+            thread.start()
+            started.wait()
+
+        # Work done by the thread once the profile has ended is not recorded.
+        ended.set()
+        thread.join()
+        self.assertEqual(self.calls(), [1])
+
+    def test_successive_profiles_are_not_overwritten(self):
+        for _ in range(2):
+            with profiler.Profiler(self.path):
+                work()
+
+        names = sorted(os.listdir(self.path))
+        self.assertEqual(len(names), 4)
+        self.assertTrue(names[0].endswith('-{0}.pstats'.format(os.getpid())))
+        self.assertEqual(self.calls(), [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+''' Tests for the immutable per-endpoint header profiles. '''
+
+import copy
+import threading
+import unittest
+
+from resources.lib.nowtv import epg
+from resources.lib.nowtv import ott
+from resources.lib.nowtv import sso
+from resources.lib.nowtv import profiles
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import transport
+
+
+class Response(object):
+    ''' Implements a successful response with an empty body. '''
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {}
+
+
+class ProfileTest(unittest.TestCase):
+
+    def test_build_returns_independent_copy(self):
+        headers = profiles.EPG.build()
+        headers['X-SkyOTT-UserToken'] = 'token'
+
+        self.assertNotIn('X-SkyOTT-UserToken', profiles.EPG)
+        self.assertNotIn('X-SkyOTT-UserToken', profiles.EPG.build())
+        self.assertNotIn('X-SkyOTT-UserToken', constants.HTTP_HEADERS)
+
+    def test_build_adds_request_headers(self):
+        headers = profiles.OTT_AUTH_USERS_ME.build(
+            {'X-SkyOTT-UserToken': 'token'},
+        )
+
+        self.assertEqual(headers['X-SkyOTT-UserToken'], 'token')
+        self.assertEqual(
+            headers['Accept'],
+            profiles.OTT_AUTH_USERS_ME['Accept'],
+        )
+
+    def test_profile_is_immutable(self):
+        with self.assertRaises(TypeError):
+            profiles.EPG['Accept'] = 'text/html'
+
+
+class ConcurrencyTest(unittest.TestCase):
+    '''
+    Runs clients for different endpoints, and users, in parallel - asserting
+    that each request carries only the headers of its own endpoint and user.
+    '''
+
+    def setUp(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.request = transport.request
+        self.common = copy.deepcopy(constants.HTTP_HEADERS)
+
+        def request(method, url, **kwargs):
+            with self.lock:
+                self.requests.append(
+                    (
+                        threading.current_thread().name,
+                        url,
+                        dict(kwargs['headers']),
+                    )
+                )
+            return Response()
+
+        transport.request = request
+
+    def tearDown(self):
+        transport.request = self.request
+
+    def test_parallel_clients_do_not_share_headers(self):
+        # Each thread is named after the token of its client.
+        def run_ott():
+            client = ott.Client()
+            client._token = threading.current_thread().name
+            for _ in range(50):
+                client.userinfo()
+
+        def run_sso():
+            client = sso.Client()
+            client._token = threading.current_thread().name
+            for _ in range(50):
+                client.profile()
+
+        def run_epg():
+            client = epg.Client()
+            for _ in range(50):
+                client.nownext(['1234'])
+
+        threads = []
+        for index in range(4):
+            for (name, target) in (('ott', run_ott), ('sso', run_sso),
+                                   ('epg', run_epg)):
+                threads.append(
+                    threading.Thread(
+                        target=target,
+                        name='{0}-{1}'.format(name, index),
+                    )
+                )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.requests), 600)
+        for (name, url, headers) in self.requests:
+            if name.startswith('ott-'):
+                expected = profiles.OTT_AUTH_USERS_ME
+                self.assertEqual(url, constants.URI_OTT_AUTH_USERS_ME)
+                self.assertEqual(headers.pop('X-SkyOTT-UserToken'), name)
+            elif name.startswith('sso-'):
+                expected = profiles.OOGATEWAY_PROFILE
+                self.assertEqual(url, constants.URI_OOGATEWAY_PROFILE)
+                self.assertEqual(
+                    headers.pop('X-SkyId-Token'),
+                    'Session {0}'.format(name),
+                )
+            else:
+                expected = profiles.EPG
+
+            self.assertEqual(headers, dict(expected))
+
+        self.assertEqual(constants.HTTP_HEADERS, self.common)
+
+
+if __name__ == '__main__':
+    unittest.main()
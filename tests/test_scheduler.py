@@ -0,0 +1,227 @@
+''' Tests for the rate limited schedule fetches of the pooled EPG client. '''
+
+import time
+import unittest
+
+import tests
+
+from tests import fakes
+from resources.lib.nowtv import epg
+from resources.lib.nowtv import metrics
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import scheduler
+from resources.lib.nowtv import transport
+from resources.lib.nowtv import exceptions
+
+DATE = '20200101'
+
+
+class Response(object):
+    ''' Implements a successful schedule response. '''
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {'schedule': [{'title': 'Programme'}]}
+
+
+class CountingBucket(scheduler.TokenBucket):
+    ''' Implements a token bucket which counts the tokens acquired. '''
+
+    def __init__(self, rate, capacity):
+        super(CountingBucket, self).__init__(rate, capacity)
+        self.acquired = 0
+
+    def acquire(self):
+        super(CountingBucket, self).acquire()
+        with self.lock:
+            self.acquired += 1
+
+
+class ThrottleTest(unittest.TestCase):
+
+    def setUp(self):
+        tests.reset()
+        self.request = transport.request
+        self.requests = []
+
+        def request(method, url, **kwargs):
+            self.requests.append(url)
+            return Response()
+
+        transport.request = request
+
+        # Only allow a handful of network requests per second.
+        self.bucket = CountingBucket(5, 5)
+        self.client = epg.PooledClient()
+        self.client.scheduler = scheduler.Scheduler(
+            constants.EPG_FETCH_CONCURRENCY,
+            self.bucket,
+        )
+        self.keys = [str(key) for key in range(300)]
+
+    def tearDown(self):
+        transport.request = self.request
+
+    def test_cached_schedules_are_not_rate_limited(self):
+        for key in self.keys:
+            self.client.cache.set(
+                constants.CACHE_KEY_SCHEDULE.format(key),
+                [{'title': 'Cached'}],
+            )
+
+        started = time.time()
+        schedules = self.client.schedules(DATE, self.keys)
+
+        self.assertLess(time.time() - started, 1)
+        self.assertEqual(len(schedules), 300)
+        self.assertEqual(self.bucket.acquired, 0)
+        self.assertEqual(self.requests, [])
+
+    def test_fetched_schedules_are_rate_limited(self):
+        schedules = self.client.schedules(DATE, self.keys[:8])
+
+        self.assertEqual(len(schedules), 8)
+        self.assertEqual(self.bucket.acquired, 8)
+        self.assertEqual(len(self.requests), 8)
+
+
+class PriorityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.REGISTRY
+        metrics.REGISTRY = metrics.Registry()
+
+        # The visible rows are at the end of the list, so are only fetched
+        # first by priority.
+        self.keys = [str(key) for key in range(30)]
+        self.priorities = dict(
+            (key, 0 if int(key) >= 21 else 1) for key in self.keys
+        )
+        self.scheduler = scheduler.Scheduler(
+            4,
+            scheduler.TokenBucket(1000, 1000),
+        )
+
+    def tearDown(self):
+        metrics.REGISTRY = self.registry
+
+    def test_fetches_run_in_priority_order(self):
+        started = []
+        self.scheduler.limit = 1
+
+        def fetch(key):
+            started.append(key)
+            return key
+
+        results = self.scheduler.run(fetch, self.keys, self.priorities)
+
+        self.assertEqual(results, dict((key, key) for key in self.keys))
+        self.assertEqual(started, self.keys[21:] + self.keys[:21])
+
+    def test_visible_band_completes_first(self):
+        completed = {}
+
+        def fetch(key):
+            time.sleep(0.01)
+            completed[key] = time.time()
+
+        started = time.time()
+        self.scheduler.run(fetch, self.keys, self.priorities)
+        visible = max(completed[key] for key in self.keys[21:]) - started
+        remaining = max(completed[key] for key in self.keys[:21]) - started
+        self.assertLess(visible, remaining)
+
+        # The completion time of each band is recorded.
+        histograms = metrics.REGISTRY.state['histograms']
+        bands = [
+            histograms['nowtv_fetch_priority_seconds{{priority="{0}"}}'.format(
+                priority,
+            )]
+            for priority in (0, 1)
+        ]
+        self.assertEqual([band['count'] for band in bands], [1, 1])
+        self.assertLessEqual(bands[0]['sum'], visible + 0.01)
+        self.assertLess(bands[0]['sum'], bands[1]['sum'])
+
+
+class RateLimitTest(unittest.TestCase):
+
+    def setUp(self):
+        tests.reset()
+        fakes.silence(self)
+        self.stub = fakes.StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        self.stub.epg([])
+
+        endpoints = fakes.endpoints(self.stub)
+        endpoints.__enter__()
+        self.addCleanup(endpoints.__exit__, None, None, None)
+
+        self.client = epg.PooledClient(limit=1)
+        self.client.scheduler = scheduler.Scheduler(
+            1,
+            scheduler.TokenBucket(1000, 1000),
+        )
+
+        self.requested = []
+        self.stub.route('/schedule/', self.record(self.stub.routes[0][1]))
+
+    def record(self, handler):
+        '''
+        Wraps a route handler to record the time of each request.
+
+        Args:
+            handler (callable): The route handler to wrap.
+
+        Returns:
+            callable: The wrapped route handler.
+        '''
+        def wrapped(method, path, query):
+            self.requested.append((path.rsplit('/', 1)[1], time.time()))
+            return handler(method, path, query)
+        return wrapped
+
+    def test_rate_limited_fetch_is_paused_and_requeued(self):
+        limited = []
+
+        def handler(method, path, query):
+            if not limited:
+                limited.append(path)
+                return (429, {'Retry-After': '0.3'}, '')
+            return (200, {}, fakes.schedule('0'))
+
+        self.stub.route('/schedule/{0}/0'.format(DATE), self.record(handler))
+
+        schedules = self.client.schedules(DATE, ['0', '1', '2'])
+
+        self.assertEqual(sorted(schedules), ['0', '1', '2'])
+        self.assertEqual(
+            [key for (key, _) in self.requested],
+            ['0', '0', '1', '2'],
+        )
+
+        # No request was made until the requested interval had passed.
+        self.assertGreaterEqual(
+            self.requested[1][1] - self.requested[0][1],
+            0.3,
+        )
+
+    def test_rate_limited_fetch_is_retried_a_limited_number_of_times(self):
+        self.stub.route(
+            '/schedule/{0}/0'.format(DATE),
+            self.record(lambda method, path, query: (
+                429,
+                {'Retry-After': '0'},
+                '',
+            )),
+        )
+
+        with self.assertRaises(exceptions.RateLimitedError):
+            self.client.schedules(DATE, ['0'])
+        self.assertEqual(len(self.requested), constants.RETRY_ATTEMPTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+'''
+Tests for single-flight request coalescing across threads and processes,
+against a local stub server.
+'''
+
+import os
+import shutil
+import tempfile
+import unittest
+import threading
+import collections
+import multiprocessing
+
+import requests
+
+import tests
+
+from tests import fakes
+from resources.lib.nowtv import epg
+from resources.lib.nowtv import singleflight
+
+DATE = '20200101'
+
+# Define the keys requested, and the number of callers for each.
+KEYS = ['alpha', 'bravo', 'charlie', 'delta']
+CALLERS = 4
+
+
+def fetch(url, cache_path):
+    '''
+    Fetches a URL, unless a response is already cached on disk - so that the
+    result is shared with callers in other processes.
+
+    Args:
+        url (str): The URL to fetch.
+        cache_path (str): The path of the cached response.
+
+    Returns:
+        str: The response body.
+    '''
+    if os.path.exists(cache_path):
+        with open(cache_path) as fin:
+            return fin.read()
+
+    body = requests.get(url).text
+    with open(cache_path, 'w') as fout:
+        fout.write(body)
+    return body
+
+
+def call(args):
+    '''
+    Fetches a URL via a single-flight group, in a worker process.
+
+    Args:
+        args (tuple): The URL, key, and the paths of the lock and cache
+            directories.
+
+    Returns:
+        str: The response body.
+    '''
+    (url, key, lock_path, cache_path) = args
+    return singleflight.Group(lock_path).do(
+        key,
+        fetch,
+        url,
+        os.path.join(cache_path, key),
+    )
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        tests.reset()
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        # Responses are slow enough for callers to overlap.
+        self.stub = fakes.StubServer(delay=0.2).__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+        self.stub.epg([])
+
+        endpoints = fakes.endpoints(self.stub)
+        endpoints.__enter__()
+        self.addCleanup(endpoints.__exit__, None, None, None)
+
+    def hits(self):
+        '''
+        Returns:
+            dict: The number of upstream requests received for each key.
+        '''
+        return collections.Counter(
+            path.rsplit('/', 1)[1] for (_, path) in self.stub.requests
+        )
+
+    def test_threads_share_a_single_fetch(self):
+        client = epg.Client(lock_path=os.path.join(self.path, 'locks'))
+        results = collections.defaultdict(list)
+
+        def caller(key):
+            results[key].append(client.schedule(DATE, key))
+
+        threads = [
+            threading.Thread(target=caller, args=(key, ))
+            for key in KEYS
+            for _ in range(CALLERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.hits(), dict((key, 1) for key in KEYS))
+        for key in KEYS:
+            self.assertEqual(len(results[key]), CALLERS)
+            self.assertEqual(
+                results[key][0][0]['serviceKey'],
+                key,
+            )
+
+    def test_processes_share_a_single_fetch(self):
+        lock_path = os.path.join(self.path, 'locks')
+        cache_path = os.path.join(self.path, 'cache')
+        os.makedirs(cache_path)
+
+        pool = multiprocessing.Pool(len(KEYS) * CALLERS)
+        try:
+            bodies = pool.map(
+                call,
+                [
+                    (
+                        self.stub.url('/schedule/{0}/{1}'.format(DATE, key)),
+                        key,
+                        lock_path,
+                        cache_path,
+                    )
+                    for key in KEYS
+                    for _ in range(CALLERS)
+                ],
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+        self.assertEqual(self.hits(), dict((key, 1) for key in KEYS))
+        self.assertEqual(len(set(bodies)), len(KEYS))
+
+
+if __name__ == '__main__':
+    unittest.main()
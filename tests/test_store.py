@@ -0,0 +1,241 @@
+'''
+Tests for the schedule store, and the memory held while the plugin streams the
+guide through it in low-memory mode.
+'''
+
+import os
+import gc
+import json
+import shutil
+import tempfile
+import unittest
+
+import tests
+
+# tracemalloc is only available from Python 3.4, so peak memory is only
+# measured where it is present.
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+from tests import fakes
+from resources.lib.nowtv import store
+from resources.lib.nowtv import constants
+
+DATE = '20200101'
+
+# Define the memory budget of low-memory mode, in megabytes as configured.
+MEMORY_BUDGET = 32
+
+
+class ScheduleStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.store = store.ScheduleStore(self.path)
+
+    def records(self, service_key):
+        '''
+        Args:
+            service_key (str): The service key of the channel.
+
+        Returns:
+            list of dict: The records in the delta log of the channel.
+        '''
+        path = os.path.join(self.path, '{0}.jsonl'.format(service_key))
+        with open(path) as fin:
+            return [json.loads(line) for line in fin]
+
+    def test_events_are_identified_by_id_and_start(self):
+        event = fakes.schedule('1')['schedule'][0]['events'][0]
+        moved = dict(event, startTimeEpoch=event['startTimeEpoch'] + 60)
+        untitled = dict(event, eventId=None)
+
+        self.assertEqual(store.identity(event), '1-0@1577836800')
+        self.assertNotEqual(store.identity(moved), store.identity(event))
+        self.assertEqual(store.identity(untitled), 'Programme 0@1577836800')
+
+    def test_only_changes_are_appended(self):
+        fetched = fakes.schedule('1')['schedule']
+        self.store.update('1', DATE, fetched)
+
+        events = fetched[0]['events']
+        events[1] = dict(events[1], title='Changed')
+        removed = events.pop(2)
+        self.store.update('1', DATE, fetched)
+
+        records = self.records('1')
+        self.assertEqual(len(records), 2)
+        self.assertTrue(records[0]['snapshot'])
+        self.assertEqual(records[1]['upsert'], [events[1]])
+        self.assertEqual(records[1]['remove'], [store.identity(removed)])
+
+        # Reads replay the log, from a new instance as from another process.
+        self.assertEqual(
+            store.ScheduleStore(self.path).get('1')[0]['events'],
+            events,
+        )
+
+    def test_unchanged_schedule_is_not_written(self):
+        fetched = fakes.schedule('1')['schedule']
+        self.store.update('1', DATE, fetched)
+        written = self.store.written
+
+        self.assertIsNone(self.store.update('1', DATE, fetched))
+        self.assertEqual(self.store.written, written)
+        self.assertTrue(self.store.fresh('1', DATE))
+        self.assertFalse(self.store.fresh('1', '20200102'))
+
+    def test_log_is_compacted(self):
+        fetched = fakes.schedule('1')['schedule']
+        events = fetched[0]['events']
+        for index in range(constants.SCHEDULE_STORE_COMPACT):
+            events[0] = dict(events[0], title='Revision {0}'.format(index))
+            self.store.update('1', DATE, fetched)
+        self.assertEqual(
+            len(self.records('1')),
+            constants.SCHEDULE_STORE_COMPACT,
+        )
+
+        # The next change replaces the log with a single snapshot.
+        events[0] = dict(events[0], title='Compacted')
+        self.store.update('1', DATE, fetched)
+
+        records = self.records('1')
+        self.assertEqual(len(records), 1)
+        self.assertTrue(records[0]['snapshot'])
+        self.assertEqual(self.store.get('1')[0]['events'], events)
+
+    def test_changed_since_version(self):
+        first = self.store.update('1', DATE, fakes.schedule('1')['schedule'])
+        second = self.store.update('2', DATE, fakes.schedule('2')['schedule'])
+
+        fetched = fakes.schedule('1')['schedule']
+        fetched[0]['events'].pop()
+        third = self.store.update('1', DATE, fetched)
+
+        self.assertTrue(first < second < third)
+        self.assertEqual(self.store.changed(), {'1': third, '2': second})
+        self.assertEqual(self.store.changed(second), {'1': third})
+        self.assertEqual(self.store.changed(third), {})
+
+    def test_least_recently_used_schedules_are_evicted(self):
+        for service_key in ('1', '2', '3'):
+            self.store.update(
+                service_key,
+                DATE,
+                fakes.schedule(service_key)['schedule'],
+            )
+
+        bounded = store.ScheduleStore(self.path, capacity=2)
+        for service_key in ('1', '2', '1', '3'):
+            bounded.get(service_key)
+        self.assertEqual(list(bounded._channels), ['1', '3'])
+
+    def test_deltas_reduce_write_volume(self):
+        fetched = fakes.schedule('1')['schedule']
+        self.store.update('1', DATE, fetched)
+        snapshot = self.store.written
+
+        # A single changed event writes a small fraction of the schedule.
+        events = fetched[0]['events']
+        events[0] = dict(events[0], title='Changed')
+        self.store.update('1', DATE, fetched)
+        self.assertLess(self.store.written - snapshot, snapshot / 10)
+
+
+class StreamTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+        self.stub = fakes.StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+
+        endpoints = fakes.endpoints(self.stub)
+        endpoints.__enter__()
+        self.addCleanup(endpoints.__exit__, None, None, None)
+
+        # Rate limiting is not under test.
+        for name in ('EPG_FETCH_RATE', 'EPG_FETCH_BURST'):
+            self.addCleanup(
+                setattr,
+                constants,
+                name,
+                getattr(constants, name),
+            )
+            setattr(constants, name, 1000000)
+
+    def stream(self, channels):
+        '''
+        Streams the guide to a file via the plugin in low-memory mode, with
+        schedules fetched into the store and read back one at a time.
+
+        Args:
+            channels (int): The number of channels in the guide.
+
+        Returns:
+            tuple: The plugin used to stream the guide, and the path of the
+                file it was streamed to.
+        '''
+        tests.reset()
+        self.stub.epg([fakes.channel(str(key)) for key in range(channels)])
+
+        profile = os.path.join(self.path, str(channels))
+        os.makedirs(profile)
+        instance = fakes.addon_plugin(
+            profile,
+            {'low_memory': 'true', 'memory_budget': str(MEMORY_BUDGET)},
+        )
+
+        path = os.path.join(profile, 'guide.json')
+        instance.stream_guide(DATE, ['entertainment'], path)
+        return (instance, path)
+
+    def assertChannels(self, path, channels):
+        '''
+        Asserts that every channel was written to the guide.
+
+        Args:
+            path (str): The path of the guide.
+            channels (int): The number of channels in the guide.
+        '''
+        with open(path) as fin:
+            self.assertEqual(len(json.load(fin)), channels)
+
+    def test_store_retains_a_single_schedule(self):
+        (instance, path) = self.stream(300)
+        self.assertChannels(path, 300)
+        self.assertEqual(instance.memory_budget, MEMORY_BUDGET * 1024 * 1024)
+        self.assertEqual(len(instance.epg.store._channels), 1)
+
+    @unittest.skipIf(tracemalloc is None, 'requires tracemalloc')
+    def test_peak_memory_is_within_budget(self):
+        def peak(channels):
+            gc.collect()
+            tracemalloc.start()
+            try:
+                (instance, path) = self.stream(channels)
+                (_, peak) = tracemalloc.get_traced_memory()
+            finally:
+                tracemalloc.stop()
+            self.assertChannels(path, channels)
+            return (instance, peak)
+
+        (_, small) = peak(30)
+        (instance, large) = peak(300)
+
+        self.assertLess(large, instance.memory_budget)
+
+        # A guide ten times the size should need little more memory, as only
+        # the schedules in flight are held at once - the growth is that of
+        # the channel catalog, as holding every schedule would need several
+        # times more.
+        self.assertLess(large, small * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
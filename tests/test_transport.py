@@ -0,0 +1,222 @@
+'''
+Tests for the resilient HTTP transport and the stale fallbacks of the EPG
+client, against a local fault injecting stub server.
+'''
+
+import time
+import shutil
+import logging
+import tempfile
+import unittest
+
+import tests
+
+from tests import fakes
+from resources.lib.nowtv import epg
+from resources.lib.nowtv import constants
+from resources.lib.nowtv import transport
+from resources.lib.nowtv import exceptions
+
+
+class TransportTestCase(unittest.TestCase):
+    ''' Implements a test case against a stub server, with short timeouts. '''
+
+    def setUp(self):
+        tests.reset()
+        self.stub = fakes.StubServer().__enter__()
+        self.addCleanup(self.stub.__exit__, None, None, None)
+
+        endpoints = fakes.endpoints(self.stub)
+        endpoints.__enter__()
+        self.addCleanup(endpoints.__exit__, None, None, None)
+
+        self.patch('HTTP_TIMEOUT_CONNECT', 0.5)
+        self.patch('HTTP_TIMEOUT_READ', 0.2)
+        self.patch('RETRY_BACKOFF', 0.01)
+        self.patch('CIRCUIT_RESET_INTERVAL', 0.2)
+
+        # Failed requests are expected, so are not logged.
+        logger = logging.getLogger('plugin.video.nowtv')
+        handler = logging.NullHandler()
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(setattr, logger, 'propagate', logger.propagate)
+        logger.propagate = False
+
+    def patch(self, name, value):
+        '''
+        Overrides a constant for the duration of the test.
+
+        Args:
+            name (str): The name of the constant.
+            value (object): The value to use.
+        '''
+        self.addCleanup(setattr, constants, name, getattr(constants, name))
+        setattr(constants, name, value)
+
+    def respond(self, status, body='', delay=0, headers=None):
+        '''
+        Responds to all requests with the given status and body.
+
+        Args:
+            status (int): The HTTP status of the response.
+            body (object): The body of the response.
+            delay (float): The time to wait before responding - in seconds.
+            headers (dict): The headers of the response.
+        '''
+        def handler(method, path, query):
+            time.sleep(delay)
+            return (status, headers or {}, body)
+
+        self.stub.route('/', handler)
+
+
+class RequestTest(TransportTestCase):
+
+    def test_timeouts_are_retried_then_raised(self):
+        self.respond(200, delay=1)
+
+        started = time.time()
+        with self.assertRaises(exceptions.TransportError):
+            transport.request('GET', self.stub.url('/slow'))
+
+        self.assertEqual(self.stub.count(), constants.RETRY_ATTEMPTS)
+        self.assertLess(time.time() - started, 1)
+
+    def test_server_errors_are_retried_for_get(self):
+        self.respond(503)
+
+        response = transport.request('GET', self.stub.url('/error'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.stub.count(), constants.RETRY_ATTEMPTS)
+
+    def test_server_errors_are_not_retried_for_post(self):
+        self.respond(503)
+
+        response = transport.request('POST', self.stub.url('/error'))
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.stub.count(), 1)
+
+    def test_rate_limiting_is_raised_with_retry_after(self):
+        self.respond(429, headers={'Retry-After': '7'})
+
+        with self.assertRaises(exceptions.RateLimitedError) as context:
+            transport.request('GET', self.stub.url('/limited'))
+
+        self.assertEqual(context.exception.retry_after, 7)
+        self.assertEqual(self.stub.count(), 1)
+
+
+class CircuitBreakerTest(TransportTestCase):
+
+    def fail(self):
+        ''' Fails requests until the circuit is opened. '''
+        self.respond(503)
+        for _ in range(constants.CIRCUIT_FAILURE_THRESHOLD):
+            transport.request('POST', self.stub.url('/error'))
+
+    def test_circuit_opens_after_consecutive_failures(self):
+        self.fail()
+
+        with self.assertRaises(exceptions.CircuitOpenError):
+            transport.request('GET', self.stub.url('/error'))
+        self.assertEqual(
+            self.stub.count(),
+            constants.CIRCUIT_FAILURE_THRESHOLD,
+        )
+
+    def test_circuit_half_opens_after_reset_interval(self):
+        self.fail()
+        time.sleep(constants.CIRCUIT_RESET_INTERVAL * 1.5)
+
+        # A single trial request is permitted, which closes the circuit.
+        self.respond(200)
+        response = transport.request('GET', self.stub.url('/recovered'))
+        self.assertEqual(response.status_code, 200)
+
+        transport.request('GET', self.stub.url('/recovered'))
+        self.assertEqual(self.stub.count('/recovered'), 2)
+
+    def test_failed_trial_reopens_circuit(self):
+        self.fail()
+        time.sleep(constants.CIRCUIT_RESET_INTERVAL * 1.5)
+
+        transport.request('POST', self.stub.url('/error'))
+
+        with self.assertRaises(exceptions.CircuitOpenError):
+            transport.request('POST', self.stub.url('/error'))
+        self.assertEqual(
+            self.stub.count(),
+            constants.CIRCUIT_FAILURE_THRESHOLD + 1,
+        )
+
+    def test_circuit_state_persists_across_instances(self):
+        self.fail()
+
+        # A new invocation reads the state of the circuit from cache.
+        transport._breakers.clear()
+        with self.assertRaises(exceptions.CircuitOpenError):
+            transport.request('GET', self.stub.url('/error'))
+        self.assertEqual(
+            self.stub.count(),
+            constants.CIRCUIT_FAILURE_THRESHOLD,
+        )
+
+
+class StaleTest(TransportTestCase):
+
+    def setUp(self):
+        super(StaleTest, self).setUp()
+        self.stub.epg([fakes.channel('1'), fakes.channel('2')])
+        self.client = epg.Client()
+
+    def expire(self, key):
+        '''
+        Expires the fresh copy of a cached value, retaining the stale copy.
+
+        Args:
+            key (str): The cache key of the value.
+        '''
+        self.client.cache.values.pop(key)
+
+    def test_stale_schedule_is_used_on_transport_error(self):
+        fresh = self.client.schedule('20200101', '1')
+        self.expire(constants.CACHE_KEY_SCHEDULE.format('1'))
+        self.respond(200, delay=1)
+
+        self.assertEqual(self.client.schedule('20200101', '1'), fresh)
+
+        # Without a stale copy, the error is raised.
+        with self.assertRaises(exceptions.BaseError):
+            self.client.schedule('20200101', '2')
+
+    def test_stored_schedule_is_used_on_transport_error(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        client = epg.Client(store_path=path)
+
+        fresh = client.schedule('20200101', '1')
+        self.respond(200, delay=1)
+
+        # The stored schedule is used beyond its date, in place of a stale
+        # copy from cache.
+        self.assertEqual(client.schedule('20200102', '1'), fresh)
+
+    def test_stale_channels_are_used_on_transport_error(self):
+        fresh = self.client.channels(['entertainment'])
+        self.expire(
+            constants.CACHE_KEY_CATALOG.format('entertainment', 'SD'),
+        )
+        self.respond(200, delay=1)
+
+        channels = self.client.channels(['entertainment'])
+        self.assertEqual(channels.service_keys, fresh.service_keys)
+
+        with self.assertRaises(exceptions.BaseError):
+            self.client.channels(['sports'])
+
+
+if __name__ == '__main__':
+    unittest.main()